@@ -14,6 +14,7 @@ Commands:
     db        status | tables | migrate | seed
     nodes     list | get <id> | create | update <id> | delete <id>
     ts        test <channel_id> [api_key]    (ThingSpeak connectivity)
+              backfill [node_id] [since]     (load channel history into the DB)
     health    check
     env       show
 """
@@ -248,7 +249,67 @@ ALTER TABLE nodes
   DROP COLUMN IF EXISTS dashboard_visible,
   DROP COLUMN IF EXISTS logic_inverted,
   DROP COLUMN IF EXISTS is_individual,
-  DROP COLUMN IF EXISTS metrics_config;{C.END}
+  DROP COLUMN IF EXISTS metrics_config;
+
+-- Incremental ThingSpeak sync watermark and backfill checkpoint
+ALTER TABLE device_thingspeak_mapping
+  ADD COLUMN IF NOT EXISTS last_entry_id INTEGER,
+  ADD COLUMN IF NOT EXISTS backfilled_until TIMESTAMP;
+
+-- Rollups: running aggregates, one row per node and period
+ALTER TABLE node_analytics
+  ADD COLUMN IF NOT EXISTS sample_count INTEGER,
+  ADD COLUMN IF NOT EXISTS value_sum FLOAT,
+  ADD COLUMN IF NOT EXISTS value_min FLOAT,
+  ADD COLUMN IF NOT EXISTS value_max FLOAT;
+
+-- Keep only the newest row of each (node, period) before adding the unique key
+DELETE FROM node_analytics a
+  USING node_analytics b
+  WHERE a.node_id = b.node_id
+    AND a.period_type = b.period_type
+    AND a.period_start = b.period_start
+    AND (COALESCE(a.created_at, 'epoch'), a.id) < (COALESCE(b.created_at, 'epoch'), b.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_node_analytics_period
+  ON node_analytics (node_id, period_type, period_start);
+
+-- Monthly partitions (server/app/db/partitions.py) for telemetry tables created
+-- before partitioning. Each table is copied into one partition per month, in one
+-- transaction; tables that are already partitioned are skipped. Rewrites the
+-- tables, so run it while ingestion is stopped.
+DO $$
+DECLARE
+  t record;
+  ix record;
+  m date;
+BEGIN
+  FOR t IN SELECT * FROM (VALUES
+      ('node_readings', 'timestamp', 'uq_node_readings_node_ts', 'node_id, "timestamp"'),
+      ('node_analytics', 'period_start', 'uq_node_analytics_period', 'node_id, period_type, period_start')
+    ) AS v(name, col, uq, uq_cols)
+  LOOP
+    CONTINUE WHEN to_regclass(t.name) IS NULL
+      OR EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(t.name));
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', t.name, t.name || '_unpartitioned');
+    FOR ix IN SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(t.name || '_unpartitioned') LOOP
+      EXECUTE format('ALTER INDEX %I RENAME TO %I', ix.relname, ix.relname || '_unpartitioned');
+    END LOOP;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (%I)', t.name, t.name || '_unpartitioned', t.col);
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, %I)', t.name, t.col);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I UNIQUE (%s)', t.name, t.uq, t.uq_cols);
+    EXECUTE format('ALTER TABLE %I ADD FOREIGN KEY (node_id) REFERENCES nodes (id)', t.name);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', t.name || '_default', t.name);
+    FOR m IN EXECUTE format('SELECT DISTINCT date_trunc(''month'', %I)::date FROM %I WHERE %I IS NOT NULL',
+        t.col, t.name || '_unpartitioned', t.col) LOOP
+      EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        t.name || to_char(m, '"_y"YYYY"m"MM'), t.name, m, (m + interval '1 month')::date);
+    END LOOP;
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I WHERE %I IS NOT NULL', t.name, t.name || '_unpartitioned', t.col);
+    EXECUTE format('DROP TABLE %I', t.name || '_unpartitioned');
+  END LOOP;
+END $$;{C.END}
 """)
 
     elif action == "seed":
@@ -548,6 +609,18 @@ def cmd_ts(args):
         except Exception as e:
             err(f"Connection failed: {e}")
 
+    elif action == "backfill":
+        # Runs in its own process (like the ingest worker), not inside the API server.
+        # The same job can be started on a running server: POST /api/v1/system/backfill
+        head(f"ThingSpeak Backfill: {args.id or 'all channels'}")
+        cmd = [VENV_PYTHON, "-m", "app.backfill"]
+        if args.id:
+            cmd.append(args.id)
+        if args.extra:
+            cmd += ["--since", args.extra]
+        info("Resumes from each channel's checkpoint; Ctrl+C is safe")
+        subprocess.run(cmd, cwd=SERVER_DIR)
+
 # ─── HEALTH CHECK COMMAND ───────────────────────────────────────────────────────
 def cmd_health(args):
     head("System Health Check")
@@ -628,6 +701,7 @@ Examples:
   python cli.py nodes get <id>         Get node details
   python cli.py nodes create           Interactive node creation
   python cli.py ts test 2613745        Test ThingSpeak channel
+  python cli.py ts backfill            Load all channels' history into the DB
   python cli.py server status          Check backend status
   python cli.py db tables              Show database tables
   python cli.py env show               Show environment config
@@ -659,9 +733,9 @@ Examples:
     
     # ThingSpeak
     sp = subparsers.add_parser("ts", help="ThingSpeak tools")
-    sp.add_argument("action", choices=["test"])
-    sp.add_argument("id", nargs="?", default=None, help="Channel ID")
-    sp.add_argument("extra", nargs="?", default=None, help="API Key (optional)")
+    sp.add_argument("action", choices=["test", "backfill"])
+    sp.add_argument("id", nargs="?", default=None, help="Channel ID (test) or node ID (backfill)")
+    sp.add_argument("extra", nargs="?", default=None, help="API Key (test) or start date YYYY-MM-DD (backfill), optional")
     sp.set_defaults(func=cmd_ts)
     
     # Health
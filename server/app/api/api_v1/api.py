@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import auth, nodes, websockets, admin, devices, dashboard, reports, ai, health, assignments, pipelines, analytics, users
+from app.api.api_v1.endpoints import auth, nodes, websockets, admin, devices, dashboard, reports, ai, health, assignments, pipelines, analytics, users, ingest
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -15,3 +15,4 @@ api_router.include_router(assignments.router, prefix="/assignments", tags=["assi
 api_router.include_router(pipelines.router, prefix="/pipelines", tags=["pipelines"])
 api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+api_router.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
@@ -8,7 +8,7 @@ from app.db.repository import DistributorRepository, CommunityRepository, Custom
 import uuid
 import re
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from app.core import security, security_supabase
 from app.core.permissions import Permission
@@ -477,6 +477,32 @@ async def update_system_config(
     
     return db_obj
 
+# ─── TELEMETRY BACKFILL ───
+@router.post("/system/backfill", status_code=202)
+async def start_backfill(
+    backfill_in: schemas.BackfillRequest,
+    user: dict = Depends(RequirePermission(Permission.SYSTEM_CONFIG_WRITE))
+):
+    """
+    Load ThingSpeak history into stored readings, resuming each channel from
+    its checkpoint. Runs in the background of the worker that took the
+    request; poll GET /system/backfill there. Only one backfill runs at a time
+    across all processes.
+    """
+    from app.services.telemetry.backfill import thingspeak_backfill
+
+    if not await thingspeak_backfill.start(backfill_in.node_ids, backfill_in.since):
+        raise HTTPException(status_code=409, detail="A backfill is already running")
+    return thingspeak_backfill.status
+
+@router.get("/system/backfill")
+async def read_backfill_status(
+    user: dict = Depends(RequirePermission(Permission.SYSTEM_CONFIG_WRITE))
+):
+    from app.services.telemetry.backfill import thingspeak_backfill
+
+    return thingspeak_backfill.status
+
 # ─── AUDIT LOGS ───
 @router.get("/audit", response_model=List[schemas.AuditLogResponse])
 async def read_audit_logs(
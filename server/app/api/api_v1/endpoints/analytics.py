@@ -5,7 +5,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.all_models import NodeAnalytics
 from app.core.security_supabase import get_current_user_token
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func
+from app.services.telemetry.rollup import period_start
 from datetime import datetime, timedelta
 
 router = APIRouter()
@@ -23,7 +24,8 @@ class AnalyticsRepository:
         from sqlalchemy import text
         sql = """
             SELECT id, node_id, period_type, period_start, 
-                   consumption_liters, avg_level_percent, peak_flow, metadata, created_at
+                   consumption_liters, avg_level_percent, peak_flow,
+                   sample_count, value_sum, value_min, value_max, metadata, created_at
             FROM node_analytics 
             WHERE node_id = :node_id
         """
@@ -38,6 +40,47 @@ class AnalyticsRepository:
         result = await self.session.execute(text(sql), params)
         return [dict(row._mapping) for row in result.fetchall()]
     
+    async def summarize(self, node_id: str, days: int) -> Optional[dict]:
+        """
+        Totals over the last `days` days (today included) from their daily
+        buckets. Always daily: consumption is stored per bucket, so sums over
+        coarser buckets would not add up to the same total.
+        """
+        period_type = "daily"
+        cutoff = period_start(period_type, datetime.utcnow()) - timedelta(days=days - 1)
+        result = await self.session.execute(
+            select(
+                func.count(NodeAnalytics.id),
+                func.sum(NodeAnalytics.consumption_liters),
+                func.sum(NodeAnalytics.value_sum),
+                func.sum(NodeAnalytics.sample_count),
+                func.max(NodeAnalytics.peak_flow),
+                func.min(NodeAnalytics.value_min),
+                func.max(NodeAnalytics.value_max)
+            )
+            .where(
+                NodeAnalytics.node_id == node_id,
+                NodeAnalytics.period_type == period_type,
+                NodeAnalytics.period_start >= cutoff
+            )
+        )
+        buckets, consumption, total, samples, peak_flow, low, high = result.one()
+        if not buckets:
+            return None
+        # Weighted by sample count, i.e. the mean of the readings rather than of bucket means.
+        # Only level nodes (tank/deep) have consumption, and only they report a level.
+        avg_level = total / samples if samples and consumption is not None else None
+        return {
+            "period_type": period_type,
+            "total_consumption_liters": consumption or 0,
+            "average_level_percent": avg_level or 0,
+            "max_peak_flow": peak_flow or 0,
+            "min_value": low,
+            "max_value": high,
+            "samples": samples or 0,
+            "data_points": buckets
+        }
+    
     async def get_recent(
         self, 
         period_type: Optional[str] = None,
@@ -49,7 +92,8 @@ class AnalyticsRepository:
         
         sql = """
             SELECT id, node_id, period_type, period_start, 
-                   consumption_liters, avg_level_percent, peak_flow, metadata, created_at
+                   consumption_liters, avg_level_percent, peak_flow,
+                   sample_count, value_sum, value_min, value_max, metadata, created_at
             FROM node_analytics 
             WHERE period_start >= :cutoff_date
         """
@@ -94,27 +138,19 @@ async def get_recent_analytics(
 @router.get("/summary/{node_id}")
 async def get_analytics_summary(
     node_id: str,
-    days: int = Query(30, ge=1, le=365),
+    days: int = Query(30, ge=1, le=3650),
     db: AsyncSession = Depends(get_db),
     user_payload: dict = Depends(get_current_user_token)
 ) -> Any:
-    """Get analytics summary for a node"""
+    """
+    Get analytics summary for a node.
+    Computed in the database from the window's daily rollups (at most one
+    row per day), not from raw readings.
+    """
     repo = AnalyticsRepository(db)
-    analytics = await repo.get_by_node(node_id, "daily", days)
+    summary = await repo.summarize(node_id, days)
     
-    if not analytics:
+    if not summary:
         return {"message": "No analytics data found"}
     
-    # Calculate summary statistics
-    total_consumption = sum(a.consumption_liters or 0 for a in analytics)
-    avg_level = sum(a.avg_level_percent or 0 for a in analytics) / len(analytics)
-    max_flow = max((a.peak_flow or 0) for a in analytics)
-    
-    return {
-        "node_id": node_id,
-        "period_days": days,
-        "total_consumption_liters": total_consumption,
-        "average_level_percent": avg_level,
-        "max_peak_flow": max_flow,
-        "data_points": len(analytics)
-    }
+    return {"node_id": node_id, "period_days": days, **summary}
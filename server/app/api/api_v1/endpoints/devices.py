@@ -1,5 +1,5 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.schemas import schemas
@@ -7,20 +7,21 @@ from app.models import all_models as models
 from app.db.session import get_db
 from app.core import security_supabase
 from app.core.permissions import Permission
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 from sqlalchemy import select
 from app.core.security_supabase import RequirePermission
 from app.core.ratelimit import RateLimiter
+from app.services.telemetry.latest import latest_state
 from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
 from app.db.repository import NodeRepository
-import time
+from app.services.telemetry.archive import last_readings, stream_readings
+from app.services.telemetry.normalize import RAW_FIELDS, FeedColumns, get_normalizer
+from app.services.telemetry.ring import ring_buffers
+from app.services.telemetry.rollup import primary_field
 
-# simple TTL cache: { "device_id": (timestamp, data) }
-live_telemetry_cache = {}
-history_cache = {}  # Cache for historical data
-CACHE_TTL = 30 # seconds
-HISTORY_CACHE_TTL = 60 # 60 seconds for history cache
+# Telemetry is cached per ThingSpeak channel (shared by every node mapped to it
+# and kept warm by the poller); see app/services/telemetry/cache.py
 
 router = APIRouter()
 
@@ -205,7 +206,8 @@ async def list_devices_for_map(
     Lightweight Geo-metadata for Map plotting.
     """
     result = await db.execute(select(models.Node))
-    nodes = result.scalars().all()
+    nodes = [n for n in result.scalars().all() if n.lat and n.lng]
+    states = await latest_state.get_many(db, [n.id for n in nodes])
     
     return [
         {
@@ -214,47 +216,32 @@ async def list_devices_for_map(
             "category": n.category,
             "lat": n.lat,
             "lng": n.lng,
-            "status": n.status
+            "status": n.status,
+            "value": states.get(n.id, {}).get("value"),
+            "timestamp": states.get(n.id, {}).get("timestamp"),
+            "last_seen": states.get(n.id, {}).get("last_seen")
         }
-        for n in nodes if n.lat and n.lng
+        for n in nodes
     ]
 
 @router.get("/{node_id}/live-data", response_model=dict)
 async def get_device_live_data(
     node_id: str,
+    refresh: bool = Query(False, description="Bypass the latest-state table and read ThingSpeak directly"),
     db: AsyncSession = Depends(get_db)
     # user: dict = Depends(RequirePermission(Permission.DEVICE_READ)) - REMOVED for public analytics
 ):
     """
-    Fetch live telemetry using stored ThingSpeak credentials.
-    Returns merged telemetry + specialized device config.
+    Live telemetry with specialized device config.
+    Served from the latest-state table kept current by ingestion (polled,
+    pushed or MQTT); falls back to ThingSpeak when the node has no state yet
+    or `refresh=true`.
     """
-    now = time.time()
-    if node_id in live_telemetry_cache:
-        ts, data = live_telemetry_cache[node_id]
-        if now - ts < CACHE_TTL:
-            return data
-
     repo = NodeRepository(db)
     node = await repo.get(node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Device not found")
-        
-    if not node.thingspeak_mappings:
-         raise HTTPException(status_code=400, detail="Device has no telemetry mapping")
 
-    ts_service = ThingSpeakTelemetryService()
-    
-    # Prepare list of channel configs
-    channel_configs = [
-        {
-            "channel_id": m.channel_id,
-            "read_key": m.read_api_key,
-            "field_mapping": m.field_mapping
-        }
-        for m in node.thingspeak_mappings
-    ]
-    
     # Extract specialized config based on node type (do this first)
     specialized_config = {}
     if node.analytics_type == "EvaraTank" and node.config_tank:
@@ -271,6 +258,32 @@ async def get_device_live_data(
     elif node.analytics_type == "EvaraFlow" and node.config_flow:
         specialized_config = {"pipe_diameter": node.config_flow.pipe_diameter, "max_flow_rate": node.config_flow.max_flow_rate}
 
+    state = None if refresh else await latest_state.get(db, node_id)
+    if state:
+        return {
+            "device_id": node_id,
+            "timestamp": state["timestamp"].isoformat() + "Z" if state["timestamp"] else None, # UTC, as ThingSpeak reports it
+            "metrics": state["metrics"] or {},
+            "config": specialized_config,
+            "source": state["source"],
+            "last_seen": state["last_seen"]
+        }
+
+    if not node.thingspeak_mappings:
+         raise HTTPException(status_code=400, detail="Device has no telemetry mapping")
+
+    ts_service = ThingSpeakTelemetryService()
+    
+    # Prepare list of channel configs
+    channel_configs = [
+        {
+            "channel_id": m.channel_id,
+            "read_key": m.read_api_key,
+            "field_mapping": m.field_mapping
+        }
+        for m in node.thingspeak_mappings
+    ]
+
     data = await ts_service.fetch_latest(node_id, channel_configs)
     
     print(f"ThingSpeak returned data: {data}")
@@ -301,10 +314,10 @@ async def get_device_live_data(
         "device_id": node_id,
         "timestamp": data.get("timestamp"),
         "metrics": {k: v for k, v in data.items() if k not in ["timestamp", "entry_id"]},
-        "config": specialized_config
+        "config": specialized_config,
+        "source": "thingspeak"
     }
     
-    live_telemetry_cache[node_id] = (now, response)
     return response
 
 
@@ -312,40 +325,51 @@ async def get_device_live_data(
 async def get_device_history(
     node_id: str,
     count: int = 10,
+    days: Optional[int] = Query(None, ge=1, le=90, description="Return the last N days instead of the last `count` readings"),
+    points: Optional[int] = Query(None, ge=3, le=5000, description="Downsample to at most this many points (LTTB)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Fetch the last N telemetry readings for a device.
+    Fetch the last N telemetry readings (or the last `days` of them) for a device.
     Returns readings in chronological order (oldest first) for chart display.
+    With `points`, long series are downsampled server-side on the node's
+    primary metric so charts keep their shape with far fewer points.
+    Recent windows come from the node's in-memory ring buffer; otherwise
+    nodes without a ThingSpeak mapping (push/MQTT) are served from stored readings.
     
     CRITICAL: For tanks, field2 = Distance (NEVER use field1 for tank level)
     """
-    cache_key = f"{node_id}_{count}"
-    now = time.time()
-    
-    # Check cache first
-    if cache_key in history_cache:
-        ts, data = history_cache[cache_key]
-        if now - ts < HISTORY_CACHE_TTL:
-            return data
-    
     repo = NodeRepository(db)
     node = await repo.get(node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    if not node.thingspeak_mappings:
-        raise HTTPException(status_code=400, detail="Device has no telemetry mapping")
-    
-    ts_service = ThingSpeakTelemetryService()
-    
     # Use first mapping config
-    mapping = node.thingspeak_mappings[0]
-    config = {
-        "channel_id": mapping.channel_id,
-        "read_key": mapping.read_api_key,
-        "field_mapping": mapping.field_mapping
-    }
+    mapping = node.thingspeak_mappings[0] if node.thingspeak_mappings else None
+    columns = await ring_buffers.recent(
+        db,
+        node_id,
+        count=None if days else count,
+        start=datetime.utcnow() - timedelta(days=days) if days else None,
+        field_mapping=mapping.field_mapping if mapping else None
+    )
+    if columns is None and mapping:
+        ts_service = ThingSpeakTelemetryService()
+        config = {
+            "channel_id": mapping.channel_id,
+            "read_key": mapping.read_api_key,
+            "field_mapping": mapping.field_mapping
+        }
+        if days:
+            columns = (await ts_service.fetch_history_columns(node_id, config, days)).sort_by_time()
+        else:
+            columns = await ts_service.fetch_last_n_columns(node_id, config, count)
+    elif columns is None:
+        columns = await _stored_columns(db, node_id, count, days)
+    total = len(columns)
+    if points:
+        columns = columns.downsample(points, primary_field(node.analytics_type))
+    feeds = columns.to_records()
     
     # Extract specialized config for calculations
     specialized_config = {}
@@ -359,9 +383,6 @@ async def get_device_history(
             "breadth": node.config_tank.breadth
         }
     
-    # Fetch last N readings
-    feeds = await ts_service.fetch_last_n(node_id, config, count)
-    
     if not feeds:
         return {
             "device_id": node_id,
@@ -373,9 +394,28 @@ async def get_device_history(
     response = {
         "device_id": node_id,
         "count": len(feeds),
+        "total": total, # before downsampling
         "feeds": feeds,  # Already sorted chronologically (oldest first)
         "config": specialized_config
     }
     
-    history_cache[cache_key] = (now, response)
     return response
+
+async def _stored_columns(db: AsyncSession, node_id: str, count: int, days: Optional[int]) -> FeedColumns:
+    """Stored (hot or archived) readings as ThingSpeak-shaped feed columns, oldest first."""
+    if days:
+        rows = []
+        async for batch in stream_readings(db, node_id, start=datetime.utcnow() - timedelta(days=days)):
+            rows.extend(batch)
+    else:
+        rows = await last_readings(db, node_id, count)
+    feeds = [
+        {
+            "created_at": r.timestamp.isoformat() + "Z",
+            "entry_id": r.entry_id,
+            **{f: getattr(r, f) for f in RAW_FIELDS},
+            **(r.data or {})
+        }
+        for r in rows
+    ]
+    return get_normalizer({}).columns(feeds)
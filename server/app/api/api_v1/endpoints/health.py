@@ -3,10 +3,12 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from app.db.session import get_db
-import httpx
 import asyncio
+from app.core.http import http_clients
+from app.core.config import get_settings
 
 router = APIRouter()
+settings = get_settings()
 
 @router.get("", response_model=Dict[str, Any])
 @router.get("/", response_model=Dict[str, Any])
@@ -49,16 +51,41 @@ async def health_check(
 
     # 2. ThingSpeak Check (Ping URL)
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get("https://api.thingspeak.com/channels/public.json", timeout=2.0)
-            if resp.status_code == 200:
-                status["services"]["thingspeak"] = "ok"
-            else:
-                 status["services"]["thingspeak"] = f"unreachable ({resp.status_code})"
+        resp = await http_clients.get("thingspeak").get("/channels/public.json", timeout=2.0)
+        if resp.status_code == 200:
+            status["services"]["thingspeak"] = "ok"
+        else:
+             status["services"]["thingspeak"] = f"unreachable ({resp.status_code})"
     except Exception as e:
         status["services"]["thingspeak"] = f"error: {str(e)}"
         # ThingSpeak down might not be critical for app UP, but is for telemetry
         if status["status"] == "ok":
             status["status"] = "degraded"
 
+    # 3. Ingestion pipeline (write queue depth / flush latency, last poll batch, cache hit rate)
+    from app.services.telemetry.writer import telemetry_writer
+    from app.services.telemetry.poller import poller
+    from app.services.telemetry.stages import ingest_pipeline
+    from app.services.telemetry.latest import latest_state
+    from app.services.telemetry.rollup import rollups
+    from app.services.telemetry.ring import ring_buffers
+    from app.services.telemetry.cache import channel_cache
+    from app.services.telemetry.throttle import thingspeak_guard
+    status["ingest"] = {
+        "pipeline": ingest_pipeline.snapshot(),
+        "write_queue": telemetry_writer.snapshot(),
+        "latest_state": latest_state.snapshot(),
+        "rollups": rollups.snapshot(),
+        "ring_buffers": ring_buffers.snapshot(),
+        "poller": poller.last_sweep,
+        "channel_cache": channel_cache.snapshot(),
+        "thingspeak_guard": thingspeak_guard.snapshot()
+    }
+    if settings.MQTT_ENABLED:
+        from app.services.telemetry.mqtt import mqtt_source
+        status["ingest"]["mqtt"] = mqtt_source.snapshot()
+    from app.core.leader import leader
+    status["ingest"]["leader"] = leader.snapshot()
+    status["http_pools"] = http_clients.metrics()
+
     return status
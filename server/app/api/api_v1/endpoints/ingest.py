@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.repository import NodeRepository
+from app.db.session import get_db
+from app.services.telemetry.push import PayloadError, PushReadingValidator, parse_payload
+from app.services.telemetry_processor import TelemetryProcessor
+
+router = APIRouter()
+settings = get_settings()
+
+MAX_REPORTED_ERRORS = 20
+
+async def read_capped_body(request: Request, limit: int) -> bytes:
+    """
+    The request body, refusing (413) one whose Content-Length or streamed
+    size exceeds `limit` bytes before more than that is held in memory.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Body exceeds {limit} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise too_large
+    # Chunked or understated bodies are counted as they arrive
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+@router.post("/readings", status_code=status.HTTP_202_ACCEPTED)
+async def push_readings(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    x_node_key: Optional[str] = Header(None)
+) -> Any:
+    """
+    Direct push ingestion for devices and gateways.
+
+    Authenticate with the node's key in the `X-Node-Key` header. The body is
+    either NDJSON (`Content-Type: application/x-ndjson`, one reading per line)
+    or JSON: an array of readings, a single reading, or {"readings": [...]}.
+    Each reading carries `timestamp` (ISO-8601 or epoch seconds, defaults to
+    now), an optional `entry_id`, and metric values keyed by field1..field8 or
+    by the node's mapped names. Valid readings go through the same pipeline as
+    polled ThingSpeak data; invalid ones are reported back by index.
+    """
+    if not x_node_key:
+        raise HTTPException(status_code=401, detail="Missing X-Node-Key header")
+
+    node = await NodeRepository(db).get_by_key(x_node_key)
+    if not node:
+        raise HTTPException(status_code=401, detail="Invalid node key")
+
+    body = await read_capped_body(request, settings.INGEST_MAX_BODY_BYTES)
+
+    try:
+        items = parse_payload(body, request.headers.get("content-type", ""))
+    except (PayloadError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="No readings in request body")
+    if len(items) > settings.INGEST_MAX_READINGS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many readings ({len(items)}); limit is {settings.INGEST_MAX_READINGS} per request"
+        )
+
+    # A node may span several ThingSpeak channels; pushed data uses their combined field names
+    field_mapping: Dict[str, str] = {}
+    for mapping in node.thingspeak_mappings or []:
+        field_mapping.update(mapping.field_mapping or {})
+
+    readings, errors = PushReadingValidator(field_mapping).validate(items)
+    if not readings:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "No valid readings", "errors": errors[:MAX_REPORTED_ERRORS]}
+        )
+
+    # Queued for the ingest pipeline, which orders, stores and alerts on them
+    await TelemetryProcessor(db).process_readings(node.id, readings)
+
+    return {
+        "node_id": node.id,
+        "accepted": len(readings),
+        "rejected": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS]
+    }
@@ -16,7 +16,8 @@ from app.core.config import get_settings
 from app.services.security import EncryptionService
 import asyncio
 import traceback
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta
 
 # Import telemetry service
 try:
@@ -416,18 +417,30 @@ async def get_node_analytics(
         "read_key": node.thingspeak_read_api_key
     }
     
-    readings = await ts_service.fetch_history(node_id, config, days=7)
+    # Extract flow data (assuming field1 is flow for now); only positive readings count.
+    # The node's ring buffer answers when it holds the whole week; otherwise
+    # history is streamed in batches so a week of feeds is never held as dicts.
+    from app.services.telemetry.ring import ring_buffers
+
+    flow_series = []
+    def add_flow(batch):
+        flow = batch.column("field1")
+        keep = np.flatnonzero(flow > 0)
+        flow_series.extend(
+            {"timestamp": ts or datetime.utcnow().timestamp(), "level": level}
+            for ts, level in zip(batch.timestamps[keep].tolist(), flow[keep].tolist())
+        )
+
+    recent = await ring_buffers.recent(db, node_id, start=datetime.utcnow() - timedelta(days=7))
+    if recent is not None:
+        add_flow(recent)
+    else:
+        async for batch in ts_service.stream_history(node_id, config, days=7):
+            add_flow(batch)
     
     # 3. Compute Analytics
     analytics_service = NodeAnalyticsService(repo)
     
-    # Extract flow data (assuming field1 is flow for now)
-    flow_series = [
-        {"timestamp": r.get("timestamp", datetime.utcnow().timestamp()), "level": float(r["field1"])} 
-        for r in readings 
-        if r.get("field1") and r["field1"] is not None and str(r["field1"]).replace('.', '', 1).isdigit()
-    ]
-    
     days = analytics_service.predict_days_to_empty(flow_series, 2000) # Mock capacity
     avg = analytics_service.calculate_rolling_average(flow_series)
     
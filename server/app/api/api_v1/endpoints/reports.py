@@ -1,14 +1,19 @@
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, Optional
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.api import deps
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal, get_db
 from app.models import all_models as models
 from app.core import security_supabase
 from app.core.security_supabase import RequirePermission
 from app.core.permissions import Permission
+from app.db.repository import NodeRepository, ReadingRepository
+from app.services.telemetry.archive import cold_archive, stream_readings
+from app.services.telemetry.normalize import RAW_FIELDS
+from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
 import csv
 import io
 
@@ -17,52 +22,97 @@ router = APIRouter()
 @router.get("/node/{node_id}/export")
 async def export_node_readings(
     node_id: str,
+    start: Optional[datetime] = Query(None, description="Inclusive UTC start (default: `days` ago)"),
+    end: Optional[datetime] = Query(None, description="Exclusive UTC end (default: now)"),
+    days: int = Query(7, ge=1, le=365),
     db: AsyncSession = Depends(get_db),
     user_payload: dict = Depends(RequirePermission(Permission.DEVICE_READ))
 ) -> Any:
     """
-    Export Node Readings as CSV.
+    Export stored Node Readings as CSV, oldest first.
+    Archived months are read from the cold archive, the rest over the
+    (node_id, timestamp) index; rows are streamed in chunks.
     """
-    # Verify access (RLS handled by permission + query filter if strictly needed)
-    # Fetch readings
-    result = await db.execute(
-        select(models.NodeReading)
-        .where(models.NodeReading.node_id == node_id)
-        .order_by(models.NodeReading.timestamp.desc())
-        .limit(1000) # Cap for now
-    )
-    readings = result.scalars().all()
-    
-    if not readings:
+    node = await NodeRepository(db).get(node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+
+    start = start or datetime.utcnow() - timedelta(days=days)
+    if not await ReadingRepository(db).get_range(node_id, start, end, limit=1) and not cold_archive.has_range(node_id, start, end):
         raise HTTPException(status_code=404, detail="No readings found")
 
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    # Inspect first reading data for keys? Defaulting to known
-    headers = ["Timestamp", "Reading ID"]
-    if readings:
-        first_data = readings[0].data
-        if isinstance(first_data, dict):
-            headers.extend(sorted(first_data.keys()))
-            
-    writer.writerow(headers)
-    
-    for r in readings:
-        row = [r.timestamp.isoformat(), r.id]
-        if isinstance(r.data, dict):
-            for k in headers[2:]:
-                row.append(r.data.get(k, ""))
-        writer.writerow(row)
-        
-    output.seek(0)
-    
-    response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
+    # Columns are labelled with the node's mapped names where it has them
+    labels = {field: field for field in RAW_FIELDS}
+    for mapping in node.thingspeak_mappings or []:
+        labels.update({field: alias for field, alias in (mapping.field_mapping or {}).items() if field in labels})
+
+    async def rows():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["Timestamp", "Reading ID", "Entry ID"] + [labels[f] for f in RAW_FIELDS])
+        # Own session: the request-scoped one may be closed before the body finishes streaming
+        async with AsyncSessionLocal() as session:
+            async for batch in stream_readings(session, node_id, start, end):
+                for r in batch:
+                    extras = r.data or {}
+                    writer.writerow(
+                        [r.timestamp.isoformat(), r.id, r.entry_id if r.entry_id is not None else ""]
+                        + [_cell(getattr(r, f), extras.get(f)) for f in RAW_FIELDS]
+                    )
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+
+    response = StreamingResponse(rows(), media_type="text/csv")
     response.headers["Content-Disposition"] = f"attachment; filename=node_{node_id}_readings.csv"
     return response
 
+def _cell(value: Optional[float], extra: Any) -> Any:
+    if value is not None:
+        return value
+    return "" if extra is None else extra
+
+@router.get("/node/{node_id}/history/export")
+async def export_node_history(
+    node_id: str,
+    days: int = 7,
+    db: AsyncSession = Depends(get_db),
+    user_payload: dict = Depends(RequirePermission(Permission.DEVICE_READ))
+) -> Any:
+    """
+    Export raw ThingSpeak history as CSV.
+    Rows are streamed to the client as feeds are decoded from ThingSpeak.
+    """
+    node = await NodeRepository(db).get(node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+    if not node.thingspeak_mappings:
+        raise HTTPException(status_code=400, detail="Node has no telemetry mapping")
+
+    mapping = node.thingspeak_mappings[0]
+    config = {
+        "channel_id": mapping.channel_id,
+        "read_key": mapping.read_api_key,
+        "field_mapping": mapping.field_mapping or {}
+    }
+    columns = ["timestamp", "entry_id"] + list(config["field_mapping"].values()) + list(RAW_FIELDS)
+
+    async def rows():
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        async for batch in ThingSpeakTelemetryService().stream_history(node_id, config, days=days):
+            writer.writerows(batch.to_records())
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        yield output.getvalue()
+
+    response = StreamingResponse(rows(), media_type="text/csv")
+    response.headers["Content-Disposition"] = f"attachment; filename=node_{node_id}_history_{days}d.csv"
+    return response
+
 @router.get("/audit-logs/export")
 async def export_audit_logs(
     db: AsyncSession = Depends(get_db),
@@ -0,0 +1,54 @@
+"""
+Load ThingSpeak channel history into stored readings, then exit.
+
+    python -m app.backfill                       # every channel
+    python -m app.backfill NODE_ID [NODE_ID ...] # just these nodes
+    python -m app.backfill --since 2024-01-01    # start date for channels without a checkpoint
+
+Progress is checkpointed per mapping, so re-running after an interruption
+resumes each channel where it stopped. Safe to run next to the API and the
+ingest worker: writes are idempotent and ThingSpeak requests share the same
+per-key rate limits within this process. Only one backfill runs at a time:
+this exits with an error while another one (CLI or admin API) is running.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from app.core.http import http_clients
+from app.core.logging import setup_logging
+from app.services.telemetry.backfill import BackfillError, thingspeak_backfill
+from app.services.telemetry.rollup import rollups
+
+logger = logging.getLogger("evara_backend")
+
+async def run_backfill(node_ids, since):
+    await http_clients.startup()
+    try:
+        status = await thingspeak_backfill.run(node_ids or None, since)
+        # Rollup buckets touched by the backfill are recomputed from the new readings
+        await rollups.flush()
+    finally:
+        await http_clients.shutdown()
+    return status
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill ThingSpeak history into node_readings")
+    parser.add_argument("node_ids", nargs="*", help="Only these nodes (default: all with a ThingSpeak channel)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="UTC start for channels without a checkpoint")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        status = asyncio.run(run_backfill(args.node_ids, args.since))
+    except KeyboardInterrupt:
+        return
+    except BackfillError as e:
+        logger.error(f"❌ {e}")
+        raise SystemExit(1)
+    print(json.dumps(status, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
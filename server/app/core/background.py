@@ -1,148 +1,95 @@
 import asyncio
+from datetime import datetime, timedelta
+from typing import List
+from app.core.config import get_settings
+from app.core.leader import leader
+from app.services.telemetry.latest import latest_state
+from app.services.telemetry.rollup import rollups
+from app.services.telemetry.stages import ingest_pipeline
+from app.services.telemetry.writer import telemetry_writer
 
-# Global async queue for buffering writes
-write_queue = asyncio.Queue()
+settings = get_settings()
+
+# Global async queue for buffering writes (bounded; see TelemetryWriter)
+write_queue = telemetry_writer.queue
 
 async def process_write_queue():
     """
     Background task to process buffered writes to the database.
-    This prevents the DB from being overwhelmed by high-frequency sensor data.
+    This prevents the DB from being overwhelmed by high-frequency sensor data:
+    queued rows are flushed in multi-row batches by TelemetryWriter.
     """
-    while True:
-        # Get a "work item" out of the queue.
-        item = await write_queue.get()
-        
-        try:
-            # Emulate processing (e.g., bulk insert logic would go here)
-            # await item.save()
-            pass
-        except Exception as e:
-            print(f"Error processing write queue: {e}")
-        finally:
-            # Notify the queue that the "work item" has been processed.
-            write_queue.task_done()
+    print("💾 Telemetry Write Queue Started.")
+    await telemetry_writer.run()
 
-async def start_background_tasks():
+async def start_background_tasks(singletons: bool = True):
+    # Every worker runs its own ingest pipeline and flushes the rows it enqueued
+    # itself (push/MQTT ingestion included)
+    ingest_pipeline.start()
     asyncio.create_task(process_write_queue())
-    asyncio.create_task(poll_thingspeak_loop())
-    asyncio.create_task(cleanup_loop())
+    asyncio.create_task(latest_state.run())
+    asyncio.create_task(rollups.run())
+    # Singleton loops run only in the elected leader process
+    if singletons:
+        asyncio.create_task(leader.run(start_singleton_tasks))
+
+def start_singleton_tasks() -> List[asyncio.Task]:
+    tasks = [
+        asyncio.create_task(poll_thingspeak_loop()),
+        asyncio.create_task(cleanup_loop())
+    ]
+    if settings.MQTT_ENABLED:
+        tasks.append(asyncio.create_task(mqtt_subscriber_loop()))
+    return tasks
 
 async def cleanup_loop():
     """
     Periodic task to clean up old data (Retention Policy).
-    Run every 24 hours.
+    Old months are first moved to the cold archive (if ARCHIVE_AFTER_DAYS is set), then
+    expired monthly partitions are dropped per Plan.retention_days; see RetentionService.
     """
+    from app.services.retention import retention
+    from app.services.telemetry.archive import cold_archive
+
     print("🧹 Data Cleanup Service Started.")
     
     while True:
+        # Separate steps: a failed archive run must not hold back retention
+        if settings.ARCHIVE_AFTER_DAYS:
+            try:
+                archived = await cold_archive.archive_before(datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS))
+                print(f"🧊 Archived {archived['rows']} readings in {archived['months']} node-months")
+            except Exception as e:
+                print(f"❌ Error archiving readings: {e}")
         try:
-            # Skip database operations for now
-            print("🧹 Cleanup skipped - database not available")
-                
+            result = await retention.run_once()
+            print(f"🧹 Retention: dropped {len(result['partitions_dropped'])} partitions, trimmed {result['rows_trimmed']} rows")
         except Exception as e:
             print(f"❌ Error in Cleanup Loop: {e}")
             
-        # Wait 24 hours (approx)
-        await asyncio.sleep(86400)
+        await asyncio.sleep(settings.RETENTION_INTERVAL)
 
 async def poll_thingspeak_loop():
     """
     Periodic task to fetch data from all ThingSpeak-enabled nodes.
+    Each channel is polled on its own adaptive schedule over a shared
+    connection pool; see ThingSpeakPoller and PollScheduler.
     """
-    import httpx
-    import uuid
-    import asyncio
-    from datetime import datetime
-    from sqlalchemy import select
-    from app.db.session import AsyncSessionLocal
-    from app.models.all_models import Node, NodeAnalytics
+    from app.services.telemetry.poller import poller
     
     print("🚀 Telemetry Polling Service Started.")
     
     # Wait a few seconds for the app to start up before initial poll
     await asyncio.sleep(5)
     
-    while True:
-        try:
-            async with AsyncSessionLocal() as session:
-                # Get all nodes that have a thingspeak channel configured
-                result = await session.execute(
-                    select(Node).where(Node.thingspeak_channel_id.isnot(None))
-                )
-                nodes = result.scalars().all()
-                
-                if not nodes:
-                    print("🚀 Polling: No nodes with thingspeak_channel_id found.")
-                
-                async with httpx.AsyncClient() as client:
-                    for node in nodes:
-                        if not node.thingspeak_channel_id:
-                            continue
-                            
-                        url = f"https://api.thingspeak.com/channels/{node.thingspeak_channel_id}/feeds.json"
-                        params = {"results": 1}
-                        if node.thingspeak_read_api_key:
-                            params["api_key"] = node.thingspeak_read_api_key
-                            
-                        try:
-                            response = await client.get(url, params=params, timeout=10.0)
-                            if response.status_code == 200:
-                                data = response.json()
-                                feeds = data.get("feeds", [])
-                                if not feeds:
-                                    continue
-                                    
-                                feed = feeds[0]
-                                
-                                # CRITICAL FIELD MAPPING:
-                                # - EvaraTank: Use field2 for distance (NEVER field1!)
-                                # - EvaraFlow: Use field1 for flow rate
-                                # - EvaraDeep: Use field2 for depth
-                                try:
-                                    if node.analytics_type == "EvaraTank":
-                                        # TANK: field2 = Distance (field1 = Temperature, IGNORED)
-                                        val = float(feed.get("field2", 0) or 0)
-                                    elif node.analytics_type == "EvaraDeep":
-                                        # DEEP: field2 = Depth
-                                        val = float(feed.get("field2", 0) or 0)
-                                    else:
-                                        # FLOW: field1 = Flow rate
-                                        val = float(feed.get("field1", 0) or 0)
-                                except (ValueError, TypeError):
-                                    val = 0.0
-                                    
-                                peak_flow = val if node.analytics_type == "EvaraFlow" else 0.0
-                                avg_level = val if node.analytics_type in ["EvaraTank", "EvaraDeep"] else 0.0
-                                consumption = avg_level * 10 # Mock consumption calculation
-                                
-                                now = datetime.utcnow()
-                                period_start = now.replace(minute=0, second=0, microsecond=0) # Hourly
-                                
-                                # In MVP, we can insert an hourly analytical reading.
-                                # To avoid spamming, we could check if one already exists for this hour, 
-                                # but for demonstration of charts we'll just insert a fresh one or daily one.
-                                
-                                analytics_entry = NodeAnalytics(
-                                    id=str(uuid.uuid4()),
-                                    node_id=node.id,
-                                    period_type="daily", # Dashboard uses daily by default
-                                    period_start=now.replace(hour=0, minute=0, second=0, microsecond=0),
-                                    consumption_liters=consumption,
-                                    avg_level_percent=avg_level,
-                                    peak_flow=peak_flow,
-                                    analytics_metadata={"raw_feed": feed}
-                                )
-                                session.add(analytics_entry)
-                                print(f"✅ Ingested ThingSpeak data for node {node.id}")
-                            else:
-                                print(f"⚠️ ThingSpeak returned {response.status_code} for node {node.id}")
-                        except Exception as req_e:
-                            print(f"❌ Error requesting ThingSpeak for {node.id}: {req_e}")
-                            
-                await session.commit()
-                        
-        except Exception as e:
-            print(f"❌ Error in Polling Loop: {e}")
-            
-        # Wait 60 seconds before next poll
-        await asyncio.sleep(60)
+    await poller.run()
+
+async def mqtt_subscriber_loop():
+    """
+    Long-lived MQTT subscription for devices that publish instead of
+    (or as well as) posting to ThingSpeak. Reconnects on its own.
+    """
+    from app.services.telemetry.mqtt import mqtt_source
+
+    print(f"📡 MQTT Telemetry Subscriber Started ({mqtt_source.subscription}).")
+    await mqtt_source.run()
@@ -33,6 +33,80 @@ class Settings(BaseSettings):
     # ThingSpeak (Telemetry)
     THINGSPEAK_API_KEY: str | None = None
     THINGSPEAK_CHANNEL_ID: str | None = None
+    THINGSPEAK_POLL_INTERVAL: int = 60 # initial per-channel interval; also how often channels are reloaded
+    THINGSPEAK_POLL_MIN_INTERVAL: int = 15 # ThingSpeak free channels can't update faster than this
+    THINGSPEAK_POLL_MAX_INTERVAL: int = 900 # ceiling for dormant channels
+    THINGSPEAK_POLL_MAX_BACKOFF: int = 3600 # ceiling for failing channels
+    THINGSPEAK_POLL_CONCURRENCY: int = 20 # max in-flight channel requests
+    THINGSPEAK_TIMEOUT: float = 10.0 # per-request timeout (seconds)
+    THINGSPEAK_POLL_CATCHUP_PAGES: int = 10 # full pages a poll walks back to reach its watermark after an outage
+    THINGSPEAK_RATE_PER_KEY: float = 2.0 # sustained requests/second per API key (keyless reads share one budget)
+    THINGSPEAK_RATE_BURST: int = 10
+    THINGSPEAK_RATE_MAX_WAIT: float = 2.0 # seconds a request may queue for a token before giving up
+    THINGSPEAK_BREAKER_THRESHOLD: int = 5 # consecutive failures that open a channel's circuit
+    THINGSPEAK_BREAKER_RESET: int = 60 # seconds before an open circuit lets a trial request through
+    CHANNEL_CACHE_TTL: int = 30 # seconds a channel's cached feeds count as live
+    CHANNEL_CACHE_MAX_ENTRIES: int = 1000 # recent feeds kept per channel
+    THINGSPEAK_STREAM_BATCH: int = 500 # feeds per batch when streaming long histories
+
+    # MQTT (Telemetry push source; needs the optional 'aiomqtt' package)
+    MQTT_ENABLED: bool = False
+    MQTT_BROKER_HOST: str = "localhost"
+    MQTT_BROKER_PORT: int = 1883
+    MQTT_USERNAME: str | None = None
+    MQTT_PASSWORD: str | None = None
+    MQTT_TOPIC_PREFIX: str = "evara/nodes" # devices publish to <prefix>/<node_key>/telemetry
+    MQTT_QOS: int = 1
+    MQTT_RECONNECT_MAX: int = 60 # ceiling (seconds) for reconnect backoff
+    MQTT_NODE_CACHE_TTL: int = 300 # seconds a node_key -> node lookup is reused
+    
+    # Outbound HTTP (shared, pooled clients; see app/core/http.py)
+    HTTP_TIMEOUT: float = 10.0 # default read/write/pool timeout (seconds)
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0 # idle seconds before a pooled connection is dropped
+    HTTP_MAX_CONNECTIONS: int = 20 # pool size for miscellaneous upstreams
+    HTTP2_ENABLED: bool = True # used only when the 'h2' package is installed
+    THINGSPEAK_MAX_CONNECTIONS: int = 50 # keep >= THINGSPEAK_POLL_CONCURRENCY
+    SUPABASE_MAX_CONNECTIONS: int = 10
+    
+    # Telemetry write queue (batched DB writer)
+    WRITE_QUEUE_MAXSIZE: int = 10000 # producers block once this many rows are pending
+    WRITE_BATCH_SIZE: int = 500 # flush when a batch reaches this many rows...
+    WRITE_FLUSH_INTERVAL: float = 1.0 # ...or when the oldest pending row is this old (seconds)
+
+    # Background workers (see app/core/leader.py)
+    RUN_BACKGROUND_TASKS: bool = True # False when ingest runs separately via `python -m app.worker`
+    LEADER_ELECTION: str = "auto" # auto | postgres | file | off; auto picks the advisory lock on Postgres
+    LEADER_LOCK_FILE: str = "/tmp/evara-background.lock" # used with SQLite / file mode
+    LEADER_RETRY_INTERVAL: float = 10.0 # seconds between lock attempts and leader health checks
+
+    # Ingest pipeline (see app/services/telemetry/stages.py)
+    PIPELINE_QUEUE_SIZE: int = 1000 # batches waiting per stage before upstream stages block
+    PIPELINE_STORE_CONCURRENCY: int = 4
+    PIPELINE_ALERT_CONCURRENCY: int = 4
+    INGEST_MAX_FUTURE_SKEW: int = 300 # seconds a reading's timestamp may run ahead of server time
+    LATEST_STATE_FLUSH_INTERVAL: float = 2.0 # seconds between node_latest_state upserts
+    LATEST_STATE_CACHE_TTL: float = 5.0 # seconds before a mirrored state is re-read from the table
+    ROLLUP_FLUSH_INTERVAL: float = 10.0 # seconds between node_analytics rollup recomputes of newly written hours
+    RING_BUFFER_SIZE: int = 2880 # recent readings kept in memory per node (~90 bytes each); 0 = off
+
+    # Retention (see app/services/retention.py)
+    DEFAULT_RETENTION_DAYS: int = 30 # for nodes without a customer plan
+    RETENTION_INTERVAL: int = 86400 # seconds between retention runs
+    PARTITION_PREMAKE_MONTHS: int = 2 # monthly partitions created ahead of time (Postgres)
+    ARCHIVE_AFTER_DAYS: int = 0 # move whole months of readings older than this to the cold archive; 0 = off
+    ARCHIVE_DIR: str = "./data/archive" # per-node, per-month compressed reading files
+    ARCHIVE_SHARED: bool = False # set once ARCHIVE_DIR is storage shared by every worker and kept across deploys; archiving deletes no rows until then
+
+    # Historical backfill (see app/services/telemetry/backfill.py)
+    BACKFILL_CONCURRENCY: int = 4 # channels backfilled in parallel
+    BACKFILL_WINDOW_DAYS: float = 7.0 # time window per ThingSpeak page; halved while pages hit the 8000-entry cap
+    BACKFILL_MAX_RETRIES: int = 5 # per page, with exponential backoff, before a channel's backfill stops
+    BACKFILL_LOCK_FILE: str = "/tmp/evara-backfill.lock" # one backfill at a time across processes (SQLite / file mode)
+
+    # Push Ingestion
+    INGEST_MAX_READINGS: int = 5000 # readings accepted per push request
+    INGEST_MAX_BODY_BYTES: int = 5_000_000
     
     # Security
     SECRET_KEY: str = "YOUR_SUPER_SECRET_KEY_HERE_CHANGE_IN_PROD"
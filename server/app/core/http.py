@@ -0,0 +1,100 @@
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+try:
+    import h2  # noqa: F401 - presence enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class HTTPClientRegistry:
+    """
+    Process-wide pooled httpx clients, one per upstream.
+
+    Clients are created at startup (or lazily on first use) and closed at
+    shutdown, so requests reuse keep-alive connections instead of paying a
+    TLS handshake each time. Pool sizes and timeouts come from Settings.
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _upstreams(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "thingspeak": {
+                "base_url": "https://api.thingspeak.com",
+                "max_connections": settings.THINGSPEAK_MAX_CONNECTIONS,
+                "timeout": settings.THINGSPEAK_TIMEOUT
+            },
+            "supabase": {
+                "base_url": settings.SUPABASE_URL or "",
+                "max_connections": settings.SUPABASE_MAX_CONNECTIONS,
+                "timeout": settings.HTTP_TIMEOUT
+            },
+            "default": {
+                "base_url": "",
+                "max_connections": settings.HTTP_MAX_CONNECTIONS,
+                "timeout": settings.HTTP_TIMEOUT
+            }
+        }
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        cfg = self._upstreams().get(name) or self._upstreams()["default"]
+        limits = httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_connections"],
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(cfg["timeout"], connect=settings.HTTP_CONNECT_TIMEOUT)
+        return httpx.AsyncClient(
+            base_url=cfg["base_url"],
+            limits=limits,
+            timeout=timeout,
+            http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE
+        )
+
+    def get(self, name: str = "default") -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build(name)
+            self._clients[name] = client
+        return client
+
+    async def startup(self):
+        for name in self._upstreams():
+            self.get(name)
+        logger.info(f"HTTP client pools ready: {', '.join(self._clients)} (http2={settings.HTTP2_ENABLED and HTTP2_AVAILABLE})")
+
+    async def shutdown(self):
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client '{name}': {e}")
+        self._clients.clear()
+
+    @staticmethod
+    def _pool_metrics(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+        # httpx doesn't expose pool stats publicly; read them off httpcore's pool
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return None
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "max_connections": getattr(pool, "_max_connections", None)
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: self._pool_metrics(client) for name, client in self._clients.items()}
+
+http_clients = HTTPClientRegistry()
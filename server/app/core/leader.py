@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+
+try:
+    import fcntl
+except ImportError: # Windows: no flock, fall back to "every process leads"
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+def lock_key(name: str) -> int:
+    """Stable signed 64-bit key for pg_advisory_lock derived from a lock name."""
+    return int.from_bytes(hashlib.sha1(name.encode()).digest()[:8], "big", signed=True)
+
+class AdvisoryLockBackend:
+    """
+    Postgres session-level advisory lock held on a dedicated connection.
+    If the leader process dies its connection closes and the lock is freed.
+    Needs a session-mode connection: behind a transaction-mode pooler
+    (pgbouncer/Supabase :6543) session locks are not reliable.
+    """
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        self.key = lock_key(name)
+        self._conn = None
+
+    async def acquire(self) -> bool:
+        conn = await self.engine.connect()
+        try:
+            acquired = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})).scalar()
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    async def check(self) -> bool:
+        if self._conn is None:
+            return False
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            await self._conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"Leader lock connection lost: {e}")
+            await self.release()
+            return False
+
+    async def release(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            await conn.commit()
+        except Exception:
+            pass # closing the connection drops the lock anyway
+        finally:
+            await conn.close()
+
+class FileLockBackend:
+    """Exclusive flock on a file; the OS releases it when the holder exits."""
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def check(self) -> bool:
+        return self._fd is not None
+
+    async def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+class NoLockBackend:
+    """Every process is the leader (single-worker deployments, or LEADER_ELECTION=off)."""
+    async def acquire(self) -> bool:
+        return True
+
+    async def check(self) -> bool:
+        return True
+
+    async def release(self):
+        pass
+
+def lock_backend(name: str, lock_file: Optional[str] = None):
+    """The cross-process lock for `name` that LEADER_ELECTION selects (file locks use `lock_file`)."""
+    mode = settings.LEADER_ELECTION
+    if mode == "off":
+        return NoLockBackend()
+    if mode == "postgres" or (mode == "auto" and "postgresql" in settings.DATABASE_URL):
+        from app.db.session import engine
+        return AdvisoryLockBackend(engine, name)
+    if fcntl is None:
+        logger.warning(f"File locks unavailable on this platform; {name} is not exclusive across processes")
+        return NoLockBackend()
+    return FileLockBackend(lock_file or settings.LEADER_LOCK_FILE)
+
+class LeaderElector:
+    """
+    Makes sure singleton background loops (poller, cleanup, MQTT subscriber)
+    run in exactly one process when the app runs under several gunicorn
+    workers. Non-leaders retry every `retry_interval` seconds, so a new leader
+    takes over soon after the old one dies or loses its lock.
+    """
+    def __init__(self, backend=None, name: str = "evara-background", retry_interval: Optional[float] = None):
+        self.name = name
+        self._backend = backend
+        self.retry_interval = retry_interval or settings.LEADER_RETRY_INTERVAL
+        self.is_leader = False
+        self.elections_won = 0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = lock_backend(self.name)
+        return self._backend
+
+    async def _stop_tasks(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run(self, start: Callable[[], List[asyncio.Task]]):
+        """
+        Campaign forever. On winning, call start() to launch the singleton
+        tasks; if the lock is lost, cancel them and campaign again.
+        """
+        while True:
+            try:
+                if not self.is_leader:
+                    if await self.backend.acquire():
+                        self.is_leader = True
+                        self.elections_won += 1
+                        logger.info(f"Process {os.getpid()} is now the background-task leader")
+                        self._tasks = start()
+                elif not await self.backend.check():
+                    logger.warning(f"Process {os.getpid()} lost background-task leadership")
+                    self.is_leader = False
+                    await self._stop_tasks()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leader election error: {e}")
+            await asyncio.sleep(self.retry_interval)
+
+    async def shutdown(self):
+        await self._stop_tasks()
+        if self.is_leader:
+            self.is_leader = False
+            await self.backend.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "backend": type(self.backend).__name__,
+            "elections_won": self.elections_won
+        }
+
+leader = LeaderElector()
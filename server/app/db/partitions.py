@@ -0,0 +1,116 @@
+"""
+Monthly time partitions for the telemetry tables.
+
+On Postgres node_readings and node_analytics are declared PARTITION BY RANGE
+on their time column. Each month gets its own partition, e.g.
+node_readings_y2024m01, and a DEFAULT partition catches rows outside the
+prepared months. Expiring a month is then a DROP TABLE rather than a DELETE.
+SQLite (development and tests) has no partitioning; there the same calls
+fall back to range deletes on the time index. So do Postgres tables created
+before partitioning, until `python cli.py db migrate`'s conversion is run.
+"""
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> the time column it is partitioned on
+PARTITIONED_TABLES = {
+    "node_readings": "timestamp",
+    "node_analytics": "period_start"
+}
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+def parse_partition_name(table: str, name: str):
+    """Month a partition covers, or None for the default partition / unrelated tables."""
+    suffix = name[len(table) + 1:] if name.startswith(f"{table}_") else ""
+    if len(suffix) != 8 or suffix[0] != "y" or suffix[5] != "m" or not (suffix[1:5] + suffix[6:]).isdigit():
+        return None
+    return datetime(int(suffix[1:5]), int(suffix[6:]), 1)
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    """Whether `table` is a partitioned table. Postgres only."""
+    result = await conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": table}
+    )
+    return result.first() is not None
+
+async def list_partitions(conn: AsyncConnection, table: str) -> List[Tuple[str, datetime]]:
+    """(name, month) of each monthly partition of `table`, oldest first. Postgres only."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ),
+        {"table": table}
+    )
+    partitions = []
+    for (name,) in result.all():
+        month = parse_partition_name(table, name)
+        if month is not None:
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda p: p[1])
+
+async def ensure_partitions(conn: AsyncConnection, first: datetime, last: datetime) -> int:
+    """Create the monthly partitions covering [first, last] (and the default ones). Returns how many were new."""
+    if conn.dialect.name != "postgresql":
+        return 0
+    created = 0
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(conn, table):
+            # Created before partitioning; keeps working as a plain table
+            logger.warning(f"⚠️ {table} is not partitioned; see `python cli.py db migrate` to convert it")
+            continue
+        existing = {name for name, _ in await list_partitions(conn, table)}
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+        month = month_start(first)
+        while month <= last:
+            name = partition_name(table, month)
+            if name not in existing:
+                # Fails if the default partition already holds rows for this month; those stay there
+                # (still queryable) until retention removes them.
+                try:
+                    async with conn.begin_nested():
+                        await conn.execute(text(
+                            f"CREATE TABLE {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                        ))
+                    created += 1
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not create partition {name}: {e}")
+            month = add_months(month, 1)
+    return created
+
+async def drop_partitions_before(conn: AsyncConnection, cutoff: datetime) -> List[str]:
+    """
+    Expire everything older than `cutoff` in the partitioned tables.
+    Whole months before the cutoff are dropped; the remainder (the default
+    partition, or the whole table on SQLite) is cleared with a range delete.
+    """
+    dropped = []
+    for table, column in PARTITIONED_TABLES.items():
+        if conn.dialect.name == "postgresql" and await is_partitioned(conn, table):
+            for name, month in await list_partitions(conn, table):
+                if add_months(month, 1) <= cutoff:
+                    await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    dropped.append(name)
+            await conn.execute(text(f"DELETE FROM {table}_default WHERE {column} < :cutoff"), {"cutoff": cutoff})
+        else:
+            await conn.execute(text(f"DELETE FROM {table} WHERE {column} < :cutoff"), {"cutoff": cutoff})
+    return dropped
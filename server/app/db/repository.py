@@ -1,13 +1,93 @@
-from typing import Generic, TypeVar, Type, List, Optional, Any
+from typing import Generic, TypeVar, Type, List, Optional, Any, AsyncIterator
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import JSON, select, update, delete, func, insert, literal_column
 from sqlalchemy.orm import selectinload
 from app.db.base import Base
-from app.models.all_models import Node, User, Distributor, Community, Customer, Plan, AuditLog
+from app.models.all_models import Node, NodeReading, User, Distributor, Community, Customer, Plan, AuditLog
 from app.services.security import EncryptionService
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+def insert_ignore(model: Any, dialect_name: str):
+    """
+    INSERT that silently skips rows violating a unique/primary key.
+    ON CONFLICT DO NOTHING on Postgres, INSERT OR IGNORE on SQLite.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return insert(model).prefix_with("OR IGNORE")
+    return insert(model)
+
+def insert_merge(model: Any, dialect_name: str, index_elements: List[str]):
+    """
+    INSERT that, when a row's unique key is already taken, fills the stored
+    row's empty columns from the incoming one instead of skipping it. Stored
+    values win, so a resend changes nothing, while a second source for the
+    same key (e.g. another channel of the node) adds the values it carries.
+    JSON object columns are merged key by key the same way.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(model)
+    stmt = dialect_insert(model)
+    table = model.__table__
+    set_ = {}
+    for column in table.columns:
+        if column.primary_key or column.name in index_elements:
+            continue
+        current, incoming = f"{table.name}.{column.name}", f"excluded.{column.name}"
+        if not isinstance(column.type, JSON):
+            set_[column.name] = func.coalesce(table.c[column.name], stmt.excluded[column.name])
+        elif dialect_name == "postgresql":
+            set_[column.name] = literal_column(
+                f"CASE WHEN json_typeof({incoming}) = 'object' THEN ({incoming}::jsonb || "
+                f"CASE WHEN json_typeof({current}) = 'object' THEN {current}::jsonb ELSE '{{}}'::jsonb END)::json "
+                f"ELSE {current} END"
+            )
+        else:
+            # JSON columns hold the text 'null' for None, so only merge actual objects
+            set_[column.name] = literal_column(
+                f"CASE WHEN json_type({incoming}) = 'object' THEN json_patch({incoming}, "
+                f"CASE WHEN json_type({current}) = 'object' THEN {current} ELSE '{{}}' END) "
+                f"ELSE {current} END"
+            )
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+def upsert(
+    model: Any,
+    dialect_name: str,
+    index_elements: List[str],
+    update_columns: List[str],
+    only_if_newer: Optional[str] = None
+):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE SET update_columns.
+    With `only_if_newer`, an existing row is only overwritten when the
+    incoming value of that column is not older (late data can't regress it).
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(model)
+    stmt = dialect_insert(model)
+    where = None
+    if only_if_newer:
+        current = getattr(model, only_if_newer)
+        where = current.is_(None) | (current <= getattr(stmt.excluded, only_if_newer))
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={col: getattr(stmt.excluded, col) for col in update_columns},
+        where=where
+    )
+
 class BaseRepository(Generic[ModelType]):
     def __init__(self, model: Type[ModelType], session: AsyncSession):
         self.model = model
@@ -196,3 +276,45 @@ class AuditLogRepository(BaseRepository[AuditLog]):
             
         result = await self.session.execute(query.order_by(self.model.timestamp.desc()).offset(skip).limit(limit))
         return result.scalars().all()
+
+class ReadingRepository(BaseRepository[NodeReading]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(NodeReading, session)
+
+    def _range_query(self, node_id: str, start: Optional[datetime], end: Optional[datetime], newest_first: bool):
+        # Bounded on (node_id, timestamp) so it is served by the composite index
+        query = select(self.model).filter(self.model.node_id == node_id)
+        if start:
+            query = query.filter(self.model.timestamp >= start)
+        if end:
+            query = query.filter(self.model.timestamp < end)
+        order = self.model.timestamp.desc() if newest_first else self.model.timestamp.asc()
+        return query.order_by(order)
+
+    async def get_range(
+        self,
+        node_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False
+    ) -> List[NodeReading]:
+        query = self._range_query(node_id, start, end, newest_first)
+        if limit:
+            query = query.limit(limit)
+        result = await self.session.execute(query)
+        return result.scalars().all()
+
+    async def stream_range(
+        self,
+        node_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[NodeReading]]:
+        """Oldest-first readings in `batch_size` chunks, without loading the whole range."""
+        result = await self.session.stream_scalars(
+            self._range_query(node_id, start, end, newest_first=False).execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions(batch_size):
+            yield partition
@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from datetime import datetime
 from app.core.config import get_settings
+from app.db.partitions import add_months, ensure_partitions, month_start
 
 settings = get_settings()
 
@@ -56,6 +58,9 @@ async def create_tables():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(ModelsBase.metadata.create_all)
+            # Postgres: monthly telemetry partitions for now and the next few months
+            now = datetime.utcnow()
+            await ensure_partitions(conn, now, add_months(month_start(now), settings.PARTITION_PREMAKE_MONTHS))
         print("✅ Database tables created successfully")
     except Exception as e:
         if "DuplicateObjectError" in str(e) or "duplicate key value violates unique constraint" in str(e):
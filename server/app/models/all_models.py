@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, JSON, DateTime, Boolean, Date
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, JSON, DateTime, Boolean, Date, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.db.base import Base
 from datetime import datetime
@@ -169,7 +169,11 @@ class DeviceThingSpeakMapping(Base):
     read_api_key: Mapped[str] = mapped_column(String, nullable=True)
     write_api_key: Mapped[str] = mapped_column(String, nullable=True)
     field_mapping: Mapped[dict] = mapped_column(JSON, default={})
-    last_sync_time: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # Incremental sync watermark: newest entry already ingested from this channel
+    last_sync_time: Mapped[datetime] = mapped_column(DateTime, nullable=True) # created_at of last_entry_id
+    last_entry_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    # Backfill checkpoint: history up to here is stored (see app/services/telemetry/backfill.py)
+    backfilled_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     device = relationship("Node", back_populates="thingspeak_mappings")
 
 # ─── UTILITY MODELS ───
@@ -212,17 +216,69 @@ class Pipeline(Base):
 
 class NodeAnalytics(Base):
     __tablename__ = "node_analytics"
+    # One row per node per period, upserted as readings arrive (see telemetry/rollup.py)
+    # Range-partitioned by month on Postgres (app/db/partitions.py), so the key includes period_start
+    __table_args__ = (
+        UniqueConstraint("node_id", "period_type", "period_start", name="uq_node_analytics_period"),
+        {"postgresql_partition_by": "RANGE (period_start)"}
+    )
     
     id: Mapped[str] = mapped_column(String, primary_key=True)
     node_id: Mapped[str] = mapped_column(ForeignKey("nodes.id"))
     period_type: Mapped[str] = mapped_column(String)  # hourly, daily, weekly, monthly
-    period_start: Mapped[datetime] = mapped_column(DateTime)
+    period_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
     consumption_liters: Mapped[float] = mapped_column(Float, nullable=True)
     avg_level_percent: Mapped[float] = mapped_column(Float, nullable=True)
     peak_flow: Mapped[float] = mapped_column(Float, nullable=True)
+    # Running aggregates of the node's primary metric over the period
+    sample_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    value_sum: Mapped[float] = mapped_column(Float, nullable=True)
+    value_min: Mapped[float] = mapped_column(Float, nullable=True)
+    value_max: Mapped[float] = mapped_column(Float, nullable=True)
     analytics_metadata: Mapped[dict] = mapped_column(JSON, nullable=True, name="metadata")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+class NodeReading(Base):
+    __tablename__ = "node_readings"
+    # One reading per node per instant. Keyed on timestamp rather than entry_id because
+    # entry_id is per-channel (a node may map several channels) and absent for pushed data.
+    # Overlapping polls, retries and backfills are deduplicated by this key on insert, and
+    # channels reporting the same instant are merged into one row (TelemetryWriter).
+    # The unique key doubles as the composite (node_id, timestamp) index behind range scans.
+    # Range-partitioned by month on Postgres (app/db/partitions.py), so the key includes timestamp.
+    __table_args__ = (
+        UniqueConstraint("node_id", "timestamp", name="uq_node_readings_node_ts"),
+        {"postgresql_partition_by": "RANGE (timestamp)"}
+    )
+    
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    node_id: Mapped[str] = mapped_column(ForeignKey("nodes.id"))
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    entry_id: Mapped[int] = mapped_column(Integer, nullable=True) # ThingSpeak entry_id, if sourced from a channel
+    # Numeric values of the ThingSpeak fields; mapped names (field_mapping) resolve to these
+    field1: Mapped[float] = mapped_column(Float, nullable=True)
+    field2: Mapped[float] = mapped_column(Float, nullable=True)
+    field3: Mapped[float] = mapped_column(Float, nullable=True)
+    field4: Mapped[float] = mapped_column(Float, nullable=True)
+    field5: Mapped[float] = mapped_column(Float, nullable=True)
+    field6: Mapped[float] = mapped_column(Float, nullable=True)
+    field7: Mapped[float] = mapped_column(Float, nullable=True)
+    field8: Mapped[float] = mapped_column(Float, nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, nullable=True) # Only values with no numeric column (e.g. text statuses)
+
+class NodeLatestState(Base):
+    __tablename__ = "node_latest_state"
+    # One row per node, upserted by ingestion: "what is it reading now" without
+    # touching ThingSpeak or the readings history.
+
+    node_id: Mapped[str] = mapped_column(ForeignKey("nodes.id"), primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=True) # time of the newest reading
+    entry_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    source: Mapped[str] = mapped_column(String, nullable=True) # thingspeak, push, mqtt
+    value: Mapped[float] = mapped_column(Float, nullable=True) # primary metric (tank/deep distance, flow rate)
+    metrics: Mapped[dict] = mapped_column(JSON, nullable=True) # merged latest values across the node's channels
+    last_seen: Mapped[datetime] = mapped_column(DateTime, nullable=True) # when ingestion last heard from the node
+
 # ─── ALERTING MODELS ───
 
 class AlertRule(Base):
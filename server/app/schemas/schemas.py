@@ -210,6 +210,10 @@ class SystemConfigResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BackfillRequest(BaseModel):
+    node_ids: Optional[List[str]] = None # default: every node with a ThingSpeak channel
+    since: Optional[datetime] = None # for channels without a checkpoint; default: channel creation
+
 class AuditLogResponse(BaseModel):
     id: str
     action_type: str
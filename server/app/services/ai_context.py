@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import all_models as models
+from app.services.telemetry.latest import latest_state
 from typing import Dict, Any
 
 class AIContextService:
@@ -39,6 +40,7 @@ class AIContextService:
                 select(models.Node).where(models.Node.community_id == user.community_id)
             )
         nodes = nodes_result.scalars().all()
+        states = await latest_state.get_many(self.db, [n.id for n in nodes])
         
         context["nodes"] = [
             {
@@ -46,7 +48,9 @@ class AIContextService:
                 "label": n.label,
                 "status": n.status,
                 "type": n.analytics_type,
-                "location": n.location_name
+                "location": n.location_name,
+                "latest_value": states.get(n.id, {}).get("value"),
+                "last_seen": str(states[n.id]["last_seen"]) if n.id in states else None
             }
             for n in nodes
         ]
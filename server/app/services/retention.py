@@ -0,0 +1,79 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+
+from app.core.config import get_settings
+from app.db.partitions import add_months, drop_partitions_before, ensure_partitions, month_start
+from app.db.session import engine as default_engine
+from app.models.all_models import Customer, Node, NodeAnalytics, NodeReading, Plan
+from app.services.telemetry.archive import cold_archive
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class RetentionService:
+    """
+    Enforces Plan.retention_days on stored telemetry.
+
+    Data older than the longest retention any node needs is expired by
+    dropping whole monthly partitions (see app/db/partitions.py). Nodes on
+    shorter plans then have their older readings and rollups removed with one
+    (node_id, time) range delete per plan. These deletes only touch months the
+    plan has expired, never the current month's partition unless a plan keeps
+    less than a month of data.
+    """
+    def __init__(self, engine=None, archive=None):
+        self.engine = engine or default_engine
+        self.archive = archive or cold_archive
+        self.last_run: Dict[str, Any] = {}
+
+    async def node_retention(self, conn) -> Dict[str, int]:
+        """Retention in days for every node: its customer's plan, else DEFAULT_RETENTION_DAYS."""
+        result = await conn.execute(
+            select(Node.id, Plan.retention_days)
+            .outerjoin(Customer, Node.customer_id == Customer.id)
+            .outerjoin(Plan, Customer.plan_id == Plan.id)
+        )
+        return {node_id: days or settings.DEFAULT_RETENTION_DAYS for node_id, days in result.all()}
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.utcnow()
+        async with self.engine.begin() as conn:
+            retention = await self.node_retention(conn)
+            longest = max([settings.DEFAULT_RETENTION_DAYS, *retention.values()])
+            cutoff = now - timedelta(days=longest)
+
+            # Keep partitions ready for every retained month plus the next few
+            created = await ensure_partitions(conn, month_start(cutoff), add_months(month_start(now), settings.PARTITION_PREMAKE_MONTHS))
+            dropped = await drop_partitions_before(conn, cutoff)
+
+            by_days: Dict[int, List[str]] = defaultdict(list)
+            for node_id, days in retention.items():
+                if days < longest:
+                    by_days[days].append(node_id)
+            trimmed = archived_removed = 0
+            for node_id, days in retention.items():
+                # Archived months follow the same per-plan retention
+                archived_removed += self.archive.expire(node_id, now - timedelta(days=days))
+            for days, node_ids in by_days.items():
+                node_cutoff = now - timedelta(days=days)
+                for model, column in ((NodeReading, NodeReading.timestamp), (NodeAnalytics, NodeAnalytics.period_start)):
+                    result = await conn.execute(
+                        delete(model).where(model.node_id.in_(node_ids), column >= cutoff, column < node_cutoff)
+                    )
+                    trimmed += result.rowcount or 0
+
+        self.last_run = {
+            "at": now.isoformat(),
+            "longest_retention_days": longest,
+            "partitions_created": created,
+            "partitions_dropped": dropped,
+            "rows_trimmed": trimmed,
+            "archive_months_removed": archived_removed
+        }
+        return self.last_run
+
+retention = RetentionService()
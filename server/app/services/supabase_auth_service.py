@@ -1,5 +1,5 @@
-import httpx
 from app.core.config import get_settings
+from app.core.http import http_clients
 
 class SupabaseAuthService:
     def __init__(self):
@@ -33,16 +33,15 @@ class SupabaseAuthService:
             "user_metadata": user_metadata or {}
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.url}/auth/v1/admin/users",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code != 201:
-                error_msg = response.json().get('msg', 'Unknown error')
-                print(f"FAILED TO CREATE USER: {error_msg}")
-                return None
-            
-            return response.json()
+        response = await http_clients.get("supabase").post(
+            f"{self.url}/auth/v1/admin/users",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code != 201:
+            error_msg = response.json().get('msg', 'Unknown error')
+            print(f"FAILED TO CREATE USER: {error_msg}")
+            return None
+        
+        return response.json()
@@ -0,0 +1,316 @@
+"""
+Cold archive for readings past ARCHIVE_AFTER_DAYS.
+
+Each node's readings for one month are kept in a single compressed columnar
+file, ARCHIVE_DIR/<node_id>/<YYYY-MM>.npz, and deleted from node_readings.
+Timestamps (milliseconds) are stored as delta-of-delta and each field as
+the XOR of consecutive float64 bit patterns (Gorilla-style), byte-shuffled so
+the mostly-zero high bytes sit together before deflate. A regular reading
+series costs a few bytes per reading instead of a full table row.
+
+Archived months exist only in these files, and every API worker and the
+ingest worker read them. ARCHIVE_DIR must therefore be storage they all
+share and that outlives a deploy (a mounted volume, NFS, an object-store
+mount). Until ARCHIVE_SHARED says so, archive_before leaves node_readings
+untouched.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import delete, func, null, select, update
+
+from app.core.config import get_settings
+from app.db.partitions import add_months, month_start
+from app.db.repository import ReadingRepository, insert_ignore
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import NodeAnalytics, NodeReading
+from app.services.telemetry.normalize import RAW_FIELDS
+from app.services.telemetry_processor import TelemetryProcessor
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+EPOCH = datetime(1970, 1, 1)
+MISSING_ENTRY_ID = -1
+FOLD_BATCH = 1000 # legacy node_analytics rows folded per transaction; keeps IN lists well under bind-parameter limits
+
+class ArchivedReading:
+    """A reading read back from the archive; same attributes as NodeReading."""
+    __slots__ = ("id", "node_id", "timestamp", "entry_id", "data") + RAW_FIELDS
+
+    def __init__(self, node_id: str, timestamp: datetime, entry_id: Optional[int], values: Dict[str, Optional[float]], data: Optional[Dict[str, Any]]):
+        self.id = None
+        self.node_id = node_id
+        self.timestamp = timestamp
+        self.entry_id = entry_id
+        self.data = data
+        for field in RAW_FIELDS:
+            setattr(self, field, values.get(field))
+
+# ─── Encoding ───
+
+def encode_timestamps(ms: np.ndarray) -> np.ndarray:
+    """[first, first delta, delta-of-deltas...]; regular intervals become runs of zeros."""
+    if len(ms) < 2:
+        return ms.copy()
+    deltas = np.diff(ms)
+    return np.concatenate(([ms[0], deltas[0]], np.diff(deltas)))
+
+def decode_timestamps(encoded: np.ndarray) -> np.ndarray:
+    if len(encoded) < 2:
+        return encoded.copy()
+    deltas = np.cumsum(encoded[1:])
+    return np.concatenate(([encoded[0]], encoded[0] + np.cumsum(deltas)))
+
+def encode_floats(values: np.ndarray) -> np.ndarray:
+    """XOR each float64's bits with its predecessor's, then group bytes by significance."""
+    bits = values.astype(np.float64).view(np.uint64)
+    xored = bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+    return xored.view(np.uint8).reshape(-1, 8).T.copy()
+
+def decode_floats(shuffled: np.ndarray) -> np.ndarray:
+    xored = shuffled.T.copy().view(np.uint64).ravel()
+    return np.bitwise_xor.accumulate(xored).view(np.float64)
+
+def encode_month(rows: List[Dict[str, Any]]) -> bytes:
+    """Columnar, compressed encoding of readings (dicts with NodeReading's columns), sorted by time."""
+    rows = sorted(rows, key=lambda r: r["timestamp"])
+    ms = np.array([(r["timestamp"] - EPOCH) // timedelta(milliseconds=1) for r in rows], dtype=np.int64)
+    entry_ids = np.array([MISSING_ENTRY_ID if r.get("entry_id") is None else r["entry_id"] for r in rows], dtype=np.int64)
+    arrays = {
+        "timestamps": encode_timestamps(ms),
+        "entry_ids": np.diff(entry_ids, prepend=np.int64(0))
+    }
+    for field in RAW_FIELDS:
+        values = np.array([np.nan if r.get(field) is None else r[field] for r in rows], dtype=np.float64)
+        if not np.isnan(values).all():
+            arrays[field] = encode_floats(values)
+    extras = {str(i): r["data"] for i, r in enumerate(rows) if r.get("data")}
+    if extras:
+        arrays["extras"] = np.array(json.dumps(extras, default=str))
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+def decode_month(node_id: str, payload: bytes) -> List[ArchivedReading]:
+    with np.load(io.BytesIO(payload)) as archive:
+        ms = decode_timestamps(archive["timestamps"])
+        entry_ids = np.cumsum(archive["entry_ids"])
+        columns = {f: decode_floats(archive[f]) for f in RAW_FIELDS if f in archive.files}
+        extras = json.loads(str(archive["extras"])) if "extras" in archive.files else {}
+    lists = {f: np.where(np.isnan(v), None, v).tolist() for f, v in columns.items()}
+    readings = []
+    for i, stamp in enumerate(ms.tolist()):
+        readings.append(ArchivedReading(
+            node_id,
+            EPOCH + timedelta(milliseconds=stamp),
+            None if entry_ids[i] == MISSING_ENTRY_ID else int(entry_ids[i]),
+            {f: values[i] for f, values in lists.items()},
+            extras.get(str(i))
+        ))
+    return readings
+
+# ─── Storage ───
+
+def _overlaps(month: datetime, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    return not ((start and add_months(month, 1) <= start) or (end and month >= end))
+
+class ColdArchive:
+    def __init__(self, root: Optional[str] = None, session_factory=None, shared: Optional[bool] = None):
+        self.root = root or settings.ARCHIVE_DIR
+        self.shared = settings.ARCHIVE_SHARED if shared is None else shared
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.last_run: Dict[str, Any] = {}
+
+    def _node_dir(self, node_id: str) -> str:
+        return os.path.join(self.root, quote(node_id, safe=""))
+
+    def path(self, node_id: str, month: datetime) -> str:
+        return os.path.join(self._node_dir(node_id), f"{month:%Y-%m}.npz")
+
+    def months(self, node_id: str) -> List[datetime]:
+        try:
+            names = os.listdir(self._node_dir(node_id))
+        except FileNotFoundError:
+            return []
+        months = []
+        for name in names:
+            try:
+                months.append(datetime.strptime(name, "%Y-%m.npz"))
+            except ValueError:
+                continue
+        return sorted(months)
+
+    def read_month(self, node_id: str, month: datetime) -> List[ArchivedReading]:
+        try:
+            with open(self.path(node_id, month), "rb") as f:
+                return decode_month(node_id, f.read())
+        except FileNotFoundError:
+            return []
+
+    def write_month(self, node_id: str, month: datetime, rows: List[Dict[str, Any]]):
+        """Merge `rows` into the node's file for `month` (new rows win on equal timestamps)."""
+        merged = {r.timestamp: {c: getattr(r, c) for c in ArchivedReading.__slots__} for r in self.read_month(node_id, month)}
+        merged.update({r["timestamp"]: r for r in rows})
+        path = self.path(node_id, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(encode_month(list(merged.values())))
+        os.replace(tmp, path) # readers never see a half-written month
+
+    def read_range(self, node_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[List[ArchivedReading]]:
+        """Archived readings in [start, end), one oldest-first list per month."""
+        batches = []
+        for month in self.months(node_id):
+            if not _overlaps(month, start, end):
+                continue
+            readings = [
+                r for r in self.read_month(node_id, month)
+                if (not start or r.timestamp >= start) and (not end or r.timestamp < end)
+            ]
+            if readings:
+                batches.append(readings)
+        return batches
+
+    def has_range(self, node_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> bool:
+        """Whether any archived month overlaps [start, end) (by file, without decoding)."""
+        return any(_overlaps(month, start, end) for month in self.months(node_id))
+
+    def expire(self, node_id: str, cutoff: datetime) -> int:
+        """Delete the node's archived months that end before `cutoff` (retention)."""
+        removed = 0
+        for month in self.months(node_id):
+            if add_months(month, 1) <= cutoff:
+                os.remove(self.path(node_id, month))
+                removed += 1
+        return removed
+
+    # ─── Archiving ───
+
+    async def archive_before(self, cutoff: datetime) -> Dict[str, Any]:
+        """Move every whole month of readings older than `cutoff` into the archive."""
+        boundary = month_start(cutoff) # only complete months
+        if not self.shared:
+            # Deleting rows into a disk other processes can't see (or a deploy wipes) loses them
+            logger.warning(f"⚠️ Not archiving: {self.root} is not marked as shared storage (ARCHIVE_SHARED)")
+            self.last_run = {"at": datetime.utcnow().isoformat(), "before": boundary.isoformat(), "rows": 0, "months": 0, "skipped": "ARCHIVE_SHARED is off"}
+            return self.last_run
+        archived_rows, files = 0, 0
+        async with self.session_factory() as session:
+            folded = await self._fold_legacy_feeds(session, boundary)
+            result = await session.execute(
+                select(NodeReading.node_id, func.min(NodeReading.timestamp))
+                .where(NodeReading.timestamp < boundary)
+                .group_by(NodeReading.node_id)
+            )
+            todo = []
+            for node_id, oldest in result.all():
+                month = month_start(oldest)
+                while month < boundary:
+                    todo.append((node_id, month))
+                    month = add_months(month, 1)
+            for node_id, month in todo:
+                end = add_months(month, 1)
+                rows = [
+                    {c: getattr(r, c) for c in ArchivedReading.__slots__}
+                    for r in await ReadingRepository(session).get_range(node_id, month, end)
+                ]
+                if not rows:
+                    continue
+                # File first, then delete: a crash in between leaves rows in both, never neither
+                await asyncio.to_thread(self.write_month, node_id, month, rows)
+                await session.execute(
+                    delete(NodeReading).where(NodeReading.node_id == node_id, NodeReading.timestamp >= month, NodeReading.timestamp < end)
+                )
+                await session.commit()
+                archived_rows += len(rows)
+                files += 1
+        self.last_run = {
+            "at": datetime.utcnow().isoformat(),
+            "before": boundary.isoformat(),
+            "rows": archived_rows,
+            "months": files,
+            "legacy_feeds_cleared": folded
+        }
+        return self.last_run
+
+    async def _fold_legacy_feeds(self, session, boundary: datetime) -> int:
+        """
+        Older node_analytics rows carry a raw ThingSpeak feed in their metadata.
+        Feeds with no stored reading become readings (archived with the rest of
+        their month) and the metadata is cleared. Works through the rows
+        FOLD_BATCH at a time in id order. Returns the rows cleared.
+        """
+        cleared = 0
+        last_id = None
+        while True:
+            # null(): on a JSON column, None would be stored as the JSON value 'null',
+            # which is NOT NULL in SQL and would be picked up again on every run
+            query = (
+                select(NodeAnalytics.id, NodeAnalytics.node_id, NodeAnalytics.analytics_metadata)
+                .where(NodeAnalytics.period_start < boundary, NodeAnalytics.analytics_metadata.isnot(null()))
+                .order_by(NodeAnalytics.id)
+                .limit(FOLD_BATCH)
+            )
+            if last_id is not None:
+                query = query.where(NodeAnalytics.id > last_id)
+            result = (await session.execute(query)).all()
+            if not result:
+                return cleared
+            ids, rows = [], []
+            for analytics_id, node_id, metadata in result:
+                ids.append(analytics_id)
+                feed = (metadata or {}).get("raw_feed")
+                if isinstance(feed, dict) and feed.get("created_at"):
+                    rows += TelemetryProcessor.build_reading_rows(node_id, [{**feed, "timestamp": feed["created_at"]}])
+            if rows:
+                # Readings already stored for the same instant win
+                await session.execute(insert_ignore(NodeReading, session.bind.dialect.name), rows)
+            await session.execute(update(NodeAnalytics).where(NodeAnalytics.id.in_(ids)).values(analytics_metadata=null()))
+            await session.commit()
+            cleared += len(ids)
+            last_id = ids[-1]
+
+cold_archive = ColdArchive()
+
+async def stream_readings(
+    session,
+    node_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[List[Any]]:
+    """
+    A node's readings in [start, end), oldest first: archived months, then
+    node_readings. A month archived but not yet deleted from the table (a run
+    interrupted in between) is served once, from the archive.
+    """
+    archived: Dict[datetime, set] = {}
+    for batch in await asyncio.to_thread(cold_archive.read_range, node_id, start, end):
+        archived[month_start(batch[0].timestamp)] = {r.timestamp for r in batch}
+        yield batch
+    async for batch in ReadingRepository(session).stream_range(node_id, start, end, batch_size):
+        if archived:
+            batch = [r for r in batch if r.timestamp not in archived.get(month_start(r.timestamp), ())]
+            if not batch:
+                continue
+        yield batch
+
+async def last_readings(session, node_id: str, count: int) -> List[Any]:
+    """The node's newest `count` readings, oldest first, topped up from the archive when the table has fewer."""
+    rows = list(reversed(await ReadingRepository(session).get_range(node_id, limit=count, newest_first=True)))
+    months = cold_archive.months(node_id)
+    while len(rows) < count and months:
+        older = await asyncio.to_thread(cold_archive.read_month, node_id, months.pop())
+        if rows:
+            older = [r for r in older if r.timestamp < rows[0].timestamp]
+        rows = older[-(count - len(rows)):] + rows
+    return rows
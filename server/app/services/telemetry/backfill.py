@@ -0,0 +1,257 @@
+"""
+Historical backfill of ThingSpeak channels into node_readings.
+
+The poller only ingests entries newer than a channel's watermark (its first
+sync fetches just the latest entry). A backfill walks a channel's history
+from its creation (or a given date) up to now in time-windowed pages, many
+channels in parallel. Each page is written through the telemetry writer's
+idempotent insert and then checkpointed on the mapping row
+(DeviceThingSpeakMapping.backfilled_until), so an interrupted run resumes
+where it stopped and overlapping pages never duplicate readings. A
+cross-process lock (see app/core/leader.py) lets only one backfill run at a
+time, whether it was started from the admin API on any worker or the CLI.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import update
+
+from app.core.config import get_settings
+from app.core.http import http_clients
+from app.core.leader import lock_backend
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import DeviceThingSpeakMapping, NodeReading
+from app.services.telemetry.normalize import get_normalizer
+from app.services.telemetry.poller import ThingSpeakPoller, poller
+from app.services.telemetry.rollup import rollups
+from app.services.telemetry.throttle import thingspeak_guard
+from app.services.telemetry.writer import telemetry_writer
+from app.services.telemetry_processor import TelemetryProcessor, parse_timestamp
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+MIN_WINDOW = timedelta(minutes=1)
+
+class BackfillError(Exception):
+    """A page could not be fetched or written after every retry."""
+
+class ThingSpeakBackfill:
+    """
+    Backfill job over every ThingSpeak target (see ThingSpeakPoller.load_targets).
+
+    Channels run BACKFILL_CONCURRENCY at a time. Every request goes through
+    thingspeak_guard, so backfills share each API key's request budget and
+    each channel's circuit breaker with live polling. A page that comes back
+    at ThingSpeak's 8000-entry cap was truncated, so it is re-fetched with
+    half the window. The window grows back once pages are small again. A
+    page still at the cap at MIN_WINDOW is stored as is; it is logged and
+    counted as `truncated` in the target's status.
+    """
+    def __init__(
+        self,
+        window: Optional[timedelta] = None,
+        concurrency: Optional[int] = None,
+        session_factory=None,
+        writer=None,
+        client: Optional[httpx.AsyncClient] = None,
+        lock=None
+    ):
+        self.window = window or timedelta(days=settings.BACKFILL_WINDOW_DAYS)
+        self.concurrency = concurrency or settings.BACKFILL_CONCURRENCY
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.writer = writer or telemetry_writer
+        self.client = client
+        self._lock = lock
+        # Checkpoints for legacy Node-column channels, which have no mapping row to persist them
+        self._checkpoints: Dict[tuple, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.status: Dict[str, Any] = {"running": False, "targets": {}}
+
+    @property
+    def running(self) -> bool:
+        return self.status["running"]
+
+    @property
+    def lock(self):
+        if self._lock is None:
+            self._lock = lock_backend("evara-backfill", settings.BACKFILL_LOCK_FILE)
+        return self._lock
+
+    async def _request(self, target: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """One feeds.json request, retried with exponential backoff on errors, 429s and rate-limit waits."""
+        client = self.client or http_clients.get("thingspeak")
+        params = dict(params)
+        if target["read_key"]:
+            params["api_key"] = target["read_key"]
+        url = f"{ThingSpeakPoller.BASE_URL}/channels/{target['channel_id']}/feeds.json"
+        error = None
+        for attempt in range(settings.BACKFILL_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(min(2 ** attempt, 60))
+            try:
+                response = await thingspeak_guard.call(
+                    target["channel_id"],
+                    target["read_key"],
+                    lambda: client.get(url, params=params),
+                    max_wait=settings.THINGSPEAK_TIMEOUT
+                )
+            except Exception as e:
+                error = str(e)
+                continue
+            if response.status_code == 200:
+                return response.json()
+            error = f"ThingSpeak returned {response.status_code}"
+            if response.status_code != 429 and response.status_code < 500:
+                break # bad key, unknown channel: retrying won't help
+        raise BackfillError(f"channel {target['channel_id']}: {error}")
+
+    def _checkpoint(self, target: Dict[str, Any]) -> Optional[datetime]:
+        if target["mapping_id"]:
+            return target.get("backfilled_until")
+        return self._checkpoints.get((target["node_id"], target["channel_id"]))
+
+    async def _save_checkpoint(self, target: Dict[str, Any], cursor: datetime):
+        target["backfilled_until"] = cursor
+        if not target["mapping_id"]:
+            self._checkpoints[(target["node_id"], target["channel_id"])] = cursor
+            return
+        async with self.session_factory() as session:
+            await session.execute(
+                update(DeviceThingSpeakMapping)
+                .where(DeviceThingSpeakMapping.id == target["mapping_id"])
+                .values(backfilled_until=cursor)
+            )
+            await session.commit()
+
+    async def _write(self, target: Dict[str, Any], feeds: List[Dict[str, Any]]) -> int:
+        readings = get_normalizer(target["field_mapping"]).normalize(feeds)
+        rows = TelemetryProcessor.build_reading_rows(target["node_id"], readings)
+        size = self.writer.batch_size
+        for i in range(0, len(rows), size):
+            if not await self.writer.flush([(NodeReading, row) for row in rows[i:i + size]]):
+                raise BackfillError(f"writing readings for node {target['node_id']} failed")
+        return len(rows)
+
+    async def backfill_target(self, target: Dict[str, Any], since: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Walk one channel's history from its checkpoint (else `since`, else
+        channel creation) up to the poller's watermark, or now if the channel
+        was never polled.
+        """
+        progress = self.status["targets"].setdefault(
+            f"{target['node_id']}:{target['channel_id']}", {"state": "running", "rows": 0, "pages": 0, "truncated": 0}
+        )
+        until = min(target.get("last_sync_time") or datetime.utcnow(), datetime.utcnow())
+        cursor = self._checkpoint(target) or since
+        if cursor is None:
+            channel = (await self._request(target, {"results": 0})).get("channel") or {}
+            cursor = parse_timestamp(channel.get("created_at")) or until
+        progress.update(until=until.isoformat(), cursor=cursor.isoformat())
+
+        window = self.window
+        while cursor < until:
+            end = min(cursor + window, until)
+            # start and end are both inclusive; the shared boundary second is deduplicated on insert
+            data = await self._request(target, {
+                "start": cursor.strftime(TS_FORMAT),
+                "end": end.strftime(TS_FORMAT),
+                "timezone": "UTC",
+                "results": ThingSpeakPoller.MAX_RESULTS
+            })
+            feeds = data.get("feeds") or []
+            if len(feeds) >= ThingSpeakPoller.MAX_RESULTS:
+                if window > MIN_WINDOW:
+                    # ThingSpeak kept only the newest 8000 of the window
+                    window = max(window / 2, MIN_WINDOW)
+                    continue
+                progress["truncated"] += 1
+                logger.warning(
+                    f"⚠️ Backfill of {target['node_id']} (channel {target['channel_id']}): over "
+                    f"{ThingSpeakPoller.MAX_RESULTS} entries between {cursor} and {end}; older ones were not returned"
+                )
+            if feeds:
+                progress["rows"] += await self._write(target, feeds)
+                rollups.recompute(target["node_id"], target["analytics_type"], cursor, end)
+            await self._save_checkpoint(target, end)
+            progress["pages"] += 1
+            progress["cursor"] = end.isoformat()
+            cursor = end
+            if not feeds:
+                # Quiet stretch (e.g. a channel offline for months): widen until data shows up
+                window *= 2
+            elif len(feeds) < ThingSpeakPoller.MAX_RESULTS // 4:
+                window = min(window * 2, self.window)
+        progress["state"] = "done"
+        return progress
+
+    async def run(self, node_ids: Optional[List[str]] = None, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Backfill every target (or those of `node_ids`); one channel failing
+        doesn't stop the others. Raises BackfillError if another backfill holds the lock.
+        """
+        if not await self.lock.acquire():
+            raise BackfillError("A backfill is already running")
+        try:
+            return await self._run(node_ids, since)
+        finally:
+            await self.lock.release()
+
+    async def _run(self, node_ids: Optional[List[str]], since: Optional[datetime]) -> Dict[str, Any]:
+        started = time.monotonic()
+        if since and since.tzinfo:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        self.status = {"running": True, "started_at": datetime.utcnow().isoformat(), "targets": {}}
+        try:
+            async with self.session_factory() as session:
+                targets = await poller.load_targets(session)
+            if node_ids:
+                targets = [t for t in targets if t["node_id"] in node_ids]
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def one(target):
+                async with semaphore:
+                    try:
+                        await self.backfill_target(target, since)
+                    except Exception as e:
+                        logger.error(f"❌ Backfill of {target['node_id']} (channel {target['channel_id']}) stopped: {e}")
+                        self.status["targets"].setdefault(f"{target['node_id']}:{target['channel_id']}", {}).update(
+                            state="failed", error=str(e)
+                        )
+
+            await asyncio.gather(*(one(t) for t in targets))
+        finally:
+            states = [t.get("state") for t in self.status["targets"].values()]
+            self.status.update(
+                running=False,
+                finished_at=datetime.utcnow().isoformat(),
+                duration_s=round(time.monotonic() - started, 1),
+                rows=sum(t.get("rows", 0) for t in self.status["targets"].values()),
+                truncated=sum(t.get("truncated", 0) for t in self.status["targets"].values()),
+                done=states.count("done"),
+                failed=states.count("failed")
+            )
+        logger.info(f"✅ Backfill finished: {self.status['rows']} readings from {self.status['done']} channels, {self.status['failed']} failed")
+        return self.status
+
+    async def start(self, node_ids: Optional[List[str]] = None, since: Optional[datetime] = None) -> bool:
+        """Run in the background of this process; False if a backfill is already running here or elsewhere."""
+        if self.running or not await self.lock.acquire():
+            return False
+        self.status = {"running": True, "targets": {}}
+
+        async def run_locked():
+            try:
+                await self._run(node_ids, since)
+            finally:
+                await self.lock.release()
+
+        self._task = asyncio.create_task(run_locked())
+        return True
+
+thingspeak_backfill = ThingSpeakBackfill()
@@ -0,0 +1,109 @@
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+class _ChannelEntry:
+    __slots__ = ("feeds", "ids", "confirmed_at")
+
+    def __init__(self):
+        self.feeds: Dict[int, Dict[str, Any]] = {} # entry_id -> raw ThingSpeak feed
+        self.ids: List[int] = [] # sorted entry_ids
+        self.confirmed_at: Optional[float] = None # monotonic time the newest entry was last confirmed
+
+class ChannelCache:
+    """
+    Recent raw feeds per ThingSpeak channel, shared by every node mapped to it.
+
+    Feeds are stored un-normalized (field1..8) because each node applies its
+    own field_mapping. A channel is "fresh" while the poller or an API fetch
+    has confirmed its newest entry within `max_age` seconds. ThingSpeak
+    entry_ids are sequential per channel, so a run of consecutive ids proves
+    the cached tail has no gaps.
+    """
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or settings.CHANNEL_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.CHANNEL_CACHE_TTL
+        self._channels: Dict[str, _ChannelEntry] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def put(self, channel_id: str, feeds: List[Dict[str, Any]], now: Optional[float] = None):
+        """
+        Merge feeds fetched from the channel's tail and mark the channel confirmed.
+        Only call this with responses that include the channel's newest entry.
+        """
+        entry = self._channels.setdefault(str(channel_id), _ChannelEntry())
+        for feed in feeds:
+            entry_id = feed.get("entry_id")
+            if entry_id is not None:
+                entry.feeds[entry_id] = feed
+        entry.ids = sorted(entry.feeds)
+        if len(entry.ids) > self.max_entries:
+            for entry_id in entry.ids[:-self.max_entries]:
+                del entry.feeds[entry_id]
+            entry.ids = entry.ids[-self.max_entries:]
+        entry.confirmed_at = time.monotonic() if now is None else now
+
+    def _fresh(self, channel_id: str, max_age: Optional[float]) -> Optional[_ChannelEntry]:
+        entry = self._channels.get(str(channel_id))
+        max_age = self.ttl if max_age is None else max_age
+        if not entry or not entry.ids or entry.confirmed_at is None:
+            return None
+        if time.monotonic() - entry.confirmed_at > max_age:
+            return None
+        return entry
+
+    def _contiguous_from(self, entry: _ChannelEntry) -> int:
+        """Index into entry.ids where the gap-free tail starts."""
+        i = len(entry.ids) - 1
+        while i > 0 and entry.ids[i - 1] == entry.ids[i] - 1:
+            i -= 1
+        return i
+
+    def _record(self, hit: bool):
+        self.stats["hits" if hit else "misses"] += 1
+
+    def latest(self, channel_id: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Newest raw feed, or None if the channel isn't cached or is stale."""
+        entry = self._fresh(channel_id, max_age)
+        self._record(entry is not None)
+        return entry.feeds[entry.ids[-1]] if entry else None
+
+    def last_n(self, channel_id: str, count: int, max_age: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """Newest `count` raw feeds oldest first, or None unless a gap-free tail that long is cached."""
+        entry = self._fresh(channel_id, max_age)
+        if entry is None or len(entry.ids) - self._contiguous_from(entry) < count:
+            self._record(False)
+            return None
+        self._record(True)
+        return [entry.feeds[i] for i in entry.ids[-count:]]
+
+    def since(self, channel_id: str, days: float, max_age: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Raw feeds from the last `days` days, oldest first, or None unless the
+        gap-free cached tail reaches back past the start of the window.
+        """
+        entry = self._fresh(channel_id, max_age)
+        if entry is None:
+            self._record(False)
+            return None
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        tail = [entry.feeds[i] for i in entry.ids[self._contiguous_from(entry):]]
+        # ThingSpeak created_at strings are UTC ISO-8601 and sort lexically
+        if (tail[0].get("created_at") or "") > cutoff:
+            self._record(False)
+            return None
+        self._record(True)
+        return [f for f in tail if (f.get("created_at") or "") >= cutoff]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._channels),
+            "entries": sum(len(e.ids) for e in self._channels.values()),
+            **self.stats
+        }
+
+channel_cache = ChannelCache()
@@ -0,0 +1,34 @@
+import numpy as np
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `points` samples of (x, y)
+    that keep the series' visual shape. The first and last samples are always
+    kept, and each bucket in between contributes the sample forming the largest
+    triangle with the previous pick and the next bucket's mean. x must be
+    ascending and y free of NaN.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # Bucket b (0..points-3) covers [edges[b], edges[b + 1]) of the interior samples
+    edges = (np.arange(points - 1) * ((n - 2) / (points - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    # Mean of each bucket, plus the last sample standing in for the bucket after the final one
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+
+    picked = np.empty(points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        picked[b + 1] = a
+    return picked
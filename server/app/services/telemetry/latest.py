@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.repository import upsert
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import NodeLatestState
+from app.services.telemetry_processor import parse_timestamp
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STATE_COLUMNS = ("timestamp", "entry_id", "source", "value", "metrics", "last_seen")
+
+def primary_value(analytics_type: Optional[str], metrics: Dict[str, Any]) -> Optional[float]:
+    """The node's headline number: field2 (distance) for tanks/deep wells, field1 (flow) otherwise."""
+    from app.services.telemetry.poller import ThingSpeakPoller
+
+    if not analytics_type:
+        return None
+    return ThingSpeakPoller.extract_value(analytics_type, metrics)
+
+class LatestStateStore:
+    """
+    In-memory mirror of the node_latest_state table.
+
+    The ingest pipeline records each batch's newest reading here; changed
+    nodes are upserted in one statement every LATEST_STATE_FLUSH_INTERVAL
+    seconds, however many readings arrived meanwhile. Readers get O(1) lookups;
+    entries older than LATEST_STATE_CACHE_TTL are re-read from the table so
+    state ingested by another process (e.g. `python -m app.worker`) shows up.
+    """
+    def __init__(self, flush_interval: Optional[float] = None, cache_ttl: Optional[float] = None, session_factory=None):
+        self.flush_interval = flush_interval or settings.LATEST_STATE_FLUSH_INTERVAL
+        self.cache_ttl = settings.LATEST_STATE_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._dirty = set()
+        self.stats = {"recorded": 0, "late": 0, "flushes": 0, "db_reads": 0}
+
+    def record(self, node_id: str, reading: Dict[str, Any], source: str, analytics_type: Optional[str] = None) -> bool:
+        """Fold a node's newest reading into its state. Returns False for readings older than the state."""
+        ts = parse_timestamp(reading.get("timestamp"))
+        if ts is None:
+            return False
+        now = datetime.utcnow()
+        current = self._states.get(node_id)
+        self._dirty.add(node_id)
+        self._loaded_at[node_id] = time.monotonic()
+
+        if current and current["timestamp"] and ts < current["timestamp"]:
+            # Late or backfilled data: still a sign of life, but not the current state
+            current["last_seen"] = now
+            self.stats["late"] += 1
+            return False
+
+        # A node may span several channels; keep the other channels' last values
+        metrics = dict(current["metrics"] or {}) if current else {}
+        metrics.update({k: v for k, v in reading.items() if k not in ("timestamp", "entry_id") and v is not None})
+        value = primary_value(analytics_type, metrics)
+        self._states[node_id] = {
+            "node_id": node_id,
+            "timestamp": ts,
+            "entry_id": reading.get("entry_id"),
+            "source": source,
+            "value": value if value is not None else (current or {}).get("value"),
+            "metrics": metrics,
+            "last_seen": now
+        }
+        self.stats["recorded"] += 1
+        return True
+
+    @staticmethod
+    def _row_to_state(row: NodeLatestState) -> Dict[str, Any]:
+        state = {col: getattr(row, col) for col in STATE_COLUMNS}
+        state["node_id"] = row.node_id
+        return state
+
+    def _needs_load(self, node_id: str) -> bool:
+        if node_id in self._dirty:
+            return False
+        loaded_at = self._loaded_at.get(node_id)
+        return loaded_at is None or time.monotonic() - loaded_at > self.cache_ttl
+
+    def _merge_loaded(self, state: Dict[str, Any]):
+        node_id = state["node_id"]
+        current = self._states.get(node_id)
+        if not current or (state["timestamp"] or datetime.min) >= (current["timestamp"] or datetime.min):
+            self._states[node_id] = state
+
+    async def get_many(self, session: AsyncSession, node_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Latest state for each node that has one, reading the table only for uncached/expired nodes."""
+        node_ids = list(node_ids)
+        missing = [n for n in node_ids if self._needs_load(n)]
+        if missing:
+            self.stats["db_reads"] += 1
+            result = await session.execute(select(NodeLatestState).where(NodeLatestState.node_id.in_(missing)))
+            now = time.monotonic()
+            for row in result.scalars().all():
+                self._merge_loaded(self._row_to_state(row))
+            for node_id in missing:
+                self._loaded_at[node_id] = now
+        return {n: self._states[n] for n in node_ids if n in self._states}
+
+    async def get(self, session: AsyncSession, node_id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many(session, [node_id])).get(node_id)
+
+    async def flush(self):
+        """Upsert every node whose state changed since the last flush."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = [
+            {"node_id": n, **{col: self._states[n][col] for col in STATE_COLUMNS}}
+            for n in dirty if n in self._states
+        ]
+        try:
+            async with self.session_factory() as session:
+                stmt = upsert(
+                    NodeLatestState,
+                    session.bind.dialect.name,
+                    index_elements=["node_id"],
+                    update_columns=list(STATE_COLUMNS),
+                    only_if_newer="timestamp"
+                )
+                await session.execute(stmt, rows)
+                await session.commit()
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self._dirty |= dirty # retry on the next flush
+            logger.error(f"❌ Error flushing latest state for {len(rows)} nodes: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"nodes": len(self._states), "pending": len(self._dirty), **self.stats}
+
+latest_state = LatestStateStore()
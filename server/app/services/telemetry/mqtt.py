@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.services.telemetry.base import BaseTelemetryService
+from app.services.telemetry.push import PayloadError, PushReadingValidator, parse_payload
+from app.services.telemetry_processor import parse_timestamp
+
+try:
+    import aiomqtt
+    MQTT_AVAILABLE = True
+except ImportError:
+    aiomqtt = None
+    MQTT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class MQTTTelemetryService(BaseTelemetryService):
+    """
+    MQTT subscriber source. Keeps one long-lived subscription to
+    `<prefix>/+/telemetry`; devices publish to `<prefix>/<node_key>/telemetry`
+    with the same JSON bodies the push endpoint accepts (a reading, an array of
+    readings, or {"readings": [...]}). Payloads are validated and normalized
+    exactly like pushed readings and stored through TelemetryProcessor.
+
+    Topic-level access control belongs on the broker; the node_key in the
+    topic only selects which node the payload is for.
+    """
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        topic_prefix: Optional[str] = None
+    ):
+        self.host = host or settings.MQTT_BROKER_HOST
+        self.port = port or settings.MQTT_BROKER_PORT
+        self.topic_prefix = (topic_prefix or settings.MQTT_TOPIC_PREFIX).rstrip("/")
+        self.connected = False
+        self.latest: Dict[str, Dict[str, Any]] = {} # node_id -> newest reading seen over MQTT
+        self._nodes: Dict[str, Tuple[float, Optional[Tuple[str, Dict[str, str]]]]] = {}
+        self.stats = {"messages": 0, "readings": 0, "rejected": 0, "unknown_nodes": 0}
+
+    @property
+    def subscription(self) -> str:
+        return f"{self.topic_prefix}/+/telemetry"
+
+    def node_key_from_topic(self, topic: str) -> Optional[str]:
+        prefix = f"{self.topic_prefix}/"
+        if not topic.startswith(prefix) or not topic.endswith("/telemetry"):
+            return None
+        node_key = topic[len(prefix):-len("/telemetry")]
+        return node_key if node_key and "/" not in node_key else None
+
+    async def _lookup_node(self, node_key: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Resolve a node_key to (node_id, combined field_mapping)."""
+        from app.db.session import AsyncSessionLocal
+        from app.db.repository import NodeRepository
+
+        async with AsyncSessionLocal() as session:
+            node = await NodeRepository(session).get_by_key(node_key)
+            if not node:
+                return None
+            field_mapping: Dict[str, str] = {}
+            for mapping in node.thingspeak_mappings or []:
+                field_mapping.update(mapping.field_mapping or {})
+            return node.id, field_mapping
+
+    async def resolve_node(self, node_key: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        cached = self._nodes.get(node_key)
+        if cached and time.monotonic() - cached[0] < settings.MQTT_NODE_CACHE_TTL:
+            return cached[1]
+        node = await self._lookup_node(node_key)
+        self._nodes[node_key] = (time.monotonic(), node)
+        return node
+
+    async def _store(self, node_id: str, readings: List[Dict[str, Any]]):
+        from app.db.session import AsyncSessionLocal
+        from app.services.telemetry_processor import TelemetryProcessor
+
+        async with AsyncSessionLocal() as session:
+            await TelemetryProcessor(session).process_readings(node_id, readings, source="mqtt")
+
+    async def handle_message(self, topic: str, payload: bytes) -> int:
+        """Decode, validate and store one MQTT message. Returns the number of readings accepted."""
+        self.stats["messages"] += 1
+        node_key = self.node_key_from_topic(topic)
+        node = await self.resolve_node(node_key) if node_key else None
+        if not node:
+            self.stats["unknown_nodes"] += 1
+            logger.warning(f"MQTT message on '{topic}' does not match a known node")
+            return 0
+        node_id, field_mapping = node
+
+        try:
+            items = parse_payload(payload, "application/json")
+        except (PayloadError, UnicodeDecodeError) as e:
+            self.stats["rejected"] += 1
+            logger.warning(f"Undecodable MQTT payload for node {node_id}: {e}")
+            return 0
+
+        readings, errors = PushReadingValidator(field_mapping).validate(items)
+        self.stats["rejected"] += len(errors)
+        if errors:
+            logger.warning(f"MQTT: rejected {len(errors)} reading(s) for node {node_id}: {errors[0]['error']}")
+        if not readings:
+            return 0
+
+        readings.sort(key=lambda r: parse_timestamp(r.get("timestamp")))
+        await self._store(node_id, readings)
+        self.latest[node_id] = readings[-1]
+        self.stats["readings"] += len(readings)
+        return len(readings)
+
+    async def run(self):
+        """Subscribe and process messages forever, reconnecting with exponential backoff."""
+        if not MQTT_AVAILABLE:
+            logger.error("MQTT source enabled but 'aiomqtt' is not installed; not starting")
+            return
+
+        backoff = 1
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    self.host,
+                    self.port,
+                    username=settings.MQTT_USERNAME,
+                    password=settings.MQTT_PASSWORD
+                ) as client:
+                    await client.subscribe(self.subscription, qos=settings.MQTT_QOS)
+                    self.connected = True
+                    backoff = 1
+                    logger.info(f"MQTT subscribed to '{self.subscription}' on {self.host}:{self.port}")
+                    async for message in client.messages:
+                        try:
+                            await self.handle_message(message.topic.value, message.payload)
+                        except Exception as e:
+                            logger.error(f"Error handling MQTT message on '{message.topic.value}': {e}")
+            except aiomqtt.MqttError as e:
+                logger.warning(f"MQTT connection lost ({e}); reconnecting in {backoff}s")
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, settings.MQTT_RECONNECT_MAX)
+
+    async def fetch_latest(self, device_id: str) -> Dict[str, Any]:
+        """Newest reading received over MQTT since startup (stored history lives in the DB)."""
+        return self.latest.get(device_id, {})
+
+    async def fetch_history(self, device_id: str, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+        # MQTT is push-only; the broker keeps no history to query
+        return []
+
+    async def push_reading(self, device_id: str, data: Dict[str, Any]) -> bool:
+        await self._store(device_id, [data])
+        self.latest[device_id] = data
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"connected": self.connected, "subscription": self.subscription, **self.stats}
+
+mqtt_source = MQTTTelemetryService()
@@ -0,0 +1,211 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+RAW_FIELDS = tuple(f"field{i}" for i in range(1, 9))
+
+def _parse_column(values: List[Any]) -> Tuple[np.ndarray, np.ndarray, Dict[int, Any]]:
+    """
+    Parse one field across a whole feed array.
+    Returns (float64 values with NaN for missing, mask of integer-valued
+    entries, {index: raw value} for entries that aren't numeric).
+    """
+    extras: Dict[int, Any] = {}
+    if all(v is None for v in values):
+        # Field not used by this channel
+        return np.full(len(values), np.nan), np.zeros(len(values), dtype=bool), extras
+    try:
+        arr = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Rare: blanks or junk in the column; fall back to per-value parsing
+        arr = np.full(len(values), np.nan)
+        for i, val in enumerate(values):
+            if val is None:
+                continue
+            try:
+                arr[i] = float(val)
+            except (TypeError, ValueError):
+                extras[i] = val
+    # ThingSpeak sends numbers as strings; "12" is an int reading, "12.0" a float one
+    as_text = np.asarray(values, dtype=str)
+    no_dot = np.char.find(as_text, ".") < 0
+    ints = no_dot & np.isfinite(arr) & (arr == np.floor(arr))
+    # float64 also accepts "nan", "inf", "1e3" and booleans, which readings
+    # have always passed through as sent: re-check those one by one
+    odd = ~np.isfinite(arr) | (no_dot & (np.char.find(np.char.lower(as_text), "e") >= 0))
+    for i in np.flatnonzero(odd).tolist():
+        val = values[i]
+        if val is None or i in extras:
+            continue
+        if isinstance(val, str):
+            try:
+                parsed = float(val) if "." in val else int(val)
+            except ValueError:
+                parsed = None
+            if parsed is not None and np.isfinite(parsed):
+                arr[i], ints[i] = parsed, isinstance(parsed, int)
+                continue
+        elif isinstance(val, (int, float)) and not isinstance(val, bool) and np.isfinite(val):
+            ints[i] = isinstance(val, int)
+            continue
+        arr[i], ints[i], extras[i] = np.nan, False, val
+    return arr, ints, extras
+
+class FeedColumns:
+    """
+    A ThingSpeak feed array held as typed columns: one float64 array per
+    source field (NaN where missing) plus timestamps and entry_ids. Mapped
+    names resolve to their source field's column, so analytics can work on
+    arrays directly and only materialize dicts when a response needs them.
+    """
+    def __init__(
+        self,
+        normalizer: "CompiledNormalizer",
+        timestamps: np.ndarray,
+        entry_ids: List[Any],
+        values: Dict[str, np.ndarray],
+        ints: Dict[str, np.ndarray],
+        extras: Dict[str, Dict[int, Any]],
+        present: Dict[str, np.ndarray]
+    ):
+        self.normalizer = normalizer
+        self.timestamps = timestamps
+        self.entry_ids = entry_ids
+        self.values = values
+        self._ints = ints
+        self._extras = extras
+        self._present = present # per mapped source field: entries that carry the key at all
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        """float64 values for a source field (field1..8) or a mapped name."""
+        source = self.normalizer.source_of.get(name, name)
+        return self.values.get(source)
+
+    def take(self, indices: np.ndarray) -> "FeedColumns":
+        """The entries at `indices`, in that order."""
+        position = {int(old): new for new, old in enumerate(indices)}
+        return FeedColumns(
+            self.normalizer,
+            self.timestamps[indices],
+            [self.entry_ids[i] for i in indices],
+            {f: v[indices] for f, v in self.values.items()},
+            {f: m[indices] for f, m in self._ints.items()},
+            {f: {position[i]: raw for i, raw in x.items() if i in position} for f, x in self._extras.items()},
+            {f: p[indices] for f, p in self._present.items()}
+        )
+
+    def sort_by_time(self) -> "FeedColumns":
+        # created_at strings are UTC ISO-8601, so lexical order is time order
+        order = np.argsort(np.array([t or "" for t in self.timestamps], dtype=object), kind="stable")
+        if np.all(order[:-1] < order[1:]):
+            return self
+        return self.take(order)
+
+    def epoch_seconds(self) -> np.ndarray:
+        """Timestamps as float seconds since the epoch (NaN where missing or unparseable)."""
+        text = [t[:-1] if isinstance(t, str) and t.endswith("Z") else t for t in self.timestamps]
+        try:
+            stamps = np.array(text, dtype="datetime64[s]")
+        except (TypeError, ValueError):
+            # Offsets other than Z, or junk: parse one by one
+            from app.services.telemetry_processor import parse_timestamp
+
+            stamps = np.array([parse_timestamp(t) if isinstance(t, str) else None for t in self.timestamps], dtype="datetime64[s]")
+        seconds = stamps.astype("int64").astype(np.float64)
+        seconds[np.isnat(stamps)] = np.nan
+        return seconds
+
+    def downsample(self, points: int, field: str) -> "FeedColumns":
+        """
+        At most `points` entries that keep the shape of `field` over time
+        (LTTB, see downsample.py). Expects time-sorted columns. Entries with
+        no time or no value for `field` can't be placed on the chart and are
+        left out once downsampling applies.
+        """
+        if len(self) <= points:
+            return self
+        from app.services.telemetry.downsample import lttb_indices
+
+        x = self.epoch_seconds()
+        y = self.column(field)
+        if y is None or not np.isfinite(y).any():
+            # Nothing to shape by: evenly spaced entries
+            keep = np.flatnonzero(np.isfinite(x))
+            if len(keep) > points:
+                keep = keep[np.linspace(0, len(keep) - 1, points).round().astype(np.int64)]
+            return self.take(keep)
+        keep = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        return self.take(keep[lttb_indices(x[keep], y[keep], points)])
+
+    def _python_column(self, field: str) -> List[Any]:
+        arr = self.values[field]
+        out = arr.tolist()
+        for i in np.flatnonzero(np.isnan(arr)).tolist():
+            out[i] = None
+        for i in np.flatnonzero(self._ints[field]).tolist():
+            out[i] = int(out[i])
+        for i, raw in self._extras[field].items():
+            out[i] = raw
+        return out
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Materialize normalized reading dicts (same shape as ThingSpeakTelemetryService._normalize_reading)."""
+        columns = {field: self._python_column(field) for field in self.values}
+        present = {field: p.tolist() for field, p in self._present.items()}
+        aliases = self.normalizer.aliases
+        timestamps = self.timestamps.tolist()
+        records = []
+        for i in range(len(timestamps)):
+            record = {"timestamp": timestamps[i], "entry_id": self.entry_ids[i]}
+            for alias, field in aliases:
+                # A mapped name is set (possibly to None) only when the feed has its field
+                if present[field][i]:
+                    record[alias] = columns[field][i]
+            for field in RAW_FIELDS:
+                val = columns[field][i] if field in columns else None
+                if val is not None:
+                    record[field] = val
+            records.append(record)
+        return records
+
+class CompiledNormalizer:
+    """
+    Normalizer for one field_mapping, built once and reused for every feed
+    array that uses the mapping (see get_normalizer).
+    """
+    def __init__(self, mapping: Tuple[Tuple[str, str], ...]):
+        self.aliases = tuple((alias, field) for field, alias in mapping)
+        self.source_of = {alias: field for alias, field in self.aliases}
+        self.sources = tuple(dict.fromkeys(RAW_FIELDS + tuple(f for _, f in self.aliases)))
+
+    def columns(self, feeds: List[Dict[str, Any]]) -> FeedColumns:
+        values, ints, extras = {}, {}, {}
+        for field in self.sources:
+            values[field], ints[field], extras[field] = _parse_column([f.get(field) for f in feeds])
+        present = {field: np.array([field in f for f in feeds], dtype=bool) for field in self.source_of.values()}
+        return FeedColumns(
+            self,
+            np.array([f.get("created_at") for f in feeds], dtype=object),
+            [f.get("entry_id") for f in feeds],
+            values,
+            ints,
+            extras,
+            present
+        )
+
+    def normalize(self, feeds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not feeds:
+            return []
+        return self.columns(feeds).to_records()
+
+@lru_cache(maxsize=1024)
+def _compile(mapping: Tuple[Tuple[str, str], ...]) -> CompiledNormalizer:
+    return CompiledNormalizer(mapping)
+
+def get_normalizer(mapping: Optional[Dict[str, str]]) -> CompiledNormalizer:
+    """Compiled normalizer for a field_mapping, cached per distinct mapping."""
+    return _compile(tuple((mapping or {}).items()))
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class IngestBatch:
+    """
+    One unit of work flowing through the ingest pipeline: a node's readings
+    from a single source. Poll batches start with a `target` and pick up raw
+    feeds at the fetch stage; push/MQTT batches enter later with readings.
+    """
+    __slots__ = ("node_id", "source", "analytics_type", "target", "field_mapping", "raw", "readings", "fetched")
+
+    def __init__(
+        self,
+        node_id: str,
+        source: str,
+        target: Optional[Dict[str, Any]] = None,
+        field_mapping: Optional[Dict[str, str]] = None,
+        raw: Optional[List[Dict[str, Any]]] = None,
+        readings: Optional[List[Dict[str, Any]]] = None,
+        analytics_type: Optional[str] = None
+    ):
+        self.node_id = node_id
+        self.source = source
+        self.analytics_type = analytics_type or (target or {}).get("analytics_type")
+        self.target = target
+        self.field_mapping = field_mapping or {}
+        self.raw = raw
+        self.readings = readings
+        self.fetched: Optional[asyncio.Future] = None # resolved by the fetch stage (poll batches)
+
+class StageMetrics:
+    """Counters plus smoothed latency for one stage."""
+    SMOOTHING = 0.1
+    WINDOW = 10.0 # seconds per throughput sample
+
+    def __init__(self):
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0 # handler returned None (nothing left to do)
+        self.failed = 0
+        self.busy = 0
+        self.avg_wait_ms: Optional[float] = None
+        self.avg_latency_ms: Optional[float] = None
+        self.max_latency_ms: Optional[float] = None
+        self.throughput_per_s = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.SMOOTHING * (sample - current)
+
+    def record(self, wait: float, latency: float):
+        now = time.monotonic()
+        self.avg_wait_ms = self._ewma(self.avg_wait_ms, wait * 1000)
+        self.avg_latency_ms = self._ewma(self.avg_latency_ms, latency * 1000)
+        self.max_latency_ms = max(self.max_latency_ms or 0.0, latency * 1000)
+        self._window_count += 1
+        if now - self._window_start >= self.WINDOW:
+            self.throughput_per_s = self._window_count / (now - self._window_start)
+            self._window_start, self._window_count = now, 0
+
+class Stage:
+    """
+    A named pipeline step: `concurrency` workers pull batches from a bounded
+    queue, run `handler`, and pass the result to the next stage. A handler
+    returns the (possibly modified) batch to continue, or None to stop there.
+    """
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Optional[Any]]],
+        concurrency: int = 1,
+        maxsize: int = 1000
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.metrics = StageMetrics()
+
+    async def put(self, item: Any):
+        self.metrics.received += 1
+        await self.queue.put((time.monotonic(), item))
+
+    async def work(self, next_stage: Optional["Stage"]):
+        while True:
+            enqueued_at, item = await self.queue.get()
+            started = time.monotonic()
+            self.metrics.busy += 1
+            try:
+                result = await self.handler(item)
+            except Exception as e:
+                self.metrics.failed += 1
+                logger.error(f"❌ Ingest stage '{self.name}' failed for {getattr(item, 'node_id', item)}: {e}")
+                result = None
+            else:
+                self.metrics.processed += 1
+                if result is None:
+                    self.metrics.dropped += 1
+            finally:
+                self.metrics.busy -= 1
+                self.metrics.record(started - enqueued_at, time.monotonic() - started)
+            try:
+                if result is not None and next_stage is not None:
+                    # Blocks while the next stage is full: backpressure flows upstream
+                    await next_stage.put(result)
+            finally:
+                self.queue.task_done()
+
+    def snapshot(self) -> Dict[str, Any]:
+        m = self.metrics
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "busy": m.busy,
+            "received": m.received,
+            "processed": m.processed,
+            "dropped": m.dropped,
+            "failed": m.failed,
+            "throughput_per_s": round(m.throughput_per_s, 2),
+            "avg_wait_ms": None if m.avg_wait_ms is None else round(m.avg_wait_ms, 2),
+            "avg_latency_ms": None if m.avg_latency_ms is None else round(m.avg_latency_ms, 2),
+            "max_latency_ms": None if m.max_latency_ms is None else round(m.max_latency_ms, 2)
+        }
+
+class IngestPipeline:
+    """Stages linked in order by bounded queues."""
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self._by_name = {s.name: s for s in stages}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def stage(self, name: str) -> Stage:
+        return self._by_name[name]
+
+    async def submit(self, item: Any, stage: Optional[str] = None):
+        """Enter the pipeline at `stage` (default: the first). Waits while that stage is full."""
+        await (self._by_name[stage] if stage else self.stages[0]).put(item)
+
+    def start(self):
+        if self._tasks:
+            return
+        for i, stage in enumerate(self.stages):
+            next_stage = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            for _ in range(stage.concurrency):
+                self._tasks.append(asyncio.create_task(stage.work(next_stage)))
+
+    async def stop(self, timeout: float = 10.0):
+        """Let queued batches finish (up to `timeout`), then cancel the workers."""
+        try:
+            for stage in self.stages:
+                await asyncio.wait_for(stage.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingest pipeline stopped with batches still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {stage.name: stage.snapshot() for stage in self.stages}
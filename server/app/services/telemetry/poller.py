@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.http import http_clients
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import Node, DeviceThingSpeakMapping
+from app.services.security import EncryptionService
+from app.services.telemetry.cache import channel_cache
+from app.services.telemetry.pipeline import IngestBatch
+from app.services.telemetry.throttle import thingspeak_guard
+from app.services.telemetry_processor import parse_timestamp
+from app.services.telemetry.scheduler import PollScheduler
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class ThingSpeakPoller:
+    """
+    Polls every ThingSpeak channel known to the platform.
+    Channels are polled when due on a per-channel adaptive schedule. Each due
+    channel goes through the ingest pipeline (see stages.py), whose fetch
+    stage bounds concurrency over the process-wide keep-alive ThingSpeak
+    connection pool.
+    """
+    BASE_URL = "https://api.thingspeak.com"
+    MAX_RESULTS = 8000 # ThingSpeak caps a single feeds request at 8000 entries
+    MIN_SLEEP = 0.5 # seconds; keeps the loop from spinning on back-to-back due times
+
+    def __init__(self):
+        self.last_sweep: Dict[str, Any] = {}
+        self.scheduler = PollScheduler(
+            default_interval=settings.THINGSPEAK_POLL_INTERVAL,
+            min_interval=settings.THINGSPEAK_POLL_MIN_INTERVAL,
+            max_interval=settings.THINGSPEAK_POLL_MAX_INTERVAL,
+            max_backoff=settings.THINGSPEAK_POLL_MAX_BACKOFF
+        )
+        # Watermarks for legacy Node-column channels, which have no mapping row to persist them
+        self._watermarks: Dict[Tuple[str, str], Tuple[Optional[int], Optional[datetime]]] = {}
+
+    async def load_targets(self, session: AsyncSession) -> List[Dict[str, Any]]:
+        """
+        Collect one poll target per (node, channel).
+        DeviceThingSpeakMapping rows win; the legacy Node.thingspeak_channel_id
+        column is only used for nodes whose channel has no mapping row.
+        """
+        nodes_result = await session.execute(select(Node))
+        nodes = {n.id: n for n in nodes_result.scalars().all()}
+
+        mappings_result = await session.execute(select(DeviceThingSpeakMapping))
+        targets = []
+        seen = set()
+        for m in mappings_result.scalars().all():
+            node = nodes.get(m.device_id)
+            if not node or not m.channel_id:
+                continue
+            seen.add((node.id, m.channel_id))
+            targets.append({
+                "node_id": node.id,
+                "analytics_type": node.analytics_type,
+                "mapping_id": m.id,
+                "channel_id": m.channel_id,
+                "read_key": EncryptionService.decrypt(m.read_api_key) if m.read_api_key else None,
+                "field_mapping": m.field_mapping or {},
+                "last_entry_id": m.last_entry_id,
+                "last_sync_time": m.last_sync_time,
+                "backfilled_until": m.backfilled_until
+            })
+
+        for node in nodes.values():
+            if not node.thingspeak_channel_id or (node.id, node.thingspeak_channel_id) in seen:
+                continue
+            last_entry_id, last_sync_time = self._watermarks.get(
+                (node.id, node.thingspeak_channel_id), (None, None)
+            )
+            targets.append({
+                "node_id": node.id,
+                "analytics_type": node.analytics_type,
+                "mapping_id": None,
+                "channel_id": node.thingspeak_channel_id,
+                "read_key": node.thingspeak_read_api_key,
+                "field_mapping": {},
+                "last_entry_id": last_entry_id,
+                "last_sync_time": last_sync_time
+            })
+        return targets
+
+    async def fetch_target(
+        self,
+        target: Dict[str, Any],
+        client: Optional[httpx.AsyncClient] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """New feeds since the target's watermark, oldest first; None if the fetch failed."""
+        # Process-wide ThingSpeak pool; its lifecycle belongs to the app (startup/shutdown)
+        client = client or http_clients.get("thingspeak")
+        params = self.build_params(target)
+        if target["read_key"]:
+            params["api_key"] = target["read_key"]
+
+        feeds = await self._request_page(target, client, params)
+        if feeds is None:
+            return None
+        # Keep the shared channel cache warm so API reads skip the upstream call
+        channel_cache.put(target["channel_id"], feeds)
+        if len(feeds) >= self.MAX_RESULTS and target.get("last_sync_time"):
+            feeds = await self._oldest_page(target, client, params, feeds)
+            if feeds is None:
+                return None
+        return self.new_entries(target, feeds)
+
+    async def _oldest_page(
+        self,
+        target: Dict[str, Any],
+        client: httpx.AsyncClient,
+        params: Dict[str, Any],
+        page: List[Dict[str, Any]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        A `start=` query returns the newest MAX_RESULTS entries after the
+        watermark, so a full page (e.g. after an outage) may have left older
+        ones out. Walk back with `end` until the page that reaches the
+        watermark and return that one: the watermark then only moves over
+        contiguous entries, and the next polls carry on forward from it.
+        Only one page is held at a time. After THINGSPEAK_POLL_CATCHUP_PAGES
+        full pages the rest of the gap is handed to the backfill.
+        """
+        for _ in range(settings.THINGSPEAK_POLL_CATCHUP_PAGES):
+            times = [t for t in (parse_timestamp(f.get("created_at")) for f in page) if t is not None]
+            if not times:
+                return page
+            # `end` is inclusive; entries already on this page are dropped below
+            earlier = await self._request_page(target, client, dict(params, end=min(times).strftime("%Y-%m-%d %H:%M:%S")))
+            if earlier is None:
+                return None
+            first_id = min((f["entry_id"] for f in page if f.get("entry_id") is not None), default=None)
+            older = [f for f in earlier if first_id is None or (f.get("entry_id") or 0) < first_id]
+            if not older:
+                return page
+            page = older
+            if len(earlier) < self.MAX_RESULTS:
+                return page
+        await self._record_gap(target, page)
+        return page
+
+    async def _record_gap(self, target: Dict[str, Any], page: List[Dict[str, Any]]):
+        """Leave entries between the watermark and `page` to the next backfill, which walks from its checkpoint."""
+        gap_start = target["last_sync_time"]
+        logger.warning(
+            f"⚠️ ThingSpeak channel {target['channel_id']} has over "
+            f"{settings.THINGSPEAK_POLL_CATCHUP_PAGES * self.MAX_RESULTS} entries since {gap_start}; "
+            f"entries before {page[0].get('created_at')} are left to the backfill"
+        )
+        backfilled_until = target.get("backfilled_until")
+        # No checkpoint means the next backfill walks the whole history anyway
+        if not target["mapping_id"] or backfilled_until is None or backfilled_until <= gap_start:
+            return
+        target["backfilled_until"] = gap_start
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(DeviceThingSpeakMapping)
+                .where(DeviceThingSpeakMapping.id == target["mapping_id"])
+                .values(backfilled_until=gap_start)
+            )
+            await session.commit()
+
+    async def _request_page(
+        self,
+        target: Dict[str, Any],
+        client: httpx.AsyncClient,
+        params: Dict[str, Any]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """One guarded feeds.json request; its feeds, or None if it failed."""
+        body = {}
+
+        async def request():
+            response = await client.get(f"{self.BASE_URL}/channels/{target['channel_id']}/feeds.json", params=params)
+            if response.status_code == 200:
+                # Decoded inside the guarded call: a malformed body is a breaker failure
+                body["data"] = response.json()
+                if not isinstance(body["data"], dict):
+                    raise ValueError(f"expected a JSON object, got {type(body['data']).__name__}")
+            return response
+
+        try:
+            # Background polling may queue longer for a token than API reads
+            response = await thingspeak_guard.call(
+                target["channel_id"],
+                target["read_key"],
+                request,
+                max_wait=settings.THINGSPEAK_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"❌ Error requesting ThingSpeak for {target['node_id']}: {e}")
+            return None
+
+        if response.status_code != 200:
+            logger.warning(f"⚠️ ThingSpeak returned {response.status_code} for node {target['node_id']}")
+            return None
+        return body["data"].get("feeds") or []
+
+    @classmethod
+    def build_params(cls, target: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ask only for entries newer than the target's watermark.
+        Without a watermark (first sync) just the latest entry is fetched;
+        older history is left to an explicit backfill.
+        """
+        if not target.get("last_sync_time"):
+            return {"results": 1}
+        # `start` is inclusive, so step one second past the last seen entry
+        start = target["last_sync_time"] + timedelta(seconds=1)
+        return {
+            "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+            "timezone": "UTC",
+            "results": cls.MAX_RESULTS
+        }
+
+    @staticmethod
+    def new_entries(target: Dict[str, Any], feeds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop entries at or below the watermark and return the rest oldest first."""
+        last_entry_id = target.get("last_entry_id")
+        fresh = []
+        for feed in feeds:
+            entry_id = feed.get("entry_id")
+            if last_entry_id is not None and entry_id is not None and entry_id <= last_entry_id:
+                continue
+            fresh.append(feed)
+        fresh.sort(key=lambda f: f.get("entry_id") or 0)
+        return fresh
+
+    async def advance_watermark(
+        self,
+        session: AsyncSession,
+        target: Dict[str, Any],
+        entry_id: Optional[int],
+        created_at: Optional[datetime]
+    ):
+        """
+        Move the target's watermark forward; None keeps that half as it is.
+        Never moves back, since batches of one channel can settle out of order.
+        """
+        if target.get("last_entry_id") is not None:
+            entry_id = target["last_entry_id"] if entry_id is None else max(entry_id, target["last_entry_id"])
+        if target.get("last_sync_time") is not None:
+            created_at = target["last_sync_time"] if created_at is None else max(created_at, target["last_sync_time"])
+        target["last_entry_id"] = entry_id
+        target["last_sync_time"] = created_at
+        if target["mapping_id"]:
+            await session.execute(
+                update(DeviceThingSpeakMapping)
+                .where(DeviceThingSpeakMapping.id == target["mapping_id"])
+                .values(last_entry_id=entry_id, last_sync_time=created_at)
+            )
+        else:
+            self._watermarks[(target["node_id"], target["channel_id"])] = (entry_id, created_at)
+
+    @staticmethod
+    def extract_value(analytics_type: str, feed: Dict[str, Any]) -> float:
+        """
+        CRITICAL FIELD MAPPING:
+        - EvaraTank: Use field2 for distance (NEVER field1!)
+        - EvaraFlow: Use field1 for flow rate
+        - EvaraDeep: Use field2 for depth
+        """
+        try:
+            if analytics_type in ("EvaraTank", "EvaraDeep"):
+                return float(feed.get("field2", 0) or 0)
+            return float(feed.get("field1", 0) or 0)
+        except (ValueError, TypeError):
+            return 0.0
+
+    async def poll(self, targets: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]]:
+        """
+        Push a batch of targets through the ingest pipeline and wait for their fetches.
+        Returns (target, new_feeds) pairs; new_feeds is None when the fetch failed.
+        Normalizing, storing and alerting continue in the pipeline afterwards.
+        """
+        from app.services.telemetry.stages import ingest_pipeline
+
+        if not targets:
+            return []
+        loop = asyncio.get_running_loop()
+        batches = []
+        for target in targets:
+            batch = IngestBatch(target["node_id"], "thingspeak", target=target, field_mapping=target["field_mapping"])
+            batch.fetched = loop.create_future()
+            batches.append(batch)
+            await ingest_pipeline.submit(batch, stage="fetch")
+        feeds = await asyncio.gather(*(b.fetched for b in batches))
+        return list(zip(targets, feeds))
+
+    def _record_stats(self, results, started: float, channels: int) -> Dict[str, Any]:
+        self.last_sweep = {
+            "channels": channels,
+            "polled": len(results),
+            "ingested": sum(1 for _, feeds in results if feeds),
+            "entries": sum(len(feeds) for _, feeds in results if feeds),
+            "failed": sum(1 for _, feeds in results if feeds is None),
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        return self.last_sweep
+
+    async def sweep(self) -> Dict[str, Any]:
+        """Run one full pass over all channels and return sweep statistics."""
+        started = time.monotonic()
+        async with AsyncSessionLocal() as session:
+            targets = await self.load_targets(session)
+        results = await self.poll(targets)
+        return self._record_stats(results, started, len(targets))
+
+    @staticmethod
+    def target_key(target: Dict[str, Any]) -> Tuple[str, str]:
+        return (target["node_id"], target["channel_id"])
+
+    async def run(self):
+        """
+        Poll channels as they come due on the adaptive schedule.
+        Targets are reloaded from the DB every THINGSPEAK_POLL_INTERVAL seconds
+        so newly provisioned channels are picked up.
+        """
+        refresh_every = settings.THINGSPEAK_POLL_INTERVAL
+        targets: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        next_refresh = 0.0
+
+        while True:
+            try:
+                now = time.monotonic()
+                if now >= next_refresh:
+                    async with AsyncSessionLocal() as session:
+                        loaded = await self.load_targets(session)
+                    targets = {self.target_key(t): t for t in loaded}
+                    self.scheduler.sync(targets.keys(), now)
+                    next_refresh = now + refresh_every
+                    if not targets:
+                        logger.info("🚀 Polling: No ThingSpeak channels configured.")
+
+                batch = [targets[k] for k in self.scheduler.due(now) if k in targets]
+                if batch:
+                    started = time.monotonic()
+                    results = await self.poll(batch)
+                    done = time.monotonic()
+                    for target, feeds in results:
+                        key = self.target_key(target)
+                        if feeds is None:
+                            self.scheduler.record_failure(key, done)
+                        else:
+                            entry_times = [parse_timestamp(f.get("created_at")) for f in feeds]
+                            self.scheduler.record_success(key, [t for t in entry_times if t], done)
+                    stats = self._record_stats(results, started, len(targets))
+                    logger.info(
+                        f"✅ Polled {stats['polled']}/{stats['channels']} channels: {stats['ingested']} with new data, "
+                        f"{stats['failed']} failed in {stats['duration_seconds']}s"
+                    )
+            except Exception as e:
+                logger.error(f"❌ Error in Polling Loop: {e}")
+
+            wakeup = self.scheduler.next_wakeup()
+            until = next_refresh if wakeup is None else min(wakeup, next_refresh)
+            await asyncio.sleep(max(self.MIN_SLEEP, until - time.monotonic()))
+
+poller = ThingSpeakPoller()
@@ -0,0 +1,122 @@
+import json
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from app.services.telemetry.normalize import get_normalizer
+from app.services.telemetry_processor import parse_timestamp
+
+FIELD_KEYS = {f"field{i}" for i in range(1, 9)}
+TIMESTAMP_KEYS = ("timestamp", "created_at")
+
+class PayloadError(ValueError):
+    """The request body could not be decoded into readings."""
+
+def parse_payload(body: bytes, content_type: str) -> List[Any]:
+    """
+    Decode a push body into a list of raw reading objects.
+    Accepts NDJSON (one object per line), a JSON array, a single JSON object,
+    or a gateway envelope {"readings": [...]}.
+    """
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise PayloadError(f"Invalid JSON on line {line_no}: {e.msg}")
+        return items
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PayloadError(f"Invalid JSON body: {e.msg}")
+    if isinstance(data, dict) and isinstance(data.get("readings"), list):
+        return data["readings"]
+    if isinstance(data, list):
+        return data
+    return [data]
+
+def _is_numeric(val: Any) -> bool:
+    """A finite number, or a string holding one (NaN and infinities are not readings)."""
+    if isinstance(val, bool):
+        return False
+    if isinstance(val, str):
+        try:
+            val = float(val)
+        except ValueError:
+            return False
+    if not isinstance(val, (int, float)):
+        return False
+    try:
+        return math.isfinite(val)
+    except OverflowError: # an int too large for a float
+        return False
+
+class PushReadingValidator:
+    """
+    Validates pushed readings against a node's ThingSpeak field mappings and
+    converts them into the same normalized shape the ThingSpeak source produces,
+    so everything downstream (TelemetryProcessor, alerts) sees one format.
+
+    A reading may use raw keys (field1..field8) or the node's mapped aliases
+    (e.g. "distance"); values must be numeric.
+    """
+    def __init__(self, field_mapping: Dict[str, str]):
+        self.field_mapping = field_mapping
+        self.alias_to_field = {alias: field for field, alias in field_mapping.items()}
+        self.normalizer = get_normalizer(field_mapping)
+
+    def _to_raw(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        ts_value = next((item[k] for k in TIMESTAMP_KEYS if item.get(k) is not None), None)
+        if ts_value is None:
+            created_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        elif isinstance(ts_value, (int, float)) and not isinstance(ts_value, bool):
+            try:
+                created_at = datetime.utcfromtimestamp(ts_value).strftime("%Y-%m-%dT%H:%M:%SZ")
+            except (ValueError, OverflowError, OSError):
+                # NaN, Infinity or far outside the platform's datetime range
+                raise ValueError(f"Invalid timestamp: {ts_value!r}")
+        elif isinstance(ts_value, str) and parse_timestamp(ts_value):
+            created_at = parse_timestamp(ts_value).strftime("%Y-%m-%dT%H:%M:%SZ")
+        else:
+            raise ValueError(f"Invalid timestamp: {ts_value!r}")
+
+        raw: Dict[str, Any] = {"created_at": created_at, "entry_id": item.get("entry_id")}
+        for key, val in item.items():
+            if key in TIMESTAMP_KEYS or key == "entry_id":
+                continue
+            field = key if key in FIELD_KEYS else self.alias_to_field.get(key)
+            if field is None:
+                raise ValueError(f"Unknown metric '{key}' for this node")
+            if val is None:
+                continue
+            if not _is_numeric(val):
+                raise ValueError(f"Non-numeric value for '{key}': {val!r}")
+            raw[field] = float(val) if isinstance(val, str) else val
+
+        if not any(k in FIELD_KEYS for k in raw):
+            raise ValueError("Reading has no metric values")
+        return raw
+
+    def validate(self, items: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return (normalized readings, errors); errors carry the index of the rejected item."""
+        raws, errors = [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({"index": index, "error": "Reading must be a JSON object"})
+                continue
+            try:
+                raw = self._to_raw(item)
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            raws.append(raw)
+        return self.normalizer.normalize(raws), errors
@@ -0,0 +1,310 @@
+"""
+Per-node ring buffers of recent readings.
+
+Each node gets a fixed-size, array-backed buffer of its last RING_BUFFER_SIZE
+readings: one datetime64 timestamp column, one entry_id column and one
+float64 column (plus an integer flag) per raw field. The ingest pipeline
+adds every stored batch, so recent history, live values and short-window
+analytics are served from memory. Like node_readings, a buffer holds one
+reading per instant: channels reporting the same second are merged, and a
+channel whose batch arrives after another's is slotted in by timestamp.
+Memory per node is fixed at roughly 100 bytes per slot.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.services.telemetry.normalize import RAW_FIELDS, FeedColumns, get_normalizer
+
+settings = get_settings()
+
+MISSING_ENTRY_ID = -1
+
+class NodeRing:
+    """The last `capacity` readings of one node, oldest overwritten first."""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[us]")
+        self.entry_ids = np.full(capacity, MISSING_ENTRY_ID, dtype=np.int64)
+        self.values = np.full((len(RAW_FIELDS), capacity), np.nan)
+        self.ints = np.zeros((len(RAW_FIELDS), capacity), dtype=bool) # integer readings ("12", not "12.0")
+        self.extras = np.full(capacity, None, dtype=object) # non-numeric field values, rarely set
+        self.head = 0 # next slot to write
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.entry_ids.nbytes + self.values.nbytes + self.ints.nbytes + self.extras.nbytes
+
+    @property
+    def newest(self) -> Optional[datetime]:
+        return self.timestamps[(self.head - 1) % self.capacity].item() if self.size else None
+
+    @property
+    def oldest(self) -> Optional[datetime]:
+        return self.timestamps[(self.head - self.size) % self.capacity].item() if self.size else None
+
+    def extend(self, rows: List[Any]) -> int:
+        """
+        Add readings (NodeReading rows, or dicts with its columns; int field
+        values are flagged as integer readings). Readings newer than the
+        newest one held are appended; others are slotted in by timestamp, and
+        one at an instant already held only fills the fields that reading
+        lacks. Readings older than the window the buffer keeps are dropped:
+        they belong in storage, not in the buffer of recent readings.
+        Returns how many new readings it holds.
+        """
+        if not rows:
+            return 0
+        get = (lambda r, c: r[c]) if isinstance(rows[0], dict) else getattr
+        timestamps = np.array([get(r, "timestamp") for r in rows], dtype="datetime64[us]")
+        entry_ids = np.array([MISSING_ENTRY_ID if get(r, "entry_id") is None else get(r, "entry_id") for r in rows], dtype=np.int64)
+        columns = [[get(r, f) for r in rows] for f in RAW_FIELDS]
+        values = np.array([[np.nan if v is None else v for v in col] for col in columns], dtype=np.float64)
+        ints = np.array([[type(v) is int for v in col] for col in columns], dtype=bool).reshape(values.shape)
+        extras = np.empty(len(rows), dtype=object)
+        extras[:] = [get(r, "data") or None for r in rows]
+
+        newest = self.newest
+        if (newest is None or timestamps[0] > np.datetime64(newest, "us")) and np.all(timestamps[1:] > timestamps[:-1]):
+            return self._append(timestamps, entry_ids, values, ints, extras)
+        return self._merge(timestamps, entry_ids, values, ints, extras)
+
+    def _append(self, timestamps, entry_ids, values, ints, extras) -> int:
+        n = min(len(timestamps), self.capacity)
+        slots = (self.head + np.arange(n)) % self.capacity
+        self.timestamps[slots] = timestamps[-n:]
+        self.entry_ids[slots] = entry_ids[-n:]
+        self.values[:, slots] = values[:, -n:]
+        self.ints[:, slots] = ints[:, -n:]
+        self.extras[slots] = extras[-n:]
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return n
+
+    def _merge(self, timestamps, entry_ids, values, ints, extras) -> int:
+        """Rebuild the buffer from the held readings and `rows` in time order (the rare out-of-order case)."""
+        held = self.last(self.size)
+        timestamps = np.concatenate([self.timestamps[held], timestamps])
+        entry_ids = np.concatenate([self.entry_ids[held], entry_ids])
+        values = np.concatenate([self.values[:, held], values], axis=1)
+        ints = np.concatenate([self.ints[:, held], ints], axis=1)
+        extras = np.concatenate([self.extras[held], extras])
+        is_new = np.arange(len(timestamps)) >= len(held)
+
+        # Stable, so at a shared instant the held reading comes first and keeps its values
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, entry_ids, values, ints, extras, is_new = (
+            timestamps[order], entry_ids[order], values[:, order], ints[:, order], extras[order], is_new[order]
+        )
+        first = np.ones(len(timestamps), dtype=bool)
+        first[1:] = timestamps[1:] != timestamps[:-1]
+        start = np.maximum.accumulate(np.where(first, np.arange(len(timestamps)), 0))
+        for i in np.flatnonzero(~first).tolist():
+            base = start[i]
+            fill = np.isnan(values[:, base]) & ~np.isnan(values[:, i])
+            values[fill, base] = values[fill, i]
+            ints[fill, base] = ints[fill, i]
+            if entry_ids[base] == MISSING_ENTRY_ID:
+                entry_ids[base] = entry_ids[i]
+            if extras[i]:
+                extras[base] = {**extras[i], **(extras[base] or {})}
+
+        keep = np.flatnonzero(first)[-self.capacity:]
+        n = len(keep)
+        self.timestamps[:n], self.timestamps[n:] = timestamps[keep], np.datetime64("NaT")
+        self.entry_ids[:n], self.entry_ids[n:] = entry_ids[keep], MISSING_ENTRY_ID
+        self.values[:, :n], self.values[:, n:] = values[:, keep], np.nan
+        self.ints[:, :n], self.ints[:, n:] = ints[:, keep], False
+        self.extras[:n], self.extras[n:] = extras[keep], None
+        added = int(np.count_nonzero(is_new[keep])) # a new reading at a held instant was merged, not added
+        self.head = n % self.capacity
+        self.size = n
+        return added
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Held readings as dicts with NodeReading's columns, oldest first."""
+        slots = self.last(self.size)
+        out = []
+        for i in slots.tolist():
+            row = {
+                "timestamp": self.timestamps[i].item(),
+                "entry_id": None if self.entry_ids[i] == MISSING_ENTRY_ID else int(self.entry_ids[i]),
+                "data": self.extras[i]
+            }
+            for f, field in enumerate(RAW_FIELDS):
+                value = self.values[f, i]
+                row[field] = None if np.isnan(value) else int(value) if self.ints[f, i] else float(value)
+            out.append(row)
+        return out
+
+    def last(self, count: int) -> np.ndarray:
+        """Slots of the newest `count` readings, oldest first."""
+        count = min(count, self.size)
+        return (self.head - count + np.arange(count)) % self.capacity
+
+    def since(self, start: datetime) -> np.ndarray:
+        """Slots of readings at or after `start`, oldest first."""
+        slots = self.last(self.size)
+        first = np.searchsorted(self.timestamps[slots], np.datetime64(start, "us"))
+        return slots[first:]
+
+    def reporting(self, slots: np.ndarray, fields: List[str]) -> np.ndarray:
+        """The slots among `slots` whose reading has a value for any of `fields`."""
+        rows = [f for f, field in enumerate(RAW_FIELDS) if field in fields]
+        has = ~np.isnan(self.values[rows][:, slots]).all(axis=0)
+        for i, data in enumerate(self.extras[slots].tolist()):
+            if data and any(field in data for field in fields):
+                has[i] = True
+        return slots[has]
+
+    def covers(self, start: datetime) -> bool:
+        """Whether every reading from `start` on is held (the buffer reaches back that far)."""
+        return self.size > 0 and self.oldest <= start
+
+    def columns(self, slots: np.ndarray, field_mapping: Optional[Dict[str, str]] = None) -> FeedColumns:
+        """The readings in `slots` as feed columns, shaped like a ThingSpeak fetch for `field_mapping`."""
+        normalizer = get_normalizer(field_mapping)
+        n = len(slots)
+        row_of = {field: f for f, field in enumerate(RAW_FIELDS)}
+        values, ints, extras = {}, {}, {}
+        for field in normalizer.sources:
+            if field in row_of:
+                values[field], ints[field] = self.values[row_of[field], slots], self.ints[row_of[field], slots]
+            else:
+                values[field], ints[field] = np.full(n, np.nan), np.zeros(n, dtype=bool)
+            extras[field] = {}
+        for i, data in enumerate(self.extras[slots].tolist()):
+            for field, raw in (data or {}).items():
+                if field in extras:
+                    extras[field][i] = raw
+        times = self.timestamps[slots]
+        # Whole seconds like ThingSpeak's created_at, unless a reading has a fraction
+        unit = "s" if np.all(times.astype(np.int64) % 1_000_000 == 0) else "us"
+        stamps = np.char.add(np.datetime_as_string(times, unit=unit), "Z").astype(object)
+        entry_ids = [None if e == MISSING_ENTRY_ID else e for e in self.entry_ids[slots].tolist()]
+        # Stored readings don't keep absent keys apart from missing values
+        present = {}
+        for field in normalizer.source_of.values():
+            present[field] = ~np.isnan(values[field])
+            present[field][list(extras[field])] = True
+        return FeedColumns(normalizer, stamps, entry_ids, values, ints, extras, present)
+
+class RingBufferStore:
+    """
+    A NodeRing per node, kept filled by the ingest pipeline (see stages.py).
+
+    A node's buffer is seeded once from stored readings the first time it is
+    read. After that it is served with no I/O while this process keeps
+    ingesting the node. Nodes ingested by another process (e.g.
+    `python -m app.worker`) are topped up with the readings newer than the
+    buffer at most every `sync_interval` seconds.
+    """
+    def __init__(self, capacity: Optional[int] = None, sync_interval: Optional[float] = None):
+        self.capacity = settings.RING_BUFFER_SIZE if capacity is None else capacity
+        self.sync_interval = settings.LATEST_STATE_CACHE_TTL if sync_interval is None else sync_interval
+        self._rings: Dict[str, NodeRing] = {}
+        self._loaded = set()
+        self._synced_at: Dict[str, float] = {}
+        self.stats = {"appended": 0, "late": 0, "hits": 0, "misses": 0, "db_reads": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _ring(self, node_id: str) -> NodeRing:
+        ring = self._rings.get(node_id)
+        if ring is None:
+            ring = self._rings[node_id] = NodeRing(self.capacity)
+        return ring
+
+    def record(self, node_id: str, rows: List[Dict[str, Any]]):
+        """Add a stored batch's reading rows (TelemetryProcessor.build_reading_rows)."""
+        if not self.enabled or not rows:
+            return
+        rows = sorted(rows, key=lambda r: r["timestamp"])
+        appended = self._ring(node_id).extend(rows)
+        self._synced_at[node_id] = time.monotonic()
+        self.stats["appended"] += appended
+        self.stats["late"] += len(rows) - appended
+
+    async def get(self, session: AsyncSession, node_id: str) -> Optional[NodeRing]:
+        """The node's buffer, seeded or topped up from stored readings when needed."""
+        if not self.enabled:
+            return None
+        from app.db.repository import ReadingRepository
+        from app.services.telemetry.archive import last_readings
+
+        ring = self._ring(node_id)
+        if node_id not in self._loaded:
+            self.stats["db_reads"] += 1
+            stored = await last_readings(session, node_id, self.capacity)
+            # Readings added meanwhile may not be written yet; they win over their stored
+            # copies, which lost the integer flags
+            held = ring.rows()
+            ring = self._rings[node_id] = NodeRing(self.capacity)
+            ring.extend(held)
+            ring.extend(stored)
+            self._loaded.add(node_id)
+            self._synced_at[node_id] = time.monotonic()
+        elif time.monotonic() - self._synced_at.get(node_id, 0.0) > self.sync_interval:
+            self.stats["db_reads"] += 1
+            newer = await ReadingRepository(session).get_range(
+                node_id, start=ring.newest, limit=self.capacity, newest_first=True
+            )
+            ring.extend(list(reversed(newer)))
+            self._synced_at[node_id] = time.monotonic()
+        return ring
+
+    async def recent(
+        self,
+        session: AsyncSession,
+        node_id: str,
+        count: Optional[int] = None,
+        start: Optional[datetime] = None,
+        field_mapping: Optional[Dict[str, str]] = None
+    ) -> Optional[FeedColumns]:
+        """
+        The node's last `count` readings, or those since `start`, as feed
+        columns; None when the buffer can't answer in full (callers fall back
+        to storage or ThingSpeak). With a `field_mapping`, only readings with
+        one of its mapped fields count, so a node whose channels report
+        separately gets the readings of the mapping's channel, as ThingSpeak
+        would return them.
+        """
+        if not self.enabled or (count is not None and count > self.capacity):
+            self.stats["misses"] += 1
+            return None
+        ring = await self.get(session, node_id)
+        fields = list(get_normalizer(field_mapping).source_of.values())
+        if start is not None:
+            slots = ring.since(start) if ring.covers(start) else None
+            if slots is not None and fields:
+                slots = ring.reporting(slots, fields)
+        else:
+            slots = ring.last(len(ring))
+            if fields:
+                slots = ring.reporting(slots, fields)
+            slots = slots[len(slots) - count:] if len(slots) >= count else None
+        if slots is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return ring.columns(slots, field_mapping)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "nodes": len(self._rings),
+            "capacity": self.capacity,
+            "bytes": sum(r.nbytes for r in self._rings.values()),
+            **self.stats
+        }
+
+ring_buffers = RingBufferStore()
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import math
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.config import get_settings
+from app.db.partitions import add_months
+from app.db.repository import upsert
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import NodeAnalytics, NodeReading
+from app.services.telemetry_processor import parse_timestamp
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PERIODS = ("hourly", "daily", "weekly", "monthly")
+LEVEL_TYPES = ("EvaraTank", "EvaraDeep")
+AGGREGATE_COLUMNS = ("sample_count", "value_sum", "value_min", "value_max", "avg_level_percent", "consumption_liters", "peak_flow")
+
+BucketKey = Tuple[str, str, datetime] # (node_id, period_type, period_start)
+# Coarser buckets and the level each is rolled up from
+ROLLED_UP = (("daily", "hourly"), ("weekly", "daily"), ("monthly", "daily"))
+NODES_PER_QUERY = 500
+
+def period_start(period_type: str, ts: datetime) -> datetime:
+    if period_type == "hourly":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period_type == "daily":
+        return day
+    if period_type == "weekly":
+        return day - timedelta(days=day.weekday()) # ISO weeks start on Monday
+    return day.replace(day=1)
+
+def period_end(period_type: str, start: datetime) -> datetime:
+    if period_type == "hourly":
+        return start + timedelta(hours=1)
+    if period_type == "daily":
+        return start + timedelta(days=1)
+    if period_type == "weekly":
+        return start + timedelta(weeks=1)
+    return add_months(start, 1)
+
+def primary_field(analytics_type: Optional[str]) -> str:
+    """field2 (distance/depth) for tanks and deep wells, field1 (flow rate) otherwise."""
+    return "field2" if analytics_type in LEVEL_TYPES else "field1"
+
+def _runs(starts: Iterable[datetime], period_type: str) -> List[Tuple[datetime, datetime]]:
+    """Bucket starts merged into [start, end) ranges of consecutive buckets."""
+    runs: List[List[datetime]] = []
+    for start in sorted(starts):
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = period_end(period_type, start)
+        else:
+            runs.append([start, period_end(period_type, start)])
+    return [(start, end) for start, end in runs]
+
+def _hour_bucket(dialect_name: str, column):
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+class RollupAggregator:
+    """
+    Hourly/daily/weekly/monthly aggregates of each node's primary metric.
+
+    The ingest pipeline reports each batch once the writer has committed it
+    (see stages.py), and the hours it touched are marked. Every
+    ROLLUP_FLUSH_INTERVAL seconds the marked hours are recomputed from
+    node_readings with one grouped query per run of hours, days from their
+    hourly rows, and weeks and months from their daily rows. Every bucket is
+    written as a whole, never added to, so a resend, a retry landing on
+    another worker, a restart or a backfill can't count a reading twice, and
+    a late reading costs one hour of readings rather than a month.
+    """
+    def __init__(self, flush_interval: Optional[float] = None, session_factory=None):
+        self.flush_interval = flush_interval or settings.ROLLUP_FLUSH_INTERVAL
+        self.session_factory = session_factory or AsyncSessionLocal
+        # node_id -> [analytics_type, marked hour starts]
+        self._dirty: Dict[str, List[Any]] = {}
+        self.stats = {"readings": 0, "skipped": 0, "flushes": 0, "rows_upserted": 0}
+
+    def _mark(self, node_id: str, analytics_type: Optional[str], hours: Iterable[datetime]):
+        entry = self._dirty.setdefault(node_id, [analytics_type, set()])
+        entry[0] = analytics_type
+        entry[1].update(hours)
+
+    def record(self, node_id: str, readings: List[Dict[str, Any]], analytics_type: Optional[str]):
+        """Mark the hours of a batch of normalized readings that has been written to node_readings."""
+        field = primary_field(analytics_type)
+        hours = set()
+        for reading in readings:
+            ts = parse_timestamp(reading.get("timestamp"))
+            if ts is None or _number(reading.get(field)) is None:
+                self.stats["skipped"] += 1
+                continue
+            hours.add(period_start("hourly", ts))
+            self.stats["readings"] += 1
+        if hours:
+            self._mark(node_id, analytics_type, hours)
+
+    def recompute(self, node_id: str, analytics_type: Optional[str], start: datetime, end: datetime):
+        """Mark every hour overlapping [start, end), e.g. after a backfill wrote readings there."""
+        hour = period_start("hourly", start)
+        hours = []
+        while hour < end:
+            hours.append(hour)
+            hour += timedelta(hours=1)
+        self._mark(node_id, analytics_type, hours)
+
+    @staticmethod
+    def _row(key: BucketKey, count: int, total: float, low: float, high: float, analytics_type: Optional[str]) -> Dict[str, Any]:
+        node_id, period_type, start = key
+        level = analytics_type in LEVEL_TYPES
+        avg = total / count
+        # Derived columns kept for existing readers; NULL where they don't apply to the node type
+        return {
+            "id": str(uuid.uuid4()),
+            "node_id": node_id,
+            "period_type": period_type,
+            "period_start": start,
+            "sample_count": count,
+            "value_sum": total,
+            "value_min": low,
+            "value_max": high,
+            "avg_level_percent": avg if level else None,
+            "consumption_liters": avg * 10 if level else None, # Mock consumption calculation
+            "peak_flow": None if level else high
+        }
+
+    async def _hourly_rows(self, session, marked: Dict[str, Tuple[Optional[str], Set[datetime]]]) -> List[Dict[str, Any]]:
+        """Marked hours aggregated from node_readings in the database."""
+        # Nodes with the same marked hours (normally just the current one) share a query
+        by_run: Dict[Tuple[str, datetime, datetime], List[str]] = defaultdict(list)
+        for node_id, (analytics_type, hours) in marked.items():
+            for start, end in _runs(hours, "hourly"):
+                by_run[(primary_field(analytics_type), start, end)].append(node_id)
+
+        rows = []
+        bucket = _hour_bucket(session.bind.dialect.name, NodeReading.timestamp).label("bucket")
+        for (field, start, end), node_ids in by_run.items():
+            column = getattr(NodeReading, field)
+            for i in range(0, len(node_ids), NODES_PER_QUERY):
+                result = await session.execute(
+                    select(NodeReading.node_id, bucket, func.count(column), func.sum(column), func.min(column), func.max(column))
+                    .where(
+                        NodeReading.node_id.in_(node_ids[i:i + NODES_PER_QUERY]),
+                        NodeReading.timestamp >= start,
+                        NodeReading.timestamp < end,
+                        column.isnot(None)
+                    )
+                    .group_by(NodeReading.node_id, bucket)
+                )
+                for node_id, hour, count, total, low, high in result.all():
+                    if isinstance(hour, str): # SQLite
+                        hour = datetime.fromisoformat(hour)
+                    rows.append(self._row((node_id, "hourly", hour), count, total, low, high, marked[node_id][0]))
+        return rows
+
+    async def _rolled_up_rows(
+        self,
+        session,
+        marked: Dict[str, Tuple[Optional[str], Set[datetime]]],
+        period_type: str,
+        child_type: str
+    ) -> List[Dict[str, Any]]:
+        """Marked `period_type` buckets combined from their `child_type` rows."""
+        by_run: Dict[Tuple[datetime, datetime], List[str]] = defaultdict(list)
+        for node_id, (_, starts) in marked.items():
+            for run in _runs(starts, period_type):
+                by_run[run].append(node_id)
+
+        totals: Dict[BucketKey, List[Any]] = {}
+        for (start, end), node_ids in by_run.items():
+            for i in range(0, len(node_ids), NODES_PER_QUERY):
+                result = await session.execute(
+                    select(
+                        NodeAnalytics.node_id, NodeAnalytics.period_start, NodeAnalytics.sample_count,
+                        NodeAnalytics.value_sum, NodeAnalytics.value_min, NodeAnalytics.value_max
+                    )
+                    .where(
+                        NodeAnalytics.node_id.in_(node_ids[i:i + NODES_PER_QUERY]),
+                        NodeAnalytics.period_type == child_type,
+                        NodeAnalytics.period_start >= start,
+                        NodeAnalytics.period_start < end,
+                        NodeAnalytics.sample_count > 0 # not legacy per-poll rows
+                    )
+                )
+                for node_id, child_start, count, total, low, high in result.all():
+                    key = (node_id, period_type, period_start(period_type, child_start))
+                    acc = totals.get(key)
+                    if acc is None:
+                        totals[key] = [count, total, low, high]
+                    else:
+                        acc[0] += count
+                        acc[1] += total
+                        acc[2] = min(acc[2], low)
+                        acc[3] = max(acc[3], high)
+        return [self._row(key, *acc, marked[key[0]][0]) for key, acc in totals.items()]
+
+    async def flush(self):
+        """Recompute every marked hour, then the days, weeks and months containing them."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        marked = {"hourly": {node_id: (t, hours) for node_id, (t, hours) in dirty.items()}}
+        upserted = 0
+        try:
+            async with self.session_factory() as session:
+                stmt = upsert(
+                    NodeAnalytics,
+                    session.bind.dialect.name,
+                    ["node_id", "period_type", "period_start"],
+                    list(AGGREGATE_COLUMNS)
+                )
+                rows = await self._hourly_rows(session, marked["hourly"])
+                if rows:
+                    await session.execute(stmt, rows)
+                upserted += len(rows)
+                for period_type, child_type in ROLLED_UP:
+                    # Same transaction, so each level reads the rows just written below it
+                    marked[period_type] = {
+                        node_id: (t, {period_start(period_type, s) for s in starts})
+                        for node_id, (t, starts) in marked[child_type].items()
+                    }
+                    rows = await self._rolled_up_rows(session, marked[period_type], period_type, child_type)
+                    if rows:
+                        await session.execute(stmt, rows)
+                    upserted += len(rows)
+                await session.commit()
+            self.stats["flushes"] += 1
+            self.stats["rows_upserted"] += upserted
+        except Exception as e:
+            # Mark the hours again so the next flush retries them
+            for node_id, (analytics_type, hours) in dirty.items():
+                self._mark(node_id, analytics_type, hours)
+            logger.error(f"❌ Error flushing analytics rollups for {len(dirty)} nodes: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pending_nodes": len(self._dirty),
+            "pending_hours": sum(len(hours) for _, hours in self._dirty.values()),
+            **self.stats
+        }
+
+rollups = RollupAggregator()
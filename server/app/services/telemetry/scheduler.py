@@ -0,0 +1,135 @@
+import heapq
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+class ChannelSchedule:
+    """Polling state for one channel."""
+    __slots__ = ("key", "interval", "next_due", "failures", "last_entry_at", "observed_gap")
+
+    def __init__(self, key: Hashable, interval: float, next_due: float):
+        self.key = key
+        self.interval = interval
+        self.next_due = next_due
+        self.failures = 0
+        self.last_entry_at: Optional[datetime] = None
+        self.observed_gap: Optional[float] = None # EWMA of seconds between entries
+
+class PollScheduler:
+    """
+    Priority queue of next-due times, one entry per channel.
+
+    Each channel's interval follows its observed posting rate (clamped to
+    [min_interval, max_interval]), stretches while the channel stays quiet,
+    and backs off exponentially while requests keep failing.
+    Times are plain floats from the caller's clock (time.monotonic()).
+    """
+    SMOOTHING = 0.3 # weight of the newest gap in the EWMA
+    IDLE_GROWTH = 1.5 # interval multiplier when a poll returns nothing new
+
+    def __init__(
+        self,
+        default_interval: float,
+        min_interval: float,
+        max_interval: float,
+        max_backoff: float
+    ):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self._heap: List[tuple] = []
+        self._state: Dict[Hashable, ChannelSchedule] = {}
+        self._counter = itertools.count() # tie-breaker so keys never get compared
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def get(self, key: Hashable) -> Optional[ChannelSchedule]:
+        return self._state.get(key)
+
+    def _push(self, state: ChannelSchedule, due: float):
+        state.next_due = due
+        heapq.heappush(self._heap, (due, next(self._counter), state.key))
+
+    def sync(self, keys, now: float):
+        """Add newly configured channels (due immediately) and forget removed ones."""
+        keys = set(keys)
+        for key in keys - self._state.keys():
+            state = ChannelSchedule(key, self.default_interval, now)
+            self._state[key] = state
+            self._push(state, now)
+        for key in self._state.keys() - keys:
+            # Heap entries for removed keys are skipped lazily in due()
+            del self._state[key]
+
+    def due(self, now: float) -> List[Hashable]:
+        """Pop every channel whose next-due time has passed."""
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, key = heapq.heappop(self._heap)
+            state = self._state.get(key)
+            if state is None or state.next_due != due:
+                continue # stale entry: channel removed or rescheduled
+            ready.append(key)
+        return ready
+
+    def next_wakeup(self) -> Optional[float]:
+        """Earliest pending due time, or None when nothing is scheduled."""
+        while self._heap:
+            due, _, key = self._heap[0]
+            state = self._state.get(key)
+            if state is not None and state.next_due == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def record_success(self, key: Hashable, entry_times: List[datetime], now: float):
+        """
+        Reschedule after a successful poll.
+        entry_times are the created_at values of the new entries, oldest first.
+        """
+        state = self._state.get(key)
+        if state is None:
+            return
+        state.failures = 0
+
+        if entry_times:
+            previous = state.last_entry_at
+            for ts in entry_times:
+                if previous is not None:
+                    gap = (ts - previous).total_seconds()
+                    if gap > 0:
+                        if state.observed_gap is None:
+                            state.observed_gap = gap
+                        else:
+                            state.observed_gap = self.SMOOTHING * gap + (1 - self.SMOOTHING) * state.observed_gap
+                previous = ts
+            state.last_entry_at = previous
+            state.interval = self._clamp(state.observed_gap or state.interval)
+        else:
+            # Quiet channel: back off gradually towards max_interval
+            state.interval = self._clamp(state.interval * self.IDLE_GROWTH)
+
+        self._push(state, now + state.interval)
+
+    def record_failure(self, key: Hashable, now: float):
+        """Reschedule with exponential backoff after a failed poll."""
+        state = self._state.get(key)
+        if state is None:
+            return
+        state.failures += 1
+        backoff = min(self.max_backoff, state.interval * (2 ** state.failures))
+        self._push(state, now + backoff)
+
+    def snapshot(self) -> Dict[str, Any]:
+        intervals = [s.interval for s in self._state.values()]
+        return {
+            "channels": len(self._state),
+            "failing": sum(1 for s in self._state.values() if s.failures),
+            "min_interval": min(intervals) if intervals else None,
+            "max_interval": max(intervals) if intervals else None
+        }
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task instead of starting their own. The key
+    is released as soon as the task finishes, so this de-duplicates only
+    concurrent work and never serves stale results.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        # Shield so one caller being cancelled doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,127 @@
+"""
+The telemetry ingest pipeline:
+
+    fetch -> normalize -> validate -> store -> alerts -> publish
+
+Poll batches enter at `fetch`; push and MQTT batches arrive already
+normalized and enter at `validate`. Each stage has its own worker count and
+bounded queue, and /health reports per-stage depth, throughput and latency.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import get_settings
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import NodeReading
+from app.services.telemetry.latest import latest_state
+from app.services.telemetry.normalize import get_normalizer
+from app.services.telemetry.pipeline import IngestBatch, IngestPipeline, Stage
+from app.services.telemetry.ring import ring_buffers
+from app.services.telemetry.rollup import rollups
+from app.services.telemetry.writer import telemetry_writer
+from app.services.telemetry_processor import TelemetryProcessor, parse_timestamp
+
+settings = get_settings()
+
+async def fetch_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    from app.services.telemetry.poller import poller
+
+    feeds = None
+    try:
+        feeds = await poller.fetch_target(batch.target)
+    finally:
+        # The poller waits on this to update its schedule, whatever happens next
+        if batch.fetched is not None and not batch.fetched.done():
+            batch.fetched.set_result(feeds)
+    if not feeds:
+        return None
+    batch.raw = feeds
+    return batch
+
+async def normalize_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    if batch.readings is None:
+        batch.readings = get_normalizer(batch.field_mapping).normalize(batch.raw or [])
+    return batch
+
+async def _advance_watermark(batch: IngestBatch):
+    """
+    Move the poll watermark past every entry the batch fetched. Entry ids only
+    grow, so entries validate rejected are skipped from now on too, while the
+    time watermark (the next fetch's `start`) only moves to an accepted
+    reading: a far-future timestamp would hide every entry after it.
+    """
+    from app.services.telemetry.poller import poller
+
+    entry_ids = [f.get("entry_id") for f in batch.raw or [] if f.get("entry_id") is not None]
+    synced_at = parse_timestamp(batch.readings[-1]["timestamp"]) if batch.readings else None
+    async with AsyncSessionLocal() as session:
+        await poller.advance_watermark(session, batch.target, max(entry_ids, default=None), synced_at)
+        await session.commit()
+
+async def validate_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    """Drop readings with bad or far-future timestamps, de-duplicate by timestamp, sort oldest first."""
+    latest_allowed = datetime.utcnow() + timedelta(seconds=settings.INGEST_MAX_FUTURE_SKEW)
+    by_time = {}
+    for reading in batch.readings or []:
+        ts = parse_timestamp(reading.get("timestamp"))
+        if ts is None or ts > latest_allowed:
+            continue
+        by_time[ts] = reading # a later duplicate wins, matching what ThingSpeak would show
+    batch.readings = [by_time[ts] for ts in sorted(by_time)]
+    if not batch.readings:
+        if batch.target is not None and batch.raw:
+            # Nothing to store, but the next poll must not fetch the same entries again
+            await _advance_watermark(batch)
+        return None
+    return batch
+
+async def store_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    # Rows go to the batched writer (blocks while its queue is full)
+    rows = TelemetryProcessor.build_reading_rows(batch.node_id, batch.readings)
+
+    async def written():
+        # Rollups are recomputed from node_readings, so only mark hours whose rows are committed
+        rollups.record(batch.node_id, batch.readings, batch.analytics_type)
+        if batch.target is not None:
+            # Likewise the poll watermark; if a flush fails, the next poll fetches the same entries again
+            await _advance_watermark(batch)
+    await telemetry_writer.enqueue_many(NodeReading, rows, on_written=written)
+    # Current state; persisted by its own periodic upsert
+    latest_state.record(batch.node_id, batch.readings[-1], batch.source, batch.analytics_type)
+    ring_buffers.record(batch.node_id, rows)
+    return batch
+
+async def alert_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    from app.services.alert_engine import AlertEngine
+
+    async with AsyncSessionLocal() as session:
+        # Most recent state only
+        await AlertEngine(session).check_rules(batch.node_id, batch.readings[-1])
+    return batch
+
+async def publish_stage(batch: IngestBatch) -> Optional[IngestBatch]:
+    from app.services.websockets import manager
+
+    if manager.active_connections:
+        await manager.broadcast(json.dumps({
+            "event": "TELEMETRY",
+            "node_id": batch.node_id,
+            "source": batch.source,
+            "count": len(batch.readings),
+            "reading": batch.readings[-1]
+        }, default=str))
+    return None
+
+def build_pipeline() -> IngestPipeline:
+    size = settings.PIPELINE_QUEUE_SIZE
+    return IngestPipeline([
+        Stage("fetch", fetch_stage, concurrency=settings.THINGSPEAK_POLL_CONCURRENCY, maxsize=size),
+        Stage("normalize", normalize_stage, concurrency=1, maxsize=size),
+        Stage("validate", validate_stage, concurrency=1, maxsize=size),
+        Stage("store", store_stage, concurrency=settings.PIPELINE_STORE_CONCURRENCY, maxsize=size),
+        Stage("alerts", alert_stage, concurrency=settings.PIPELINE_ALERT_CONCURRENCY, maxsize=size),
+        Stage("publish", publish_stage, concurrency=1, maxsize=size)
+    ])
+
+ingest_pipeline = build_pipeline()
@@ -0,0 +1,62 @@
+import json
+import re
+from typing import Any, Dict, List
+
+class FeedStreamParser:
+    """
+    Incremental decoder for the `feeds` array of a ThingSpeak feeds.json body.
+
+    Text chunks go in as they arrive from the socket and complete feed
+    objects come out, so a multi-day response is never held in memory as one
+    string or one decoded document. Everything outside `feeds` (the
+    `channel` header) is skipped.
+    """
+    SEEK, ITEMS, DONE = "seek", "items", "done"
+    _FEEDS_START = re.compile(r'"feeds"\s*:\s*\[')
+    MAX_PENDING = 1_000_000 # chars of one unfinished feed object before giving up
+
+    def __init__(self):
+        self.state = self.SEEK
+        self._buf = ""
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of the body; return the feed objects it completed."""
+        if self.state == self.DONE:
+            return []
+        self._buf += text
+        if self.state == self.SEEK:
+            match = self._FEEDS_START.search(self._buf)
+            if not match:
+                # Keep enough to match a key split across chunks
+                self._buf = self._buf[-32:]
+                return []
+            self._buf = self._buf[match.end():]
+            self.state = self.ITEMS
+
+        items = []
+        buf, pos, end = self._buf, 0, len(self._buf)
+        while True:
+            while pos < end and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= end:
+                break
+            if buf[pos] == "]":
+                self.state = self.DONE
+                break
+            try:
+                obj, pos_after = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Object not complete yet; wait for the next chunk
+                if end - pos > self.MAX_PENDING:
+                    raise ValueError("Malformed ThingSpeak feeds array")
+                break
+            items.append(obj)
+            pos = pos_after
+        self._buf = "" if self.state == self.DONE else buf[pos:]
+        return items
+
+    def close(self):
+        """Call at end of body; raises if the feeds array was cut off."""
+        if self.state == self.ITEMS:
+            raise ValueError("ThingSpeak response ended inside the feeds array")
@@ -1,10 +1,18 @@
-import httpx
 import asyncio
-from typing import Dict, Any, List, Optional
+import logging
+import httpx
+from typing import Dict, Any, AsyncIterator, List, Optional
 from app.services.telemetry.base import BaseTelemetryService
+from app.services.telemetry.singleflight import SingleFlight
+from app.services.telemetry.cache import channel_cache
+from app.services.telemetry.throttle import thingspeak_guard
+from app.services.telemetry.normalize import FeedColumns, get_normalizer
+from app.services.telemetry.stream import FeedStreamParser
 from app.core.config import get_settings
+from app.core.http import http_clients
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 class ThingSpeakTelemetryService(BaseTelemetryService):
     """
@@ -12,6 +20,102 @@ class ThingSpeakTelemetryService(BaseTelemetryService):
     """
     BASE_URL = "https://api.thingspeak.com"
 
+    # Shared by every service instance so concurrent requests for the same
+    # channel + query (e.g. many dashboards on one tank) hit ThingSpeak once.
+    _flight = SingleFlight()
+
+    async def _get_feeds(self, channel_id: str, read_key: Optional[str], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        GET /channels/{id}/feeds.json, coalesced per (channel_id, query).
+        Returns the decoded body, or None on any error / non-200 response.
+        """
+        params = dict(params)
+        # Only add API key if it exists and is not empty
+        if read_key:
+            params["api_key"] = read_key
+        key = (str(channel_id), tuple(sorted(params.items())))
+        return await self._flight.do(key, lambda: self._request_feeds(channel_id, params))
+
+    async def _request_feeds(self, channel_id: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        url = f"{self.BASE_URL}/channels/{channel_id}/feeds.json"
+        logger.debug(f"Fetching ThingSpeak data: URL={url}, params={ {k: v for k, v in params.items() if k != 'api_key'} }")
+        body = {}
+
+        async def request():
+            response = await http_clients.get("thingspeak").get(url, params=params)
+            if response.status_code == 200:
+                # Decoded inside the guarded call, so a truncated or non-JSON body
+                # (e.g. a proxy's error page) counts as a breaker failure
+                body["data"] = response.json()
+                if not isinstance(body["data"], dict):
+                    raise ValueError(f"expected a JSON object, got {type(body['data']).__name__}")
+            return response
+
+        try:
+            # Rate budget per API key + circuit breaker per channel
+            response = await thingspeak_guard.call(channel_id, params.get("api_key"), request)
+        except ValueError as e:
+            logger.warning(f"⚠️ ThingSpeak sent a malformed body for channel {channel_id}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Error requesting ThingSpeak channel {channel_id}: {e}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"⚠️ ThingSpeak returned {response.status_code} for channel {channel_id}: {response.text}")
+            return None
+        data = body["data"]
+        if "end" not in params:
+            # Open-ended queries always include the channel's newest entry
+            channel_cache.put(channel_id, data.get("feeds", []))
+        return data
+
+    async def stream_feeds(self, channel_id: str, read_key: Optional[str], params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        GET /channels/{id}/feeds.json, yielding raw feeds as they are decoded
+        from the response body (see FeedStreamParser). Not coalesced or
+        cached: use it for long ranges where buffering the body is the problem.
+        Yields nothing if the request fails.
+        """
+        params = dict(params)
+        if read_key:
+            params["api_key"] = read_key
+        client = http_clients.get("thingspeak")
+        request = client.build_request("GET", f"{self.BASE_URL}/channels/{channel_id}/feeds.json", params=params)
+        try:
+            response = await thingspeak_guard.call(
+                channel_id,
+                read_key,
+                lambda: client.send(request, stream=True)
+            )
+        except Exception as e:
+            print(f"Error streaming ThingSpeak channel {channel_id}: {e}")
+            return
+        try:
+            if response.status_code != 200:
+                print(f"ThingSpeak returned {response.status_code} for channel {channel_id} (stream)")
+                return
+            parser = FeedStreamParser()
+            async for chunk in response.aiter_text():
+                for feed in parser.feed(chunk):
+                    yield feed
+            parser.close()
+        except (ValueError, httpx.HTTPError) as e:
+            print(f"ThingSpeak stream for channel {channel_id} ended early: {e}")
+        finally:
+            await response.aclose()
+
+    async def _latest_raw(self, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Newest raw feed for one channel config, from the channel cache when fresh."""
+        cached = channel_cache.latest(cfg.get("channel_id"))
+        if cached is not None:
+            return cached
+        data = await self._get_feeds(cfg.get("channel_id"), cfg.get("read_key"), {"results": 1})
+        if data is None:
+            # Upstream failing, throttled or circuit open: serve the last known value
+            return channel_cache.latest(cfg.get("channel_id"), max_age=float("inf"))
+        feeds = data.get("feeds", [])
+        return feeds[0] if feeds else None
+
     async def fetch_latest(self, node_id: str, config: Any) -> Dict[str, Any]:
         """
         Fetch latest reading from ThingSpeak Channel(s).
@@ -27,104 +131,103 @@ class ThingSpeakTelemetryService(BaseTelemetryService):
         if not configs:
             return {}
         
-        async with httpx.AsyncClient() as client:
-            try:
-                tasks = []
-                for cfg in configs:
-                    # Build URL properly for ThingSpeak API
-                    url = f"{self.BASE_URL}/channels/{cfg.get('channel_id')}/feeds.json"
-                    params = {"results": 1}
-                    
-                    # Only add API key if it exists and is not empty
-                    if cfg.get("read_key"):
-                        params["api_key"] = cfg.get("read_key")
-                    
-                    print(f"Fetching ThingSpeak data: URL={url}, params={params}")
-                    tasks.append(client.get(url, params=params, timeout=10.0))
-                
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            responses = await asyncio.gather(
+                *(self._latest_raw(cfg) for cfg in configs),
+                return_exceptions=True
+            )
+            
+            merged_raw = {}
+            for latest in responses:
+                if isinstance(latest, Exception):
+                    print(f"Exception in response: {latest}")
+                    continue
+                if not latest:
+                    continue
                 
-                merged_raw = {}
-                for resp in responses:
-                    if isinstance(resp, Exception):
-                        print(f"Exception in response: {resp}")
-                        continue
-                    
-                    print(f"Response status: {resp.status_code}")
-                    if resp.status_code != 200:
-                        print(f"Response body: {resp.text}")
-                        continue
-                    
-                    data = resp.json()
-                    print(f"Response data: {data}")
-                    feeds = data.get("feeds", [])
-                    if not feeds:
-                        print("No feeds in response")
-                        continue
-                    
-                    latest = feeds[0]
-                    print(f"Latest feed: {latest}")
-                    if not merged_raw:
-                        merged_raw = latest.copy()
-                    else:
-                        for k, v in latest.items():
-                            if k.startswith("field") and v is not None:
-                                if k not in merged_raw or merged_raw[k] in [None, "0", 0]:
-                                    merged_raw[k] = v
-
                 if not merged_raw:
-                    print("No merged data available")
-                    return {}
-
-                combined_mapping = {}
-                for cfg in configs:
-                    combined_mapping.update(cfg.get("field_mapping", {}))
+                    merged_raw = latest.copy()
+                else:
+                    for k, v in latest.items():
+                        if k.startswith("field") and v is not None:
+                            if k not in merged_raw or merged_raw[k] in [None, "0", 0]:
+                                merged_raw[k] = v
 
-                return self._normalize_reading(merged_raw, combined_mapping)
-            except Exception as e:
-                print(f"Error fetching ThingSpeak data for {node_id}: {e}")
+            if not merged_raw:
+                print("No merged data available")
                 return {}
 
+            combined_mapping = {}
+            for cfg in configs:
+                combined_mapping.update(cfg.get("field_mapping", {}))
+
+            return self._normalize_reading(merged_raw, combined_mapping)
+        except Exception as e:
+            print(f"Error fetching ThingSpeak data for {node_id}: {e}")
+            return {}
+
     async def fetch_history(self, node_id: str, config: Dict[str, Any], days: int = 1) -> List[Dict[str, Any]]:
         """
         Fetch historical data and apply mapping.
         """
+        columns = await self.fetch_history_columns(node_id, config, days)
+        return columns.to_records()
+
+    async def fetch_history_columns(self, node_id: str, config: Dict[str, Any], days: int = 1) -> FeedColumns:
+        """
+        Like fetch_history, but returns typed columns (see FeedColumns) so
+        callers that only aggregate never build per-reading dicts.
+        """
         channel_id = config.get("channel_id")
-        read_key = config.get("read_key")
         mapping = config.get("field_mapping", {})
             
         if not channel_id:
-            return []
-                
-        url = f"{self.BASE_URL}/channels/{channel_id}/feeds.json"
-        params = {"days": days}
+            return get_normalizer(mapping).columns([])
             
-        # Only add API key if it exists and is not empty
-        if read_key:
-            params["api_key"] = read_key
-            
-        print(f"Fetching ThingSpeak history: URL={url}, params={params}")
-            
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, params=params, timeout=10.0)
-                print(f"History response status: {response.status_code}")
-                    
-                if response.status_code != 200:
-                    print(f"History response body: {response.text}")
-                    return []
-                        
-                data = response.json()
-                print(f"History response data keys: {list(data.keys()) if data else 'None'}")
-                    
+        feeds = channel_cache.since(channel_id, days)
+        if feeds is None:
+            data = await self._get_feeds(channel_id, config.get("read_key"), {"days": days})
+            if data is None:
+                feeds = channel_cache.since(channel_id, days, max_age=float("inf")) or []
+            else:
                 feeds = data.get("feeds", [])
-                print(f"History feeds count: {len(feeds)}")
+        print(f"History feeds count: {len(feeds)}")
                     
-                return [self._normalize_reading(f, mapping) for f in feeds]
-            except Exception as e:
-                print(f"Error fetching ThingSpeak history for {node_id}: {e}")
-                return []
+        return get_normalizer(mapping).columns(feeds)
     
+    async def stream_history(
+        self,
+        node_id: str,
+        config: Dict[str, Any],
+        days: int = 1,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[FeedColumns]:
+        """
+        Historical data as a stream of normalized column batches, oldest
+        first, so consumers can aggregate or forward long ranges with bounded
+        memory. Served from the channel cache when it covers the window.
+        """
+        channel_id = config.get("channel_id")
+        normalizer = get_normalizer(config.get("field_mapping", {}))
+        batch_size = batch_size or settings.THINGSPEAK_STREAM_BATCH
+        if not channel_id:
+            return
+
+        cached = channel_cache.since(channel_id, days)
+        if cached is not None:
+            for i in range(0, len(cached), batch_size):
+                yield normalizer.columns(cached[i:i + batch_size])
+            return
+
+        batch = []
+        async for feed in self.stream_feeds(channel_id, config.get("read_key"), {"days": days}):
+            batch.append(feed)
+            if len(batch) >= batch_size:
+                yield normalizer.columns(batch)
+                batch = []
+        if batch:
+            yield normalizer.columns(batch)
+
     async def fetch_last_n(self, node_id: str, config: Dict[str, Any], count: int = 10) -> List[Dict[str, Any]]:
         """
         Fetch the last N readings from ThingSpeak.
@@ -132,44 +235,28 @@ class ThingSpeakTelemetryService(BaseTelemetryService):
             
         CRITICAL: For tanks, only field2 contains distance data.
         """
+        columns = await self.fetch_last_n_columns(node_id, config, count)
+        return columns.to_records()
+
+    async def fetch_last_n_columns(self, node_id: str, config: Dict[str, Any], count: int = 10) -> FeedColumns:
+        """Like fetch_last_n, but returns time-sorted typed columns (see FeedColumns)."""
         channel_id = config.get("channel_id")
-        read_key = config.get("read_key")
         mapping = config.get("field_mapping", {})
             
         if not channel_id:
-            return []
-                
-        url = f"{self.BASE_URL}/channels/{channel_id}/feeds.json"
-        params = {"results": count}
-            
-        if read_key:
-            params["api_key"] = read_key
-            
-        print(f"Fetching last {count} ThingSpeak readings: URL={url}")
+            return get_normalizer(mapping).columns([])
             
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, params=params, timeout=10.0)
-                    
-                if response.status_code != 200:
-                    print(f"Error response: {response.text}")
-                    return []
-                        
-                data = response.json()
+        feeds = channel_cache.last_n(channel_id, count)
+        if feeds is None:
+            data = await self._get_feeds(channel_id, config.get("read_key"), {"results": count})
+            if data is None:
+                feeds = channel_cache.last_n(channel_id, count, max_age=float("inf")) or []
+            else:
                 feeds = data.get("feeds", [])
-                    
-                print(f"Got {len(feeds)} feeds for last-{count} request")
-                    
-                # Normalize each feed and sort chronologically (oldest first for charts)
-                normalized = [self._normalize_reading(f, mapping) for f in feeds]
-                    
-                # Sort by timestamp (oldest first for proper chart display)
-                normalized.sort(key=lambda x: x.get("timestamp", ""))
-                    
-                return normalized
-            except Exception as e:
-                print(f"Error fetching last {count} readings for {node_id}: {e}")
-                return []
+        print(f"Got {len(feeds)} feeds for last-{count} request")
+                
+        # Normalize and sort chronologically (oldest first for charts)
+        return get_normalizer(mapping).columns(feeds).sort_by_time()
 
     def _normalize_reading(self, raw: Dict[str, Any], mapping: Dict[str, str]) -> Dict[str, Any]:
         """Convert ThingSpeak field1..N to named keys based on field_mapping.
@@ -179,40 +266,10 @@ class ThingSpeakTelemetryService(BaseTelemetryService):
         - field2 = Distance (ALWAYS use for tank level)
         
         The mapping should be: {"field2": "distance"}
+
+        Batches should go through get_normalizer(mapping) directly.
         """
-        normalized = {
-            "timestamp": raw.get("created_at"),
-            "entry_id": raw.get("entry_id")
-        }
-        
-        # Apply Mapping: e.g. {"field2": "distance"} -> normalized["distance"] = raw["field2"]
-        for ts_field, alias in mapping.items():
-            if ts_field in raw:
-                try:
-                    val = raw[ts_field]
-                    # Try to convert to float/int if numeric
-                    if val is not None and isinstance(val, str):
-                        if '.' in val: val = float(val)
-                        else: val = int(val)
-                    normalized[alias] = val
-                except ValueError:
-                    normalized[alias] = raw[ts_field]
-        
-        # ALWAYS include raw fields so frontend can access field2 directly as fallback
-        # This ensures tank level calculation works even if DB mapping is wrong
-        for i in range(1, 9):
-            key = f"field{i}"
-            if key in raw and raw[key] is not None:
-                try:
-                    val = raw[key]
-                    if isinstance(val, str):
-                        if '.' in val: val = float(val)
-                        else: val = int(val)
-                    normalized[key] = val
-                except ValueError:
-                    normalized[key] = raw[key]
-                    
-        return normalized
+        return get_normalizer(mapping).normalize([raw])[0]
 
     async def push_reading(self, device_id: str, data: Dict[str, Any]) -> bool:
         """Push a reading to the downstream storage (DB/TimeScale)."""
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+class RateLimitExceeded(Exception):
+    """No request token became available within the allowed wait."""
+
+class CircuitOpenError(Exception):
+    """The channel's circuit breaker is open; the upstream call was not attempted."""
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    Callers reserve a token up front (the balance may go negative) and sleep
+    until it matures, so concurrent waiters are served in arrival order.
+    """
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token; return the seconds to wait for it, or None if that exceeds max_wait."""
+        self._refill()
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    async def acquire(self, max_wait: float) -> bool:
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open once `reset_timeout` seconds have passed, letting one
+    trial call through; the trial's outcome closes or re-opens the circuit.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """Give back a half-open trial slot that was never used."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+
+class UpstreamGuard:
+    """
+    Gate for every outbound ThingSpeak request: a token bucket per API key
+    (keyless/public reads share one bucket) and a circuit breaker per channel.
+    Timeouts, transport errors, 429s and 5xx responses count as failures, as
+    does anything else the request function raises (e.g. an undecodable body).
+    """
+    ANONYMOUS = "__anonymous__"
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"rate_limited": 0, "short_circuited": 0}
+
+    def bucket(self, api_key: Optional[str]) -> TokenBucket:
+        key = api_key or self.ANONYMOUS
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(settings.THINGSPEAK_RATE_PER_KEY, settings.THINGSPEAK_RATE_BURST)
+        return self._buckets[key]
+
+    def breaker(self, channel_id: str) -> CircuitBreaker:
+        channel_id = str(channel_id)
+        if channel_id not in self._breakers:
+            self._breakers[channel_id] = CircuitBreaker(
+                settings.THINGSPEAK_BREAKER_THRESHOLD, settings.THINGSPEAK_BREAKER_RESET
+            )
+        return self._breakers[channel_id]
+
+    async def call(
+        self,
+        channel_id: str,
+        api_key: Optional[str],
+        fn: Callable[[], Awaitable[Any]],
+        max_wait: Optional[float] = None
+    ) -> Any:
+        """Run fn() (an httpx request) if the breaker and the key's rate budget allow it."""
+        breaker = self.breaker(channel_id)
+        if not breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise CircuitOpenError(f"Circuit open for ThingSpeak channel {channel_id}")
+
+        max_wait = settings.THINGSPEAK_RATE_MAX_WAIT if max_wait is None else max_wait
+        settled = False
+        try:
+            if not await self.bucket(api_key).acquire(max_wait):
+                self.stats["rate_limited"] += 1
+                raise RateLimitExceeded(f"ThingSpeak request budget exhausted for channel {channel_id}")
+            try:
+                response = await fn()
+            except Exception:
+                breaker.record_failure()
+                settled = True
+                raise
+            if response.status_code == 429 or response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            settled = True
+            return response
+        finally:
+            if not settled:
+                # Rate limited, or cancelled mid-wait/mid-request (client gone, pipeline stop,
+                # wait_for): no verdict, so a half-open trial slot goes back
+                breaker.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "open_circuits": sorted(c for c, b in self._breakers.items() if b.state != CircuitBreaker.CLOSED),
+            "api_keys": len(self._buckets),
+            **self.stats
+        }
+
+thingspeak_guard = UpstreamGuard()
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from app.core.config import get_settings
+from app.db.repository import insert_ignore, insert_merge
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import NodeReading
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Models whose rows are merged into, rather than skipped by, a row already
+# holding their unique key: a node's channels can report the same instant,
+# each with its own fields.
+MERGE_KEYS: Dict[Type, Tuple[str, ...]] = {NodeReading: ("node_id", "timestamp")}
+
+def _merge_duplicates(rows: List[Dict[str, Any]], key: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Collapse rows sharing `key` within one batch the way insert_merge would (first value wins)."""
+    merged: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for row in rows:
+        ident = tuple(row[col] for col in key)
+        current = merged.get(ident)
+        if current is None:
+            merged[ident] = dict(row)
+            continue
+        for col, value in row.items():
+            if current.get(col) is None:
+                current[col] = value
+            elif isinstance(current[col], dict) and isinstance(value, dict):
+                current[col] = {**value, **current[col]}
+    return list(merged.values())
+
+class WriteTicket:
+    """Rows enqueued together, and what to run once every one of them is committed."""
+    __slots__ = ("remaining", "failed", "on_written")
+
+    def __init__(self, count: int, on_written: Callable[[], Awaitable[Any]]):
+        self.remaining = count
+        self.failed = False
+        self.on_written = on_written
+
+class TelemetryWriter:
+    """
+    Batched DB writer stage for high-frequency telemetry.
+
+    Producers enqueue (model, row) pairs; a single consumer drains the queue
+    and flushes one multi-row INSERT per model whenever WRITE_BATCH_SIZE rows
+    are pending or the oldest pending row is WRITE_FLUSH_INTERVAL seconds old.
+    Inserts are idempotent: rows that hit a unique key (e.g. a reading already
+    stored by an overlapping poll or backfill) are skipped, not errors; for
+    models in MERGE_KEYS they only fill in the values the stored row lacks.
+    The queue is bounded, so producers are slowed down (backpressure) instead
+    of the DB being overwhelmed. A producer that must not move on until its
+    rows are durable (e.g. a poll watermark) passes `on_written`, which runs
+    only after every row of its group was committed, and never if one failed.
+    On shutdown, drain() stops the consumer and flushes everything it had
+    taken off the queue but not written yet, then the rest of the queue.
+    """
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        session_factory=None
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize or settings.WRITE_QUEUE_MAXSIZE)
+        self.batch_size = batch_size or settings.WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.WRITE_FLUSH_INTERVAL
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.stats: Dict[str, Any] = {
+            "rows_written": 0,
+            "rows_failed": 0,
+            "flushes": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None
+        }
+        self._task: Optional[asyncio.Task] = None # the run() consumer
+        self._pending: List[Tuple[Type, Dict[str, Any], Optional[WriteTicket]]] = [] # taken off the queue, not written
+        self._writing: Optional[asyncio.Future] = None
+
+    async def enqueue(self, model: Type, row: Dict[str, Any]):
+        """Queue one row; waits while the queue is full."""
+        await self.queue.put((model, row, None))
+
+    async def enqueue_many(
+        self,
+        model: Type,
+        rows: List[Dict[str, Any]],
+        on_written: Optional[Callable[[], Awaitable[Any]]] = None
+    ):
+        """Queue rows; `on_written` is awaited once all of them are committed."""
+        if not rows:
+            if on_written:
+                await on_written()
+            return
+        ticket = WriteTicket(len(rows), on_written) if on_written else None
+        for row in rows:
+            await self.queue.put((model, row, ticket))
+
+    async def _next_batch(self):
+        """
+        Block for the first item, then collect until the size or time threshold
+        is hit. Items are collected into self._pending, so a cancel loses none.
+        """
+        self._pending.append(await self.queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def flush(self, batch: List[Tuple[Type, Dict[str, Any]]]) -> bool:
+        """Write a batch with one multi-row INSERT-or-ignore (or merge) per model, in a single transaction. False if it failed."""
+        grouped: Dict[Type, List[Dict[str, Any]]] = defaultdict(list)
+        for model, row in batch:
+            grouped[model].append(row)
+
+        started = time.monotonic()
+        try:
+            async with self.session_factory() as session:
+                dialect = session.bind.dialect.name
+                for model, rows in grouped.items():
+                    key = MERGE_KEYS.get(model)
+                    if key:
+                        # Postgres refuses to update one row twice in a statement
+                        await session.execute(insert_merge(model, dialect, list(key)), _merge_duplicates(rows, key))
+                    else:
+                        await session.execute(insert_ignore(model, dialect), rows)
+                await session.commit()
+        except Exception as e:
+            self.stats["rows_failed"] += len(batch)
+            logger.error(f"❌ Error flushing {len(batch)} telemetry rows: {e}")
+            return False
+
+        elapsed_ms = round((time.monotonic() - started) * 1000, 2)
+        self.stats["rows_written"] += len(batch)
+        self.stats["flushes"] += 1
+        self.stats["last_flush_rows"] = len(batch)
+        self.stats["last_flush_ms"] = elapsed_ms
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"] or 0, elapsed_ms)
+        return True
+
+    async def _write(self, batch: List[Tuple[Type, Dict[str, Any], Optional[WriteTicket]]]):
+        """Flush queued items, then settle their tickets."""
+        try:
+            written = await self.flush([(model, row) for model, row, _ in batch])
+            for _, _, ticket in batch:
+                if ticket is None or ticket.failed:
+                    continue
+                if not written:
+                    # The group's rows are not all stored: its producer must not move past them
+                    ticket.failed = True
+                    continue
+                ticket.remaining -= 1
+                if ticket.remaining == 0:
+                    try:
+                        await ticket.on_written()
+                    except Exception as e:
+                        logger.error(f"❌ Error in post-write callback: {e}")
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    async def run(self):
+        """Consume the queue until cancelled or drained."""
+        self._task = asyncio.current_task()
+        while True:
+            await self._next_batch()
+            batch, self._pending = self._pending, []
+            # Cancelling run() must not cut a write short (its tickets would be half
+            # settled); drain() waits for it instead
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def drain(self):
+        """
+        Flush everything not written yet (on shutdown). Stops run() first if it
+        is still consuming, lets a write in progress finish, then flushes the
+        batch run() was collecting and whatever is still queued.
+        """
+        task = self._task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+        if self._writing is not None:
+            await asyncio.wait([self._writing])
+        pending, self._pending = self._pending, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for i in range(0, len(pending), self.batch_size):
+            await self._write(pending[i:i + self.batch_size])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            **self.stats
+        }
+
+telemetry_writer = TelemetryWriter()
@@ -1,22 +1,77 @@
+import math
 import uuid
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import all_models as models
 from app.db.repository import NodeRepository
+from app.services.telemetry.normalize import RAW_FIELDS
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """ISO timestamp (e.g. ThingSpeak "2023-10-27T10:00:00Z") -> naive UTC datetime."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - (dt.utcoffset() or timedelta(0))
+    return dt
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
 
 class TelemetryProcessor:
     """
-    Core pipeline service for processing incoming raw telemetry.
-    Handles storage, validation, and triggers alerts (future).
+    Entry point for already-normalized telemetry (push, MQTT).
+    Hands readings to the staged ingest pipeline for validation, storage and alerts.
     """
     def __init__(self, db: AsyncSession):
         self.db = db
         self.repo = NodeRepository(db)
 
-    async def process_readings(self, node_id: str, readings: List[Dict[str, Any]]):
+    @staticmethod
+    def build_reading_rows(node_id: str, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Turn normalized readings into NodeReading rows for the batched writer.
+        fieldN values go to their typed columns; mapped names are not stored
+        since they repeat a field's value. Integer readings stay ints (the
+        column stores them as floats; the ring buffer flags them as integers).
+        Non-numeric field values (which have no column) are kept in `data`.
+        """
+        rows = []
+        for raw in readings:
+            ts_str = raw.get("timestamp")
+            if not ts_str:
+                continue
+            ts = parse_timestamp(ts_str) or datetime.utcnow()
+            row = {
+                "id": str(uuid.uuid4()),
+                "node_id": node_id,
+                "timestamp": ts,
+                "entry_id": raw.get("entry_id"),
+                "data": None
+            }
+            for field in RAW_FIELDS:
+                value = raw.get(field)
+                number = _as_float(value)
+                row[field] = value if number is not None and type(value) is int else number
+                if number is None and value is not None:
+                    row["data"] = {**(row["data"] or {}), field: value}
+            rows.append(row)
+        return rows
+
+    async def process_readings(self, node_id: str, readings: List[Dict[str, Any]], source: str = "push"):
         """
         Ingest a batch of normalized readings.
+        The batch is handed to the ingest pipeline (validate -> store -> alerts
+        -> publish); this returns once it is queued, not once it is stored.
         """
         if not readings:
             return
@@ -27,42 +82,8 @@ class TelemetryProcessor:
             print(f"Node {node_id} not found during processing.")
             return
 
-        for raw in readings:
-            # 1. Normalize
-            # Assuming raw has 'timestamp' and fields
-            ts_str = raw.get("timestamp")
-            if not ts_str:
-                continue
-                
-            # Parse timestamp (ThingSpeak ISO format)
-            try:
-                # "2023-10-27T10:00:00Z" -> datetime
-                ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-            except ValueError:
-                ts = datetime.utcnow()
+        from app.services.telemetry.pipeline import IngestBatch
+        from app.services.telemetry.stages import ingest_pipeline
 
-            # 2. Store to DB (NodeReading)
-            # Check for duplicates? For now, we rely on timestamp/ID uniqueness or just append
-            # To avoid massive duplicates during polling, we should check max timestamp in DB first.
-            # Skipped for MVP performance, assuming polling interval > data rate
-            
-            reading_entry = models.NodeReading(
-                id=str(uuid.uuid4()),
-                node_id=node_id,
-                timestamp=ts,
-                data=raw # Store full raw payload as JSON
-            )
-            self.db.add(reading_entry)
-            
-            # 3. Update Node Status/Last Contact
-            # node.last_seen = ts ... (if we added that field)
-            
-        await self.db.commit()
-        
-        # 4. Trigger Alerts
-        from app.services.alert_engine import AlertEngine
-        alert_engine = AlertEngine(self.db)
-        
-        # Check alerts for the last reading in the batch (most recent state)
-        if readings:
-            await alert_engine.check_rules(node_id, readings[-1])
+        # Blocks if the validate stage is full (backpressure)
+        await ingest_pipeline.submit(IngestBatch(node_id, source, readings=readings, analytics_type=node.analytics_type), stage="validate")
@@ -1,5 +1,6 @@
-import httpx
 from typing import Optional
+from app.core.http import http_clients
+from app.services.telemetry.throttle import thingspeak_guard
 
 class TelemetryService:
     @staticmethod
@@ -17,14 +18,17 @@ class TelemetryService:
         # We only need the latest 1 result to verify access
         params["results"] = 1
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, params=params)
-                # Success if status is 200
-                return response.status_code == 200
-            except Exception as e:
-                print(f"ThingSpeak Handshake Error: {str(e)}")
-                return False
+        try:
+            response = await thingspeak_guard.call(
+                channel_id,
+                read_api_key,
+                lambda: http_clients.get("thingspeak").get(url, params=params)
+            )
+            # Success if status is 200
+            return response.status_code == 200
+        except Exception as e:
+            print(f"ThingSpeak Handshake Error: {str(e)}")
+            return False
 
     @staticmethod
     def validate_coordinates(lat: float, lng: float) -> bool:
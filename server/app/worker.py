@@ -0,0 +1,72 @@
+"""
+Standalone ingest worker: ThingSpeak polling, MQTT subscription, alert
+evaluation, cleanup, latest-state and rollup upserts and batched DB writes,
+without serving HTTP.
+
+    python -m app.worker
+
+Run it next to API processes started with RUN_BACKGROUND_TASKS=false so a
+slow sweep never shares an event loop with user-facing requests. Several
+workers may run at once; leader election keeps the singleton loops unique.
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.background import process_write_queue, start_singleton_tasks
+from app.core.http import http_clients
+from app.core.leader import leader
+from app.core.logging import setup_logging
+from app.db.session import create_tables
+from app.services.telemetry.latest import latest_state
+from app.services.telemetry.rollup import rollups
+from app.services.telemetry.stages import ingest_pipeline
+from app.services.telemetry.writer import telemetry_writer
+
+logger = logging.getLogger("evara_backend")
+
+async def run_worker():
+    await http_clients.startup()
+    await create_tables()
+
+    ingest_pipeline.start()
+    writer_task = asyncio.create_task(process_write_queue())
+    state_task = asyncio.create_task(latest_state.run())
+    rollup_task = asyncio.create_task(rollups.run())
+    campaign = asyncio.create_task(leader.run(start_singleton_tasks))
+    logger.info("Ingest worker started.")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError: # Windows
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Ingest worker stopping...")
+        campaign.cancel()
+        await leader.shutdown()
+        await ingest_pipeline.stop()
+        writer_task.cancel()
+        state_task.cancel()
+        rollup_task.cancel()
+        await asyncio.gather(campaign, writer_task, state_task, rollup_task, return_exceptions=True)
+        await telemetry_writer.drain()
+        await latest_state.flush()
+        await rollups.flush()
+        await http_clients.shutdown()
+        logger.info("Ingest worker stopped.")
+
+def main():
+    setup_logging()
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
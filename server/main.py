@@ -6,6 +6,12 @@ from app.api.api_v1.api import api_router
 from app.core.logging import setup_logging
 from app.db.session import create_tables
 from app.core.background import start_background_tasks
+from app.core.http import http_clients
+from app.core.leader import leader
+from app.services.telemetry.latest import latest_state
+from app.services.telemetry.rollup import rollups
+from app.services.telemetry.stages import ingest_pipeline
+from app.services.telemetry.writer import telemetry_writer
 from app.services.seeder import seed_db
 from app.core.security_supabase import get_current_user_token
 
@@ -85,14 +91,29 @@ logger = setup_logging()
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting EvaraTech Backend...")
+    # Shared outbound HTTP pools (ThingSpeak, Supabase, ...)
+    await http_clients.startup()
     # Initialize database tables
     await create_tables()
     # Auto-seed if database is new/empty
     # await seed_db()
-    await start_background_tasks()
-    logger.info("Background tasks started.")
+    await start_background_tasks(singletons=settings.RUN_BACKGROUND_TASKS)
+    if settings.RUN_BACKGROUND_TASKS:
+        logger.info("Background tasks started.")
+    else:
+        logger.info("Background loops disabled; run `python -m app.worker` for ingestion.")
     logger.info("Application startup complete.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await leader.shutdown()
+    await ingest_pipeline.stop()
+    await telemetry_writer.drain()
+    await latest_state.flush()
+    await rollups.flush()
+    await http_clients.shutdown()
+    logger.info("HTTP client pools closed.")
+
 @app.get("/health")
 async def health_check():
     from sqlalchemy import text
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import func, null, select
+from app.db.repository import insert_ignore
+from app.models.all_models import NodeAnalytics, NodeReading
+from app.services.telemetry import archive as archive_module
+from app.services.telemetry.archive import (
+    ColdArchive, decode_floats, decode_month, decode_timestamps, encode_floats, encode_month, encode_timestamps
+)
+from app.services.telemetry_processor import TelemetryProcessor
+
+def _rows(node_id, start, count, step=timedelta(minutes=1)):
+    readings = [
+        {"timestamp": (start + i * step).isoformat() + "Z", "entry_id": i + 1, "field1": 20.0 + (i % 5) * 0.5, "field2": 100.0 - i * 0.01}
+        for i in range(count)
+    ]
+    return TelemetryProcessor.build_reading_rows(node_id, readings)
+
+def test_codecs_round_trip():
+    ms = np.array([1000, 61000, 121000, 181500, 181500], dtype=np.int64)
+    assert decode_timestamps(encode_timestamps(ms)).tolist() == ms.tolist()
+
+    values = np.array([1.5, 1.5, np.nan, -2.25, 1e300])
+    decoded = decode_floats(encode_floats(values))
+    assert np.array_equal(decoded, values, equal_nan=True)
+
+def test_month_encoding_is_compact_and_lossless():
+    rows = _rows("n1", datetime(2024, 1, 1), 10_000)
+    rows[3]["data"] = {"field3": "OK"}
+    rows[4]["entry_id"] = None
+    payload = encode_month(rows)
+    # Two float fields + time + entry_id; a table row costs well over 100 bytes
+    assert len(payload) / len(rows) < 10
+
+    decoded = decode_month("n1", payload)
+    assert [r.timestamp for r in decoded] == [r["timestamp"] for r in rows]
+    assert [r.field2 for r in decoded] == [r["field2"] for r in rows]
+    assert decoded[3].data == {"field3": "OK"} and decoded[4].entry_id is None
+    assert decoded[5].entry_id == 6 and decoded[0].field3 is None
+
+@pytest.mark.asyncio
+async def test_archive_moves_whole_old_months_and_reads_back(session_factory, tmp_path):
+    archive = ColdArchive(root=str(tmp_path / "archive"), session_factory=session_factory, shared=True)
+    rows = _rows("n1", datetime(2024, 1, 30), 5, step=timedelta(days=1)) # Jan 30 .. Feb 3
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), rows)
+        session.add(NodeAnalytics(
+            id="legacy", node_id="n1", period_type="daily", period_start=datetime(2024, 1, 15),
+            analytics_metadata={"raw_feed": {"created_at": "2024-01-15T08:00:00Z", "entry_id": 99, "field2": "55.5"}}
+        ))
+        await session.commit()
+
+    result = await archive.archive_before(datetime(2024, 2, 20))
+    # January only: February isn't complete before the cutoff
+    assert (result["rows"], result["months"], result["legacy_feeds_cleared"]) == (3, 1, 1)
+    assert archive.months("n1") == [datetime(2024, 1, 1)]
+
+    async with session_factory() as session:
+        hot = (await session.execute(select(func.count()).select_from(NodeReading))).scalar()
+        metadata = (await session.execute(select(NodeAnalytics.analytics_metadata))).scalar()
+    assert hot == 3 # Feb 1..3
+    assert metadata is None
+
+    january = archive.read_range("n1", datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert [r.timestamp.day for r in january[0]] == [15, 30, 31] # legacy feed folded in
+    assert january[0][0].field2 == 55.5
+    assert archive.has_range("n1", datetime(2024, 1, 20)) and not archive.has_range("n1", datetime(2024, 2, 1))
+
+    # Cleared metadata is SQL NULL, so the next run has nothing left to fold or archive
+    again = await archive.archive_before(datetime(2024, 2, 20))
+    assert (again["rows"], again["months"], again["legacy_feeds_cleared"]) == (0, 0, 0)
+
+    assert archive.expire("n1", datetime(2024, 2, 1)) == 1
+    assert archive.months("n1") == []
+
+@pytest.mark.asyncio
+async def test_archive_keeps_rows_unless_storage_is_shared(session_factory, tmp_path):
+    archive = ColdArchive(root=str(tmp_path / "archive"), session_factory=session_factory, shared=False)
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), _rows("n1", datetime(2024, 1, 10), 3))
+        await session.commit()
+
+    result = await archive.archive_before(datetime(2024, 3, 1))
+    assert (result["rows"], result["months"]) == (0, 0) and result["skipped"]
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count()).select_from(NodeReading))).scalar() == 3
+    assert archive.months("n1") == []
+
+@pytest.mark.asyncio
+async def test_legacy_feeds_fold_in_batches(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, "FOLD_BATCH", 3)
+    archive = ColdArchive(root=str(tmp_path / "archive"), session_factory=session_factory, shared=True)
+    async with session_factory() as session:
+        for i in range(7):
+            session.add(NodeAnalytics(
+                id=f"legacy-{i}", node_id="n1", period_type="daily", period_start=datetime(2024, 1, 1 + i),
+                analytics_metadata={"raw_feed": {"created_at": f"2024-01-0{1 + i}T08:00:00Z", "entry_id": i, "field2": "1.5"}}
+            ))
+        await session.commit()
+
+    result = await archive.archive_before(datetime(2024, 2, 20))
+    assert (result["rows"], result["legacy_feeds_cleared"]) == (7, 7)
+    async with session_factory() as session:
+        left = (await session.execute(
+            select(func.count()).select_from(NodeAnalytics).where(NodeAnalytics.analytics_metadata.isnot(null()))
+        )).scalar()
+    assert left == 0
+
+@pytest.mark.asyncio
+async def test_stream_serves_a_month_in_both_places_once(session_factory, tmp_path, monkeypatch):
+    archive = ColdArchive(root=str(tmp_path / "archive"), session_factory=session_factory, shared=True)
+    monkeypatch.setattr(archive_module, "cold_archive", archive)
+    rows = _rows("n1", datetime(2024, 1, 31, 23, 58), 4) # Jan 31 23:58 .. Feb 1 00:01
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), rows)
+        await session.commit()
+    # Archive run interrupted after writing January's file, before deleting its rows
+    archive.write_month("n1", datetime(2024, 1, 1), [
+        {c: r.get(c) for c in archive_module.ArchivedReading.__slots__} for r in rows[:2]
+    ])
+
+    async with session_factory() as session:
+        streamed = [r.timestamp async for batch in archive_module.stream_readings(session, "n1") for r in batch]
+    assert streamed == [r["timestamp"] for r in rows]
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from app.core.leader import FileLockBackend
+from app.models.all_models import DeviceThingSpeakMapping, NodeReading
+from app.services.telemetry import backfill as backfill_module
+from app.services.telemetry.backfill import BackfillError, ThingSpeakBackfill
+from app.services.telemetry.poller import ThingSpeakPoller
+from app.services.telemetry.writer import TelemetryWriter
+
+CREATED = datetime(2024, 1, 1)
+# One entry every 10 minutes for 10 days
+ENTRIES = [
+    {"created_at": (CREATED + timedelta(minutes=10 * i)).isoformat() + "Z", "entry_id": i + 1, "field1": str(i % 7)}
+    for i in range(1440)
+]
+
+@pytest_asyncio.fixture
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        session.add(DeviceThingSpeakMapping(id="m1", device_id="n1", channel_id="bf-1", field_mapping={}))
+        await session.commit()
+    return session_factory
+
+@pytest.fixture(autouse=True)
+def fast_upstream(monkeypatch):
+    monkeypatch.setattr(ThingSpeakPoller, "MAX_RESULTS", 500)
+    monkeypatch.setattr(backfill_module.settings, "BACKFILL_MAX_RETRIES", 0)
+    monkeypatch.setattr(backfill_module.settings, "THINGSPEAK_RATE_PER_KEY", 1000.0)
+
+def _handler(calls, fail_after=None):
+    def handler(request):
+        calls.append(dict(request.url.params))
+        if fail_after is not None and len(calls) > fail_after:
+            return httpx.Response(404)
+        params = request.url.params
+        if "start" not in params:
+            return httpx.Response(200, json={"channel": {"created_at": "2024-01-01T00:00:00Z"}, "feeds": []})
+        start = datetime.strptime(params["start"], "%Y-%m-%d %H:%M:%S")
+        end = datetime.strptime(params["end"], "%Y-%m-%d %H:%M:%S")
+        feeds = [f for f in ENTRIES if start <= datetime.fromisoformat(f["created_at"][:-1]) <= end]
+        # Like ThingSpeak: only the newest `results` entries of the range
+        return httpx.Response(200, json={"feeds": feeds[-int(params["results"]):]})
+    return handler
+
+def _target(backfilled_until=None):
+    return {
+        "node_id": "n1",
+        "analytics_type": "EvaraFlow",
+        "mapping_id": "m1",
+        "channel_id": "bf-1",
+        "read_key": None,
+        "field_mapping": {},
+        "backfilled_until": backfilled_until
+    }
+
+async def _stored(session_factory):
+    async with session_factory() as session:
+        count = (await session.execute(select(func.count()).select_from(NodeReading))).scalar()
+        checkpoint = (await session.execute(select(DeviceThingSpeakMapping.backfilled_until))).scalar()
+    return count, checkpoint
+
+@pytest.mark.asyncio
+async def test_backfill_pages_whole_history_and_checkpoints(session_factory):
+    calls = []
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_handler(calls))) as client:
+        job = ThingSpeakBackfill(
+            window=timedelta(days=7),
+            session_factory=session_factory,
+            writer=TelemetryWriter(session_factory=session_factory, batch_size=200),
+            client=client
+        )
+        progress = await job.backfill_target(_target())
+
+    count, checkpoint = await _stored(session_factory)
+    assert count == len(ENTRIES) # truncated pages were re-fetched with smaller windows
+    assert progress["state"] == "done" and progress["rows"] >= len(ENTRIES)
+    assert checkpoint >= CREATED + timedelta(minutes=10 * (len(ENTRIES) - 1))
+    assert all(int(c.get("results", 0)) <= 500 for c in calls)
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint(session_factory):
+    calls = []
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_handler(calls, fail_after=4))) as client:
+        job = ThingSpeakBackfill(
+            window=timedelta(days=1),
+            session_factory=session_factory,
+            writer=TelemetryWriter(session_factory=session_factory, batch_size=200),
+            client=client
+        )
+        with pytest.raises(BackfillError):
+            await job.backfill_target(_target())
+
+    partial, checkpoint = await _stored(session_factory)
+    assert 0 < partial < len(ENTRIES)
+    assert checkpoint == CREATED + timedelta(days=3) # three pages done before the failure
+
+    calls = []
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_handler(calls))) as client:
+        job.client = client
+        await job.backfill_target(_target(backfilled_until=checkpoint))
+
+    count, _ = await _stored(session_factory)
+    assert count == len(ENTRIES)
+    assert datetime.strptime(calls[0]["start"], "%Y-%m-%d %H:%M:%S") == checkpoint
+
+@pytest.mark.asyncio
+async def test_page_over_the_cap_at_min_window_is_stored_and_reported(session_factory, monkeypatch):
+    monkeypatch.setattr(ThingSpeakPoller, "MAX_RESULTS", 2)
+    # Three entries in one second: no window can get under the cap
+    burst = [{"created_at": "2024-01-01T00:00:30Z", "entry_id": i, "field1": str(i)} for i in (1, 2, 3)]
+
+    def handler(request):
+        return httpx.Response(200, json={"feeds": burst[-int(request.url.params["results"]):]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        job = ThingSpeakBackfill(
+            window=timedelta(minutes=4),
+            session_factory=session_factory,
+            writer=TelemetryWriter(session_factory=session_factory, batch_size=200),
+            client=client
+        )
+        target = {**_target(backfilled_until=CREATED), "last_sync_time": CREATED + timedelta(minutes=1)}
+        progress = await job.backfill_target(target)
+
+    count, checkpoint = await _stored(session_factory)
+    assert progress["state"] == "done" and progress["truncated"] == 1
+    assert count == 1 # one timestamp; the newest entry of the burst was kept
+    assert checkpoint == CREATED + timedelta(minutes=1)
+
+@pytest.mark.asyncio
+async def test_only_one_backfill_runs_at_a_time(session_factory, tmp_path):
+    path = str(tmp_path / "backfill.lock")
+    # Two jobs with their own lock handles, as in two worker processes
+    first = ThingSpeakBackfill(session_factory=session_factory, lock=FileLockBackend(path))
+    second = ThingSpeakBackfill(session_factory=session_factory, lock=FileLockBackend(path))
+
+    assert await first.lock.acquire()
+    assert not await second.start()
+    with pytest.raises(BackfillError):
+        await second.run()
+    await first.lock.release()
+    assert await second.start()
+    await second._task
+    assert not second.running and second.status["targets"] == {} # no Node row, so no targets
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from app.services.telemetry.cache import ChannelCache
+
+def _feed(entry_id, minutes_ago=0):
+    ts = datetime.utcnow() - timedelta(minutes=minutes_ago)
+    return {"entry_id": entry_id, "created_at": ts.strftime("%Y-%m-%dT%H:%M:%SZ"), "field2": str(entry_id)}
+
+def test_latest_is_served_while_fresh():
+    cache = ChannelCache(max_entries=100, ttl=30)
+    cache.put("1", [_feed(1), _feed(2)])
+    assert cache.latest("1")["entry_id"] == 2
+    assert cache.latest("1", max_age=-1) is None
+    assert cache.latest("unknown") is None
+
+def test_incremental_puts_merge_into_tail():
+    cache = ChannelCache(max_entries=100, ttl=30)
+    cache.put("1", [_feed(i) for i in range(1, 6)])
+    cache.put("1", [_feed(6), _feed(7)])
+    assert [f["entry_id"] for f in cache.last_n("1", 3)] == [5, 6, 7]
+
+def test_last_n_requires_gap_free_tail():
+    cache = ChannelCache(max_entries=100, ttl=30)
+    cache.put("1", [_feed(1), _feed(2)])
+    cache.put("1", [_feed(10)])
+    assert cache.last_n("1", 1) == [cache.latest("1")]
+    assert cache.last_n("1", 2) is None
+
+def test_trims_to_max_entries():
+    cache = ChannelCache(max_entries=5, ttl=30)
+    cache.put("1", [_feed(i) for i in range(1, 20)])
+    assert cache.snapshot()["entries"] == 5
+    assert cache.last_n("1", 6) is None
+
+def test_since_needs_tail_reaching_window_start():
+    cache = ChannelCache(max_entries=100, ttl=30)
+    cache.put("1", [_feed(1, minutes_ago=120), _feed(2, minutes_ago=60), _feed(3)])
+    window = cache.since("1", days=1 / 24 * 1.5)
+    assert [f["entry_id"] for f in window] == [2, 3]
+    assert cache.since("1", days=1) is None
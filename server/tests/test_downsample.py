@@ -0,0 +1,47 @@
+import numpy as np
+from app.services.telemetry.downsample import lttb_indices
+from app.services.telemetry.normalize import get_normalizer
+
+def _feeds(values):
+    return [
+        {"created_at": f"2024-01-01T{i // 60:02d}:{i % 60:02d}:00Z", "entry_id": i + 1, "field2": None if v is None else str(v)}
+        for i, v in enumerate(values)
+    ]
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[437] = 25.0 # a spike the chart must still show
+
+    picked = lttb_indices(x, y, 100)
+    assert len(picked) == 100
+    assert picked[0] == 0 and picked[-1] == 999
+    assert np.all(np.diff(picked) > 0)
+    assert 437 in picked
+
+def test_lttb_returns_everything_when_already_small():
+    x = np.arange(10, dtype=np.float64)
+    assert lttb_indices(x, x, 50).tolist() == list(range(10))
+
+def test_downsample_feed_columns_on_mapped_field():
+    values = [float(i % 17) for i in range(600)]
+    values[5] = None # missing readings can't be plotted and are dropped
+    columns = get_normalizer({"field2": "distance"}).columns(_feeds(values))
+
+    records = columns.downsample(50, "distance").to_records()
+    assert len(records) == 50
+    assert records[0]["entry_id"] == 1 and records[-1]["entry_id"] == 600
+    assert all(r["distance"] is not None for r in records)
+    assert [r["timestamp"] for r in records] == sorted(r["timestamp"] for r in records)
+
+def test_downsample_without_values_spaces_evenly():
+    columns = get_normalizer({}).columns(_feeds([None] * 100))
+    records = columns.downsample(10, "field2").to_records()
+    assert [r["entry_id"] for r in records] == [1, 12, 23, 34, 45, 56, 67, 78, 89, 100]
+
+def test_epoch_seconds_handles_missing_timestamps():
+    feeds = _feeds([1, 2])
+    feeds[1]["created_at"] = None
+    seconds = get_normalizer({}).columns(feeds).epoch_seconds()
+    assert seconds[0] == 1704067200.0
+    assert np.isnan(seconds[1])
@@ -0,0 +1,59 @@
+import json
+
+import httpx
+import pytest
+
+from app.core.http import http_clients
+from app.services.telemetry.stream import FeedStreamParser
+from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
+
+FEEDS = [
+    {"created_at": f"2026-01-01T00:{i:02d}:00Z", "entry_id": i, "field1": f"{i}.5", "field2": None}
+    for i in range(1, 40)
+]
+BODY = json.dumps({"channel": {"id": 1, "name": "feeds [tank]"}, "feeds": FEEDS}, indent=1)
+
+def _parse_in_chunks(body: str, size: int):
+    parser = FeedStreamParser()
+    out = []
+    for i in range(0, len(body), size):
+        out.extend(parser.feed(body[i:i + size]))
+    parser.close()
+    return out
+
+@pytest.mark.parametrize("size", [1, 7, 64, 100000])
+def test_parser_yields_every_feed_whatever_the_chunking(size):
+    assert _parse_in_chunks(BODY, size) == FEEDS
+
+def test_parser_handles_empty_and_missing_feeds():
+    assert _parse_in_chunks('{"channel": {}, "feeds": []}', 3) == []
+    assert _parse_in_chunks("-1", 3) == []
+
+def test_parser_rejects_truncated_body():
+    parser = FeedStreamParser()
+    parser.feed(BODY[: len(BODY) // 2])
+    with pytest.raises(ValueError):
+        parser.close()
+
+@pytest.mark.asyncio
+async def test_stream_history_batches_normalized_columns(monkeypatch):
+    async def body():
+        data = BODY.encode()
+        for i in range(0, len(data), 50):
+            yield data[i:i + 50]
+
+    def handler(request):
+        assert request.url.params["days"] == "3"
+        return httpx.Response(200, content=body())
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_clients, "get", lambda name="default": client)
+
+    service = ThingSpeakTelemetryService()
+    config = {"channel_id": "stream-1", "read_key": "stream-key", "field_mapping": {"field1": "flow"}}
+    batches = [b async for b in service.stream_history("n1", config, days=3, batch_size=10)]
+    await client.aclose()
+
+    assert [len(b) for b in batches] == [10, 10, 10, 9]
+    assert batches[0].column("flow")[0] == 1.5
+    assert batches[-1].to_records()[-1]["flow"] == 39.5
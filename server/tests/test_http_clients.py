@@ -0,0 +1,23 @@
+import pytest
+from app.core.http import HTTPClientRegistry
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_and_closed_on_shutdown():
+    registry = HTTPClientRegistry()
+    await registry.startup()
+    client = registry.get("thingspeak")
+
+    assert registry.get("thingspeak") is client
+    assert str(client.base_url).startswith("https://api.thingspeak.com")
+    assert registry.metrics()["thingspeak"]["connections"] == 0
+
+    await registry.shutdown()
+    assert client.is_closed
+    assert registry.metrics() == {}
+
+@pytest.mark.asyncio
+async def test_unknown_upstream_uses_default_pool():
+    registry = HTTPClientRegistry()
+    client = registry.get("somewhere-else")
+    assert not client.is_closed
+    await registry.shutdown()
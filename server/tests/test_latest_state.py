@@ -0,0 +1,65 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from app.models.all_models import NodeLatestState
+from app.services.telemetry.latest import LatestStateStore
+
+def _reading(minute, **values):
+    return {"timestamp": f"2024-01-01T00:{minute:02d}:00Z", "entry_id": minute, **values}
+
+def test_record_keeps_newest_and_merges_metrics():
+    store = LatestStateStore(flush_interval=1, cache_ttl=60)
+    assert store.record("n1", _reading(5, field2=40.0), "poll", "EvaraTank")
+    assert store.record("n1", _reading(6, field1=21.5), "mqtt", "EvaraTank")
+
+    state = store._states["n1"]
+    assert state["timestamp"] == datetime(2024, 1, 1, 0, 6)
+    assert state["metrics"] == {"field1": 21.5, "field2": 40.0}
+    assert state["value"] == 40.0 # tanks report distance on field2
+    assert state["source"] == "mqtt"
+
+def test_late_reading_does_not_replace_state():
+    store = LatestStateStore(flush_interval=1, cache_ttl=60)
+    store.record("n1", _reading(10, field1=5.0), "poll", "EvaraFlow")
+    assert not store.record("n1", _reading(3, field1=1.0), "push", "EvaraFlow")
+
+    assert store._states["n1"]["metrics"] == {"field1": 5.0}
+    assert store.stats["late"] == 1
+
+@pytest.mark.asyncio
+async def test_flush_upserts_and_never_goes_backwards(session_factory):
+    store = LatestStateStore(flush_interval=1, cache_ttl=60, session_factory=session_factory)
+    store.record("n1", _reading(10, field1=5.0), "poll", "EvaraFlow")
+    store.record("n2", _reading(1, field1=2.0), "poll", "EvaraFlow")
+    await store.flush()
+    assert store.snapshot()["pending"] == 0
+
+    # Another process holding older state must not overwrite the table
+    stale = LatestStateStore(flush_interval=1, cache_ttl=60, session_factory=session_factory)
+    stale.record("n1", _reading(2, field1=9.0), "poll", "EvaraFlow")
+    await stale.flush()
+    store.record("n2", _reading(4, field1=3.0), "push", "EvaraFlow")
+    await store.flush()
+
+    async with session_factory() as session:
+        rows = {r.node_id: r for r in (await session.execute(select(NodeLatestState))).scalars().all()}
+    assert rows["n1"].timestamp == datetime(2024, 1, 1, 0, 10)
+    assert rows["n1"].value == 5.0
+    assert rows["n2"].timestamp == datetime(2024, 1, 1, 0, 4)
+    assert rows["n2"].source == "push"
+
+@pytest.mark.asyncio
+async def test_get_many_reads_state_written_elsewhere(session_factory):
+    writer = LatestStateStore(flush_interval=1, cache_ttl=60, session_factory=session_factory)
+    writer.record("n1", _reading(7, field2=12.0), "mqtt", "EvaraTank")
+    await writer.flush()
+
+    reader = LatestStateStore(flush_interval=1, cache_ttl=60, session_factory=session_factory)
+    async with session_factory() as session:
+        states = await reader.get_many(session, ["n1", "missing"])
+        assert set(states) == {"n1"}
+        assert states["n1"]["value"] == 12.0
+
+        # Cached now: a second lookup doesn't touch the table
+        await reader.get(session, "n1")
+    assert reader.stats["db_reads"] == 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.core.leader import FileLockBackend, LeaderElector, lock_key
+
+def test_lock_key_is_stable_signed_bigint():
+    assert lock_key("evara-background") == lock_key("evara-background")
+    assert lock_key("a") != lock_key("b")
+    assert -2**63 <= lock_key("evara-background") < 2**63
+
+@pytest.mark.asyncio
+async def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = FileLockBackend(path), FileLockBackend(path)
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    await first.release()
+    assert await second.acquire()
+    await second.release()
+
+class FlakyBackend:
+    """Grants the lock, then reports it lost on the first health check."""
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return True
+
+    async def check(self):
+        return False
+
+    async def release(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_only_the_leader_starts_singletons_and_failover(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    a = LeaderElector(FileLockBackend(path), retry_interval=0.01)
+    b = LeaderElector(FileLockBackend(path), retry_interval=0.01)
+    started = []
+
+    def start_for(name):
+        def start():
+            started.append(name)
+            return [asyncio.create_task(asyncio.sleep(3600))]
+        return start
+
+    runs = [asyncio.create_task(a.run(start_for("a"))), asyncio.create_task(b.run(start_for("b")))]
+    await asyncio.sleep(0.05)
+    assert started == ["a"] and a.is_leader and not b.is_leader
+
+    # Leader goes away: its lock is released and the follower takes over
+    runs[0].cancel()
+    await a.shutdown()
+    await asyncio.sleep(0.05)
+    assert started == ["a", "b"] and b.is_leader
+
+    runs[1].cancel()
+    await b.shutdown()
+
+@pytest.mark.asyncio
+async def test_lost_lock_stops_singleton_tasks():
+    elector = LeaderElector(FlakyBackend(), retry_interval=0.01)
+    tasks = []
+
+    def start():
+        tasks.append(asyncio.create_task(asyncio.sleep(3600)))
+        return [tasks[-1]]
+
+    run = asyncio.create_task(elector.run(start))
+    await asyncio.sleep(0.05)
+    assert tasks[0].cancelled()
+    run.cancel()
+    await elector.shutdown()
+    assert elector.backend.acquired >= 1
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import socket
+
+import pytest
+import pytest_asyncio
+
+aiomqtt = pytest.importorskip("aiomqtt")
+broker_module = pytest.importorskip("amqtt.broker")
+
+from app.services.telemetry.mqtt import MQTTTelemetryService
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest_asyncio.fixture
+async def broker_port():
+    port = _free_port()
+    broker = broker_module.Broker({
+        "listeners": {"default": {"type": "tcp", "bind": f"127.0.0.1:{port}"}},
+        "sys_interval": 0,
+        "auth": {"allow-anonymous": True}
+    })
+    await broker.start()
+    yield port
+    await broker.shutdown()
+
+def _service(port: int):
+    service = MQTTTelemetryService(host="127.0.0.1", port=port, topic_prefix="test/nodes")
+    stored = []
+
+    async def lookup(node_key):
+        return ("node-1", {"field2": "distance"}) if node_key == "KEY1" else None
+
+    async def store(node_id, readings):
+        stored.append((node_id, readings))
+
+    service._lookup_node = lookup
+    service._store = store
+    return service, stored
+
+def test_node_key_from_topic():
+    service = MQTTTelemetryService(topic_prefix="test/nodes")
+    assert service.node_key_from_topic("test/nodes/KEY1/telemetry") == "KEY1"
+    assert service.node_key_from_topic("test/nodes/a/b/telemetry") is None
+    assert service.node_key_from_topic("other/KEY1/telemetry") is None
+
+@pytest.mark.asyncio
+async def test_handle_message_validates_and_stores():
+    service, stored = _service(1883)
+    payload = json.dumps([
+        {"timestamp": "2026-01-01T00:01:00Z", "distance": 40},
+        {"timestamp": "2026-01-01T00:00:00Z", "distance": 41},
+        {"timestamp": "2026-01-01T00:02:00Z", "bogus": 1},
+    ]).encode()
+    assert await service.handle_message("test/nodes/KEY1/telemetry", payload) == 2
+    assert await service.handle_message("test/nodes/NOPE/telemetry", payload) == 0
+    assert await service.handle_message("test/nodes/KEY1/telemetry", b"{not json") == 0
+
+    node_id, readings = stored[0]
+    assert node_id == "node-1"
+    assert [r["distance"] for r in readings] == [41, 40]
+    assert (await service.fetch_latest("node-1"))["distance"] == 40
+    assert service.stats["rejected"] == 2
+    assert service.stats["unknown_nodes"] == 1
+
+@pytest.mark.asyncio
+async def test_subscriber_receives_from_embedded_broker(broker_port):
+    service, stored = _service(broker_port)
+    task = asyncio.create_task(service.run())
+    try:
+        for _ in range(100):
+            if service.connected:
+                break
+            await asyncio.sleep(0.05)
+        assert service.connected
+
+        async with aiomqtt.Client("127.0.0.1", broker_port) as publisher:
+            await publisher.publish(
+                "test/nodes/KEY1/telemetry",
+                json.dumps({"timestamp": "2026-01-01T00:00:00Z", "field2": "12.5"}),
+                qos=1
+            )
+
+        for _ in range(100):
+            if stored:
+                break
+            await asyncio.sleep(0.05)
+        assert len(stored) == 1
+        node_id, readings = stored[0]
+        assert node_id == "node-1"
+        assert readings[0]["distance"] == 12.5
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from app.services.telemetry.normalize import get_normalizer
+from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
+
+MAPPING = {"field2": "distance", "field1": "temperature"}
+
+def _feed(entry_id, created_at, field1=None, field2=None):
+    return {"entry_id": entry_id, "created_at": created_at, "field1": field1, "field2": field2}
+
+def test_normalizer_is_compiled_once_per_mapping():
+    assert get_normalizer(dict(MAPPING)) is get_normalizer(dict(MAPPING))
+    assert get_normalizer(MAPPING) is not get_normalizer({"field1": "flow"})
+
+def test_records_keep_int_float_and_missing_semantics():
+    feeds = [
+        _feed(1, "2026-01-01T00:00:00Z", "21", "40.5"),
+        _feed(2, "2026-01-01T00:01:00Z", None, "41"),
+        _feed(3, "2026-01-01T00:02:00Z", "", "n/a"),
+    ]
+    records = get_normalizer(MAPPING).normalize(feeds)
+
+    assert records[0] == {
+        "timestamp": "2026-01-01T00:00:00Z", "entry_id": 1,
+        "distance": 40.5, "temperature": 21, "field1": 21, "field2": 40.5
+    }
+    assert isinstance(records[0]["temperature"], int)
+    assert records[1]["temperature"] is None and "field1" not in records[1]
+    assert isinstance(records[1]["distance"], int)
+    # Non-numeric values pass through untouched, as before
+    assert records[2]["field1"] == "" and records[2]["distance"] == "n/a"
+
+def test_single_reading_path_matches_batch():
+    feed = _feed(9, "2026-01-01T00:00:00Z", "1.5", "7")
+    service = ThingSpeakTelemetryService()
+    assert service._normalize_reading(feed, MAPPING) == get_normalizer(MAPPING).normalize([feed])[0]
+
+def test_columns_resolve_aliases_and_sort():
+    feeds = [
+        _feed(2, "2026-01-01T00:01:00Z", "2", "20"),
+        _feed(1, "2026-01-01T00:00:00Z", "1", "10"),
+        _feed(3, "2026-01-01T00:02:00Z", "3", ""),
+    ]
+    columns = get_normalizer(MAPPING).columns(feeds).sort_by_time()
+
+    assert columns.entry_ids == [1, 2, 3]
+    np.testing.assert_array_equal(columns.column("temperature"), [1.0, 2.0, 3.0])
+    distance = columns.column("distance")
+    assert distance[:2].tolist() == [10.0, 20.0] and math.isnan(distance[2])
+    assert columns.to_records()[2]["distance"] == ""
+
+def test_empty_feed():
+    normalizer = get_normalizer(MAPPING)
+    assert normalizer.normalize([]) == []
+    assert len(normalizer.columns([])) == 0
+    assert normalizer.columns([]).to_records() == []
+
+def test_mapped_name_only_set_when_feed_has_the_field():
+    feeds = [{"entry_id": 1, "created_at": "2026-01-01T00:00:00Z", "field2": "40"}]
+    record = get_normalizer(MAPPING).normalize(feeds)[0]
+    assert record["distance"] == 40 and "temperature" not in record
+
+def test_values_float64_would_reinterpret_pass_through_as_sent():
+    feeds = [
+        _feed(1, "2026-01-01T00:00:00Z", "nan", "inf"),
+        _feed(2, "2026-01-01T00:01:00Z", True, "1e3"),
+        _feed(3, "2026-01-01T00:02:00Z", "2.5e1", 7.0),
+    ]
+    records = get_normalizer(MAPPING).normalize(feeds)
+
+    assert records[0]["temperature"] == "nan" and records[0]["field2"] == "inf"
+    assert records[1]["temperature"] is True and records[1]["field1"] is True
+    assert records[1]["distance"] == "1e3" # int("1e3") fails, so it stays text
+    assert records[2]["temperature"] == 25.0 and isinstance(records[2]["distance"], float)
+    columns = get_normalizer(MAPPING).columns(feeds)
+    assert np.isnan(columns.column("temperature")[:2]).all()
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.telemetry.pipeline import IngestBatch, IngestPipeline, Stage
+from app.services.telemetry.stages import validate_stage
+
+@pytest.mark.asyncio
+async def test_items_flow_through_stages_in_order():
+    seen = []
+
+    async def double(x):
+        return x * 2
+
+    async def drop_odd_input(x):
+        return None if x % 4 else x
+
+    async def sink(x):
+        seen.append(x)
+
+    pipeline = IngestPipeline([Stage("double", double), Stage("filter", drop_odd_input), Stage("sink", sink)])
+    pipeline.start()
+    for i in range(6):
+        await pipeline.submit(i)
+    await pipeline.stop()
+
+    assert sorted(seen) == [0, 4, 8]
+    snap = pipeline.snapshot()
+    assert snap["double"]["processed"] == 6
+    assert snap["filter"]["dropped"] == 3
+    assert snap["sink"]["received"] == 3
+    assert snap["sink"]["avg_latency_ms"] is not None
+    assert not pipeline.running
+
+@pytest.mark.asyncio
+async def test_stage_concurrency_is_bounded():
+    in_flight = 0
+    peak = 0
+
+    async def slow(x):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return x
+
+    pipeline = IngestPipeline([Stage("fetch", slow, concurrency=3)])
+    pipeline.start()
+    for i in range(12):
+        await pipeline.submit(i)
+    await pipeline.stop()
+
+    assert peak == 3
+    assert pipeline.snapshot()["fetch"]["processed"] == 12
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_and_do_not_stop_the_stage():
+    async def flaky(x):
+        if x == 1:
+            raise RuntimeError("boom")
+        return x
+
+    pipeline = IngestPipeline([Stage("flaky", flaky)])
+    pipeline.start()
+    for i in range(3):
+        await pipeline.submit(i)
+    await pipeline.stop()
+
+    snap = pipeline.snapshot()["flaky"]
+    assert snap["failed"] == 1 and snap["processed"] == 2
+
+@pytest.mark.asyncio
+async def test_full_stage_applies_backpressure_to_submitters():
+    release = asyncio.Event()
+
+    async def blocked(x):
+        await release.wait()
+        return x
+
+    pipeline = IngestPipeline([Stage("store", blocked, maxsize=1)])
+    pipeline.start()
+    await pipeline.submit(1) # picked up by the worker
+    await asyncio.sleep(0)
+    await pipeline.submit(2) # fills the queue
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(pipeline.submit(3), timeout=0.05)
+    assert pipeline.snapshot()["store"]["queue_depth"] == 1
+
+    release.set()
+    await pipeline.stop()
+
+@pytest.mark.asyncio
+async def test_submit_can_enter_at_a_later_stage():
+    calls = []
+
+    async def first(x):
+        calls.append(("first", x))
+        return x
+
+    async def second(x):
+        calls.append(("second", x))
+
+    pipeline = IngestPipeline([Stage("first", first), Stage("second", second)])
+    pipeline.start()
+    await pipeline.submit("pushed", stage="second")
+    await pipeline.stop()
+
+    assert calls == [("second", "pushed")]
+
+@pytest.mark.asyncio
+async def test_validate_stage_orders_dedupes_and_drops_bad_timestamps():
+    future = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    batch = IngestBatch("n1", "push", readings=[
+        {"timestamp": "2026-01-01T00:02:00Z", "v": 2},
+        {"timestamp": "2026-01-01T00:01:00Z", "v": 1},
+        {"timestamp": "2026-01-01T00:02:00Z", "v": 3},
+        {"timestamp": "garbage", "v": 4},
+        {"timestamp": future, "v": 5},
+    ])
+    result = await validate_stage(batch)
+    assert [r["v"] for r in result.readings] == [1, 3]
+
+    assert await validate_stage(IngestBatch("n1", "push", readings=[{"timestamp": None}])) is None
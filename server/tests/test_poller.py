@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from sqlalchemy import select
+from app.models.all_models import DeviceThingSpeakMapping, NodeReading
+from app.services.telemetry import stages
+from app.services.telemetry.cache import channel_cache
+from app.services.telemetry.pipeline import IngestBatch
+from app.services.telemetry.poller import ThingSpeakPoller
+from app.services.telemetry.writer import TelemetryWriter
+
+def _target(channel_id):
+    return {
+        "node_id": f"node-{channel_id}",
+        "analytics_type": "EvaraTank",
+        "mapping_id": None,
+        "channel_id": channel_id,
+        "read_key": f"key-{channel_id}",
+        "field_mapping": {}
+    }
+
+@pytest.mark.asyncio
+async def test_fetch_returns_new_entries_and_warms_cache():
+    def handler(request):
+        assert request.url.params["api_key"] == "key-fetch-1"
+        return httpx.Response(200, json={"feeds": [{"entry_id": 1, "field2": "42.5"}]})
+
+    poller = ThingSpeakPoller()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        feeds = await poller.fetch_target(_target("fetch-1"), client)
+
+    assert feeds == [{"entry_id": 1, "field2": "42.5"}]
+    assert channel_cache.latest("fetch-1") == {"entry_id": 1, "field2": "42.5"}
+
+@pytest.mark.asyncio
+async def test_fetch_failure_returns_none():
+    def handler(request):
+        return httpx.Response(404)
+
+    poller = ThingSpeakPoller()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        feeds = await poller.fetch_target(_target("1"), client)
+
+    assert feeds is None
+
+def test_extract_value_uses_field2_for_tanks():
+    feed = {"field1": "25.0", "field2": "120.5"}
+    assert ThingSpeakPoller.extract_value("EvaraTank", feed) == 120.5
+    assert ThingSpeakPoller.extract_value("EvaraFlow", feed) == 25.0
+    assert ThingSpeakPoller.extract_value("EvaraTank", {"field2": "bad"}) == 0.0
+
+def test_build_params_without_watermark_fetches_latest_only():
+    assert ThingSpeakPoller.build_params(_target("1")) == {"results": 1}
+
+def test_build_params_starts_after_watermark():
+    from datetime import datetime
+    target = dict(_target("1"), last_entry_id=10, last_sync_time=datetime(2024, 1, 1, 10, 0, 0))
+    params = ThingSpeakPoller.build_params(target)
+    assert params["start"] == "2024-01-01 10:00:01"
+    assert params["results"] == ThingSpeakPoller.MAX_RESULTS
+
+def test_new_entries_drops_already_seen():
+    target = dict(_target("1"), last_entry_id=10)
+    feeds = [{"entry_id": 12}, {"entry_id": 10}, {"entry_id": 11}, {"entry_id": 9}]
+    assert ThingSpeakPoller.new_entries(target, feeds) == [{"entry_id": 11}, {"entry_id": 12}]
+
+@pytest.mark.asyncio
+async def test_store_persists_every_new_entry_then_advances_watermark(session_factory, monkeypatch):
+    async with session_factory() as session:
+        session.add(DeviceThingSpeakMapping(id="m-store", device_id="node-store", channel_id="store", field_mapping={}))
+        await session.commit()
+    writer = TelemetryWriter(session_factory=session_factory)
+    monkeypatch.setattr(stages, "telemetry_writer", writer)
+    monkeypatch.setattr(stages, "AsyncSessionLocal", session_factory)
+
+    target = {**_target("store"), "mapping_id": "m-store", "last_entry_id": 3}
+    feeds = [{"entry_id": i, "created_at": f"2024-01-01T00:0{i}:00Z", "field2": str(i)} for i in (2, 4, 5, 6, 3)]
+    batch = IngestBatch("node-store", "thingspeak", target=target, raw=ThingSpeakPoller.new_entries(target, feeds))
+    await stages.store_stage(await stages.normalize_stage(batch))
+    await writer.drain()
+
+    async with session_factory() as session:
+        stored = (await session.execute(select(NodeReading.entry_id).order_by(NodeReading.entry_id))).scalars().all()
+        mapping = await session.get(DeviceThingSpeakMapping, "m-store")
+    assert stored == [4, 5, 6] # all new entries of the poll, not just the newest
+    assert mapping.last_entry_id == 6 and mapping.last_sync_time == datetime(2024, 1, 1, 0, 6)
+
+@pytest.mark.asyncio
+async def test_watermark_skips_rejected_entries_without_jumping_ahead(session_factory, monkeypatch):
+    writer = TelemetryWriter(session_factory=session_factory)
+    monkeypatch.setattr(stages, "telemetry_writer", writer)
+    monkeypatch.setattr(stages, "AsyncSessionLocal", session_factory)
+    future = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    # The newest entry has a clock-skewed timestamp and is dropped by validate
+    target = {**_target("skewed"), "last_entry_id": 3, "last_sync_time": datetime(2024, 1, 1)}
+    feeds = [
+        {"entry_id": 4, "created_at": "2024-01-01T00:04:00Z", "field2": "4"},
+        {"entry_id": 5, "created_at": future, "field2": "5"}
+    ]
+    batch = IngestBatch("node-skewed", "thingspeak", target=target, raw=feeds)
+    batch = await stages.validate_stage(await stages.normalize_stage(batch))
+    await stages.store_stage(batch)
+    await writer.drain()
+    assert (target["last_entry_id"], target["last_sync_time"]) == (5, datetime(2024, 1, 1, 0, 4))
+
+    # A fetch with nothing valid still moves past its entries, keeping the time watermark
+    batch = IngestBatch("node-skewed", "thingspeak", target=target, raw=[{"entry_id": 6, "created_at": future}])
+    assert await stages.validate_stage(await stages.normalize_stage(batch)) is None
+    assert (target["last_entry_id"], target["last_sync_time"]) == (6, datetime(2024, 1, 1, 0, 4))
+    assert ThingSpeakPoller.new_entries(target, [{"entry_id": 6, "created_at": future}]) == []
+
+def _channel(count):
+    """A ThingSpeak stand-in: `start`/`end` are inclusive and only the newest `results` entries come back."""
+    entries = [
+        {"entry_id": i, "created_at": f"2024-01-01T{i // 60:02d}:{i % 60:02d}:00Z", "field2": str(i)}
+        for i in range(1, count + 1)
+    ]
+    requests = []
+
+    def handler(request):
+        params = request.url.params
+        requests.append(dict(params))
+        as_text = lambda value: value.replace(" ", "T") + "Z"
+        feeds = [
+            e for e in entries
+            if e["created_at"] >= as_text(params["start"]) and ("end" not in params or e["created_at"] <= as_text(params["end"]))
+        ]
+        return httpx.Response(200, json={"feeds": feeds[-int(params["results"]):]})
+
+    return handler, requests
+
+@pytest.mark.asyncio
+async def test_full_page_walks_back_to_the_watermark(monkeypatch):
+    monkeypatch.setattr(ThingSpeakPoller, "MAX_RESULTS", 5)
+    handler, requests = _channel(23)
+    target = {**_target("outage"), "last_entry_id": 3, "last_sync_time": datetime(2024, 1, 1, 0, 3)}
+
+    poller = ThingSpeakPoller()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        feeds = await poller.fetch_target(target, client)
+    # Entries 4.. are contiguous with the watermark; the newer ones come on the next polls
+    assert [f["entry_id"] for f in feeds] == [4, 5, 6]
+    assert len(requests) == 5
+
+    target.update(last_entry_id=6, last_sync_time=datetime(2024, 1, 1, 0, 6))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert [f["entry_id"] for f in await poller.fetch_target(target, client)] == [7, 8, 9, 10]
+
+@pytest.mark.asyncio
+async def test_gap_beyond_the_catchup_limit_is_left_to_the_backfill(session_factory, monkeypatch):
+    from app.services.telemetry import poller as poller_module
+
+    async with session_factory() as session:
+        session.add(DeviceThingSpeakMapping(
+            id="m-gap", device_id="node-gap", channel_id="gap", field_mapping={}, backfilled_until=datetime(2024, 1, 1, 0, 10)
+        ))
+        await session.commit()
+    monkeypatch.setattr(poller_module, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(poller_module.settings, "THINGSPEAK_POLL_CATCHUP_PAGES", 1)
+    monkeypatch.setattr(ThingSpeakPoller, "MAX_RESULTS", 5)
+    handler, _ = _channel(23)
+    target = {
+        **_target("gap"), "mapping_id": "m-gap", "last_entry_id": 3,
+        "last_sync_time": datetime(2024, 1, 1, 0, 3), "backfilled_until": datetime(2024, 1, 1, 0, 10)
+    }
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        feeds = await ThingSpeakPoller().fetch_target(target, client)
+
+    assert [f["entry_id"] for f in feeds] == [15, 16, 17, 18]
+    async with session_factory() as session:
+        mapping = await session.get(DeviceThingSpeakMapping, "m-gap")
+    assert mapping.backfilled_until == datetime(2024, 1, 1, 0, 3)
@@ -0,0 +1,92 @@
+import pytest
+
+from app.services.telemetry.push import PayloadError, PushReadingValidator, parse_payload
+
+MAPPING = {"field1": "temperature", "field2": "distance"}
+
+def test_parse_ndjson_skips_blank_lines():
+    body = b'{"field1": 1}\n\n{"field1": 2}\n'
+    assert parse_payload(body, "application/x-ndjson") == [{"field1": 1}, {"field1": 2}]
+
+def test_parse_ndjson_reports_bad_line():
+    with pytest.raises(PayloadError, match="line 2"):
+        parse_payload(b'{"field1": 1}\n{oops', "application/x-ndjson")
+
+def test_parse_json_shapes():
+    assert parse_payload(b'[{"a": 1}, {"a": 2}]', "application/json") == [{"a": 1}, {"a": 2}]
+    assert parse_payload(b'{"readings": [{"a": 1}]}', "application/json") == [{"a": 1}]
+    assert parse_payload(b'{"a": 1}', "application/json") == [{"a": 1}]
+    assert parse_payload(b"  ", "application/json") == []
+
+def test_validator_accepts_aliases_and_raw_fields():
+    readings, errors = PushReadingValidator(MAPPING).validate([
+        {"timestamp": "2026-01-01T00:00:00Z", "distance": 42.5, "field1": "21"},
+        {"timestamp": 1767225600, "entry_id": 7, "field2": 40},
+    ])
+    assert errors == []
+    assert readings[0]["timestamp"] == "2026-01-01T00:00:00Z"
+    assert readings[0]["distance"] == 42.5
+    assert readings[0]["temperature"] == 21.0
+    assert readings[0]["field2"] == 42.5
+    assert readings[1]["timestamp"] == "2026-01-01T00:00:00Z"
+    assert readings[1]["entry_id"] == 7
+
+def test_validator_rejects_bad_readings_by_index():
+    items = [
+        {"distance": 1},
+        {"pressure": 3},
+        {"distance": "high"},
+        {"timestamp": "not-a-date", "distance": 1},
+        {"timestamp": "2026-01-01T00:00:00Z"},
+        "field1=3",
+        {"timestamp": 1e20, "distance": 1},
+        {"timestamp": float("inf"), "distance": 1},
+        {"timestamp": float("nan"), "distance": 1},
+    ]
+    readings, errors = PushReadingValidator(MAPPING).validate(items)
+    assert len(readings) == 1
+    assert [e["index"] for e in errors] == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert all("Invalid timestamp" in e["error"] for e in errors[5:])
+    assert "pressure" in errors[0]["error"]
+
+def test_validator_rejects_non_finite_values():
+    readings, errors = PushReadingValidator(MAPPING).validate(
+        parse_payload(b'[{"distance": "nan"}, {"field1": "inf"}, {"distance": NaN}, {"field1": -Infinity}, {"distance": 1e999}]', "application/json")
+    )
+    assert readings == []
+    assert [e["index"] for e in errors] == [0, 1, 2, 3, 4]
+    assert all("Non-numeric" in e["error"] for e in errors)
+
+def _request(body_chunks, headers):
+    from starlette.requests import Request
+
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in body_chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    received = []
+
+    async def receive():
+        received.append(messages[len(received)])
+        return received[-1]
+
+    scope = {"type": "http", "method": "POST", "headers": [(k.encode(), v.encode()) for k, v in headers.items()]}
+    return Request(scope, receive), received
+
+@pytest.mark.asyncio
+async def test_body_cap_is_enforced_before_the_body_is_read():
+    from fastapi import HTTPException
+    from app.api.api_v1.endpoints.ingest import read_capped_body
+
+    # Declared too large: refused without reading anything
+    request, received = _request([b"x" * 10], {"content-length": "100"})
+    with pytest.raises(HTTPException) as refused:
+        await read_capped_body(request, 50)
+    assert refused.value.status_code == 413 and received == []
+
+    # Chunked: refused at the chunk that crosses the limit, the rest is never read
+    request, received = _request([b"x" * 30] * 10, {})
+    with pytest.raises(HTTPException):
+        await read_capped_body(request, 50)
+    assert len(received) == 2
+
+    request, _ = _request([b'{"field1": ', b"1}"], {"content-length": "13"})
+    assert await read_capped_body(request, 50) == b'{"field1": 1}'
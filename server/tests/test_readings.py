@@ -0,0 +1,33 @@
+from datetime import datetime
+import pytest
+from app.db.repository import ReadingRepository, insert_ignore
+from app.models.all_models import NodeReading
+from app.services.telemetry_processor import TelemetryProcessor
+
+def test_reading_rows_use_typed_columns():
+    reading = {"timestamp": "2024-01-01T00:00:00Z", "entry_id": 7, "distance": 42.5, "field2": 42.5, "field1": 3, "field3": "OK"}
+    (row,) = TelemetryProcessor.build_reading_rows("n1", [reading])
+
+    assert row["timestamp"] == datetime(2024, 1, 1)
+    assert (row["field1"], row["field2"], row["field3"], row["field8"]) == (3.0, 42.5, None, None)
+    # Mapped names repeat a field's value and aren't stored; text values keep their raw form
+    assert row["data"] == {"field3": "OK"}
+
+@pytest.mark.asyncio
+async def test_range_queries_are_bounded_and_ordered(session_factory):
+    readings = [{"timestamp": f"2024-01-01T00:{m:02d}:00Z", "field1": m} for m in range(10)]
+    rows = TelemetryProcessor.build_reading_rows("n1", readings)
+    rows += TelemetryProcessor.build_reading_rows("n2", readings[:3])
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), rows)
+        await session.commit()
+
+        repo = ReadingRepository(session)
+        window = await repo.get_range("n1", datetime(2024, 1, 1, 0, 2), datetime(2024, 1, 1, 0, 5))
+        assert [r.field1 for r in window] == [2.0, 3.0, 4.0]
+
+        newest = await repo.get_range("n1", limit=2, newest_first=True)
+        assert [r.field1 for r in newest] == [9.0, 8.0]
+
+        batches = [[r.field1 for r in batch] async for batch in repo.stream_range("n1", batch_size=4)]
+        assert batches == [[0.0, 1.0, 2.0, 3.0], [4.0, 5.0, 6.0, 7.0], [8.0, 9.0]]
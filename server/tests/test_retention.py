@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.db.partitions import add_months, drop_partitions_before, ensure_partitions, parse_partition_name, partition_name
+from app.db.repository import insert_ignore
+from app.models.all_models import Base, Customer, Node, NodeAnalytics, NodeReading, Plan
+from app.services.retention import RetentionService
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+def test_partition_names_round_trip():
+    month = datetime(2024, 1, 1)
+    assert partition_name("node_readings", month) == "node_readings_y2024m01"
+    assert parse_partition_name("node_readings", "node_readings_y2024m01") == month
+    assert parse_partition_name("node_readings", "node_readings_default") is None
+    assert add_months(datetime(2023, 11, 1), 3) == datetime(2024, 2, 1)
+    assert add_months(month, -1) == datetime(2023, 12, 1)
+
+class PlainPostgresConn:
+    """A Postgres connection whose telemetry tables predate partitioning."""
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return self
+
+    def first(self):
+        return None # not in pg_partitioned_table
+
+    def all(self):
+        return []
+
+@pytest.mark.asyncio
+async def test_unpartitioned_postgres_tables_are_left_plain():
+    conn = PlainPostgresConn()
+    assert await ensure_partitions(conn, datetime(2024, 1, 1), datetime(2024, 3, 1)) == 0
+    assert not any("PARTITION OF" in s for s in conn.statements)
+
+    assert await drop_partitions_before(conn, datetime(2024, 1, 1)) == []
+    assert "DELETE FROM node_readings WHERE timestamp < :cutoff" in conn.statements
+
+async def _seed(engine):
+    async with engine.begin() as conn:
+        await conn.execute(Plan.__table__.insert(), [
+            {"id": "short", "name": "Base", "retention_days": 7},
+            {"id": "long", "name": "Pro", "retention_days": 90}
+        ])
+        await conn.execute(Customer.__table__.insert(), [
+            {"id": "c1", "full_name": "Short", "email": "s@example.com", "plan_id": "short"},
+            {"id": "c2", "full_name": "Long", "email": "l@example.com", "plan_id": "long"}
+        ])
+        await conn.execute(Node.__table__.insert(), [
+            {"id": node_id, "hardware_id": node_id, "device_label": node_id, "device_type": "tank",
+             "analytics_type": "EvaraTank", "customer_id": customer}
+            for node_id, customer in (("n-short", "c1"), ("n-long", "c2"), ("n-none", None))
+        ])
+        readings, rollups = [], []
+        for node_id in ("n-short", "n-long", "n-none"):
+            for age in (1, 10, 40, 100):
+                ts = NOW - timedelta(days=age)
+                readings.append({"id": f"{node_id}-{age}", "node_id": node_id, "timestamp": ts, "field2": float(age)})
+                rollups.append({"id": f"{node_id}-{age}", "node_id": node_id, "period_type": "daily",
+                                "period_start": ts.replace(hour=0), "sample_count": 1})
+        await conn.execute(insert_ignore(NodeReading, "sqlite"), readings)
+        await conn.execute(insert_ignore(NodeAnalytics, "sqlite"), rollups)
+
+async def _ages(engine, model, column):
+    async with engine.connect() as conn:
+        result = await conn.execute(select(model.node_id, column))
+        ages = {}
+        for node_id, ts in result.all():
+            ages.setdefault(node_id, set()).add((NOW - ts).days)
+        return ages
+
+@pytest.mark.asyncio
+async def test_retention_follows_each_nodes_plan(engine):
+    await _seed(engine)
+    result = await RetentionService(engine).run_once(now=NOW)
+
+    assert result["longest_retention_days"] == 90
+    readings = await _ages(engine, NodeReading, NodeReading.timestamp)
+    assert readings == {"n-short": {1}, "n-long": {1, 10, 40}, "n-none": {1, 10}} # no plan: 30-day default
+    rollups = await _ages(engine, NodeAnalytics, NodeAnalytics.period_start)
+    assert rollups["n-short"] == {1}
+    assert rollups["n-long"] == {1, 10, 40}
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.db.repository import insert_ignore
+from app.models.all_models import NodeReading
+from app.services.telemetry.ring import NodeRing, RingBufferStore
+from app.services.telemetry_processor import TelemetryProcessor
+
+START = datetime(2024, 1, 1)
+
+def _rows(first, count):
+    readings = [
+        {"timestamp": (START + timedelta(minutes=i)).isoformat() + "Z", "entry_id": i + 1, "field2": float(i)}
+        for i in range(first, first + count)
+    ]
+    return TelemetryProcessor.build_reading_rows("n1", readings)
+
+def test_ring_wraps_and_keeps_newest():
+    ring = NodeRing(5)
+    assert ring.extend(_rows(0, 3)) == 3
+    assert ring.extend(_rows(3, 4)) == 4
+    assert len(ring) == 5
+    assert ring.oldest == START + timedelta(minutes=2) and ring.newest == START + timedelta(minutes=6)
+
+    records = ring.columns(ring.last(3), {"field2": "distance"}).to_records()
+    assert [r["entry_id"] for r in records] == [5, 6, 7]
+    assert records[0]["timestamp"] == "2024-01-01T00:04:00Z"
+    assert records[0]["distance"] == 4.0 and "field1" not in records[0]
+
+def test_ring_skips_late_readings_and_slices_by_time():
+    ring = NodeRing(100)
+    ring.extend(_rows(0, 10))
+    assert ring.extend(_rows(5, 3)) == 0 # already held
+    assert ring.covers(START) and not ring.covers(START - timedelta(minutes=1))
+
+    slots = ring.since(START + timedelta(minutes=7))
+    assert ring.entry_ids[slots].tolist() == [8, 9, 10]
+    assert np.isnan(ring.values[0, slots]).all() # field1 never reported
+
+@pytest.mark.asyncio
+async def test_store_seeds_from_storage_then_serves_from_memory(session_factory):
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), _rows(0, 20))
+        await session.commit()
+
+    store = RingBufferStore(capacity=50, sync_interval=3600)
+    # Ingested before the first read and not written yet: kept on top of the stored readings
+    store.record("n1", _rows(20, 2))
+    async with session_factory() as session:
+        columns = await store.recent(session, "n1", count=22)
+        assert [r["entry_id"] for r in columns.to_records()] == list(range(1, 23))
+
+        store.record("n1", _rows(22, 1))
+        columns = await store.recent(session, "n1", count=5)
+        assert columns.to_records()[-1]["entry_id"] == 23
+        assert await store.recent(session, "n1", count=40) is None # more than it holds
+        assert await store.recent(session, "n1", count=60) is None # more than it can hold
+
+    assert store.stats["db_reads"] == 1
+    assert store.snapshot()["bytes"] > 0
+
+@pytest.mark.asyncio
+async def test_store_tops_up_readings_written_elsewhere(session_factory):
+    store = RingBufferStore(capacity=50, sync_interval=0)
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), _rows(0, 5))
+        await session.commit()
+        assert len(await store.get(session, "n1")) == 5
+
+        # e.g. ingested by the worker process
+        await session.execute(insert_ignore(NodeReading, "sqlite"), _rows(5, 3))
+        await session.commit()
+        ring = await store.get(session, "n1")
+    assert len(ring) == 8 and ring.entry_ids[ring.last(1)].tolist() == [8]
+
+def _channel_rows(field, minutes, value):
+    readings = [{"timestamp": (START + timedelta(minutes=m)).isoformat() + "Z", field: value} for m in minutes]
+    return TelemetryProcessor.build_reading_rows("n1", readings)
+
+def test_second_channel_batch_is_slotted_in_by_time():
+    ring = NodeRing(4)
+    ring.extend(_channel_rows("field1", [0, 2, 4], 1.5))
+    # Channel B polled after channel A: older instants, one shared with A
+    assert ring.extend(_channel_rows("field2", [1, 2, 3], 40.0)) == 2
+
+    rows = ring.rows()
+    assert [r["timestamp"].minute for r in rows] == [1, 2, 3, 4] # minute 0 fell out of the window
+    assert (rows[1]["field1"], rows[1]["field2"]) == (1.5, 40.0)
+    assert rows[0]["field1"] is None and rows[2]["field2"] == 40.0
+    assert ring.newest == START + timedelta(minutes=4)
+    # Appending still continues after the rebuilt window
+    assert ring.extend(_channel_rows("field1", [5], 2.0)) == 1
+    assert [r["timestamp"].minute for r in ring.rows()] == [2, 3, 4, 5]
+
+def test_integer_readings_come_back_as_ints():
+    ring = NodeRing(10)
+    ring.extend(TelemetryProcessor.build_reading_rows("n1", [
+        {"timestamp": "2024-01-01T00:00:00Z", "field1": 12, "field2": 12.0},
+        {"timestamp": "2024-01-01T00:01:00Z", "field1": 7.5}
+    ]))
+    records = ring.columns(ring.last(2), {"field1": "flow"}).to_records()
+    assert records[0]["flow"] == 12 and isinstance(records[0]["flow"], int)
+    assert isinstance(records[0]["field2"], float)
+    assert isinstance(records[1]["flow"], float)
+
+@pytest.mark.asyncio
+async def test_recent_with_a_mapping_only_counts_its_channels_readings(session_factory):
+    store = RingBufferStore(capacity=50, sync_interval=3600)
+    store._loaded.add("n1")
+    store.record("n1", _channel_rows("field1", [0, 2, 4], 1.0))
+    store.record("n1", _channel_rows("field2", [1, 3, 5], 40.0))
+    async with session_factory() as session:
+        columns = await store.recent(session, "n1", count=3, field_mapping={"field1": "flow"})
+        assert [r["timestamp"] for r in columns.to_records()] == [
+            "2024-01-01T00:00:00Z", "2024-01-01T00:02:00Z", "2024-01-01T00:04:00Z"
+        ]
+        assert await store.recent(session, "n1", count=4, field_mapping={"field1": "flow"}) is None
+        assert len(await store.recent(session, "n1", count=6)) == 6
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.api.api_v1.endpoints.analytics import AnalyticsRepository
+from app.db.repository import insert_ignore
+from app.models.all_models import NodeAnalytics, NodeReading
+from app.services.telemetry.rollup import RollupAggregator, period_end, period_start
+from app.services.telemetry_processor import TelemetryProcessor
+
+def _reading(hour, minute, day=1, **values):
+    return {"timestamp": f"2024-01-{day:02d}T{hour:02d}:{minute:02d}:00Z", **values}
+
+async def _store(session_factory, readings, node_id="n1"):
+    """Write readings like the telemetry writer does (resends are ignored)."""
+    async with session_factory() as session:
+        await session.execute(insert_ignore(NodeReading, "sqlite"), TelemetryProcessor.build_reading_rows(node_id, readings))
+        await session.commit()
+
+async def _rows(session_factory, period_type):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(NodeAnalytics).where(NodeAnalytics.period_type == period_type).order_by(NodeAnalytics.period_start)
+        )
+        return result.scalars().all()
+
+def test_record_marks_hours_of_readings_with_the_metric():
+    rollups = RollupAggregator(flush_interval=1)
+    # Flow nodes aggregate field1; field2 alone doesn't count
+    rollups.record("n1", [
+        _reading(1, 0, field1=10.0), _reading(1, 30, field1=20.0), _reading(2, 5, field1=5.0),
+        _reading(3, 0, field2=3.0), _reading(4, 1, field1="bad"), {"field1": 1.0}
+    ], "EvaraFlow")
+
+    assert rollups._dirty["n1"][1] == {datetime(2024, 1, 1, 1), datetime(2024, 1, 1, 2)}
+    assert rollups.stats["skipped"] == 3
+    assert rollups.snapshot()["pending_hours"] == 2
+
+@pytest.mark.asyncio
+async def test_flush_recomputes_hours_then_rolls_them_up(session_factory):
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    first = [_reading(1, 0, field2=10.0), _reading(1, 30, field2=20.0)]
+    await _store(session_factory, first)
+    rollups.record("n1", first, "EvaraTank")
+    await rollups.flush()
+    second = [_reading(1, 45, field2=30.0), _reading(3, 0, field2=2.0), _reading(0, 0, day=8, field2=4.0)]
+    await _store(session_factory, second)
+    rollups.record("n1", second, "EvaraTank")
+    await rollups.flush()
+
+    hourly = await _rows(session_factory, "hourly")
+    assert [r.period_start.hour for r in hourly] == [1, 3, 0]
+    assert (hourly[0].sample_count, hourly[0].value_sum, hourly[0].value_min, hourly[0].value_max) == (3, 60.0, 10.0, 30.0)
+    assert hourly[0].avg_level_percent == pytest.approx(20.0)
+    assert hourly[0].peak_flow is None
+
+    daily = await _rows(session_factory, "daily")
+    assert [(r.period_start.day, r.sample_count, r.value_min) for r in daily] == [(1, 4, 2.0), (8, 1, 4.0)]
+    # 2024-01-01 is a Monday, so the 8th starts the next week
+    weekly = await _rows(session_factory, "weekly")
+    assert [(r.period_start.day, r.sample_count) for r in weekly] == [(1, 4), (8, 1)]
+    (monthly,) = await _rows(session_factory, "monthly")
+    assert (monthly.sample_count, monthly.value_sum, monthly.value_max) == (5, 66.0, 30.0)
+    assert rollups.snapshot()["pending_nodes"] == 0
+
+@pytest.mark.asyncio
+async def test_flow_rollup_tracks_peak(session_factory):
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    readings = [_reading(1, 0, field1=4.0), _reading(1, 10, field1=9.0), _reading(1, 20, field1=1.0)]
+    await _store(session_factory, readings)
+    rollups.record("n1", readings, "EvaraFlow")
+    await rollups.flush()
+
+    (row,) = await _rows(session_factory, "hourly")
+    assert row.peak_flow == 9.0
+    assert row.value_min == 1.0
+    assert row.avg_level_percent is None
+
+def test_periods_cover_week_and_month():
+    ts = datetime(2024, 2, 29, 13, 45)
+    assert period_start("weekly", ts) == datetime(2024, 2, 26) # Monday
+    assert period_start("monthly", ts) == datetime(2024, 2, 1)
+    assert period_end("monthly", datetime(2024, 12, 1)) == datetime(2025, 1, 1)
+
+@pytest.mark.asyncio
+async def test_resends_on_other_workers_are_not_counted_twice(session_factory):
+    # Two processes, each with its own aggregator and no memory of the other's readings
+    worker_a = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    worker_b = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    readings = [_reading(1, m, field1=float(m)) for m in range(3)]
+
+    await _store(session_factory, readings[:2])
+    worker_a.record("n1", readings[:2], "EvaraFlow")
+    await worker_a.flush()
+    # A gateway retry of the same upload lands on worker B, plus one new reading
+    await _store(session_factory, readings)
+    worker_b.record("n1", readings, "EvaraFlow")
+    await worker_b.flush()
+    # And worker A, after a restart, sees the first upload again
+    worker_a = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    await _store(session_factory, readings[:1])
+    worker_a.record("n1", readings[:1], "EvaraFlow")
+    await worker_a.flush()
+
+    for period_type in ("hourly", "daily", "weekly", "monthly"):
+        (row,) = await _rows(session_factory, period_type)
+        assert (row.sample_count, row.value_sum) == (3, 3.0)
+
+@pytest.mark.asyncio
+async def test_late_reading_recomputes_only_its_own_buckets(session_factory):
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    readings = [_reading(h, 0, day=d, field2=10.0) for d in (1, 2) for h in (1, 2)]
+    await _store(session_factory, readings)
+    rollups.record("n1", readings, "EvaraTank")
+    await rollups.flush()
+
+    late = [_reading(1, 30, field2=40.0)]
+    await _store(session_factory, late)
+    rollups.record("n1", late, "EvaraTank")
+    assert rollups.snapshot()["pending_hours"] == 1
+    upserted = rollups.stats["rows_upserted"]
+    await rollups.flush()
+    # One hour, its day, week and month
+    assert rollups.stats["rows_upserted"] - upserted == 4
+
+    hourly = await _rows(session_factory, "hourly")
+    assert [(r.sample_count, r.value_sum) for r in hourly] == [(2, 50.0), (1, 10.0), (1, 10.0), (1, 10.0)]
+    (monthly,) = await _rows(session_factory, "monthly")
+    assert (monthly.sample_count, monthly.value_max) == (5, 40.0)
+
+@pytest.mark.asyncio
+async def test_backfilled_range_is_recomputed_hour_by_hour(session_factory):
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    start = datetime(2024, 1, 1)
+    readings = [
+        {"timestamp": (start + timedelta(minutes=10 * i)).isoformat() + "Z", "field1": 1.0} for i in range(6 * 24 * 40)
+    ]
+    await _store(session_factory, readings)
+    rollups.recompute("n1", "EvaraFlow", start, start + timedelta(days=40))
+    await rollups.flush()
+
+    assert len(await _rows(session_factory, "hourly")) == 24 * 40
+    assert [r.sample_count for r in await _rows(session_factory, "monthly")] == [6 * 24 * 31, 6 * 24 * 9]
+
+@pytest.mark.asyncio
+async def test_summary_reads_buckets(session_factory):
+    now = datetime.utcnow()
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    readings = [{"timestamp": (now - timedelta(days=d)).isoformat(), "field1": float(d)} for d in (40, 3, 2, 1)]
+    await _store(session_factory, readings)
+    rollups.record("n1", readings, "EvaraFlow")
+    await rollups.flush()
+
+    async with session_factory() as session:
+        summary = await AnalyticsRepository(session).summarize("n1", 7)
+    assert summary["data_points"] == 3
+    assert summary["samples"] == 3
+    assert summary["max_peak_flow"] == 3.0
+
+@pytest.mark.asyncio
+async def test_summary_totals_grow_with_the_window(session_factory):
+    today = period_start("daily", datetime.utcnow())
+    rollups = RollupAggregator(flush_interval=1, session_factory=session_factory)
+    # One tank reading at noon on each of the last 400 days
+    readings = [{"timestamp": (today - timedelta(days=d, hours=-12)).isoformat(), "field2": 50.0} for d in range(399, -1, -1)]
+    await _store(session_factory, readings)
+    rollups.record("n1", readings, "EvaraTank")
+    await rollups.flush()
+
+    async with session_factory() as session:
+        repo = AnalyticsRepository(session)
+        week, before_year, year = [await repo.summarize("n1", days) for days in (7, 364, 365)]
+    assert week["data_points"] == 7 # today and the six days before, no partial extra bucket
+    assert before_year["total_consumption_liters"] == 364 * 500.0
+    assert year["total_consumption_liters"] == 365 * 500.0
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from app.services.telemetry.scheduler import PollScheduler
+
+def _scheduler():
+    return PollScheduler(default_interval=60, min_interval=15, max_interval=900, max_backoff=3600)
+
+def _times(start, gap, n):
+    return [start + timedelta(seconds=gap * i) for i in range(n)]
+
+def test_new_channels_are_due_immediately():
+    s = _scheduler()
+    s.sync(["a", "b"], now=0)
+    assert sorted(s.due(0)) == ["a", "b"]
+    assert s.due(0) == []
+
+def test_interval_follows_observed_update_rate():
+    s = _scheduler()
+    s.sync(["fast", "slow"], now=0)
+    s.due(0)
+    t0 = datetime(2024, 1, 1)
+    s.record_success("fast", _times(t0, 15, 5), now=0)
+    s.record_success("slow", _times(t0, 300, 5), now=0)
+    assert s.get("fast").interval == 15
+    assert s.get("slow").interval == 300
+    assert s.due(20) == ["fast"]
+
+def test_interval_is_clamped_to_minimum():
+    s = _scheduler()
+    s.sync(["a"], now=0)
+    s.record_success("a", _times(datetime(2024, 1, 1), 2, 10), now=0)
+    assert s.get("a").interval == 15
+
+def test_quiet_channel_backs_off_to_max_interval():
+    s = _scheduler()
+    s.sync(["a"], now=0)
+    for _ in range(20):
+        s.record_success("a", [], now=0)
+    assert s.get("a").interval == 900
+
+def test_failures_back_off_exponentially():
+    s = _scheduler()
+    s.sync(["a"], now=0)
+    s.record_failure("a", now=0)
+    assert s.get("a").next_due == 120
+    s.record_failure("a", now=0)
+    assert s.get("a").next_due == 240
+    for _ in range(10):
+        s.record_failure("a", now=0)
+    assert s.get("a").next_due == 3600
+    s.record_success("a", [], now=0)
+    assert s.get("a").failures == 0
+
+def test_removed_channels_are_never_due():
+    s = _scheduler()
+    s.sync(["a", "b"], now=0)
+    s.sync(["b"], now=0)
+    assert s.due(0) == ["b"]
+    assert len(s) == 1
+
+def test_next_wakeup_skips_stale_entries():
+    s = _scheduler()
+    s.sync(["a"], now=0)
+    s.due(0)
+    s.record_success("a", [], now=0)
+    assert s.next_wakeup() == 90
+    s.sync([], now=0)
+    assert s.next_wakeup() is None
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from app.services.telemetry.singleflight import SingleFlight
+from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"feeds": []}
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(10)))
+
+    assert calls == 1
+    assert all(r == {"feeds": []} for r in results)
+    assert flight.stats["coalesced"] == 9
+    assert flight.in_flight() == 0
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await flight.do("k", fetch) == 1
+    assert await flight.do("k", fetch) == 2
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_caller():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    first = asyncio.create_task(flight.do("k", fetch))
+    second = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "ok"
+
+@pytest.mark.asyncio
+async def test_service_coalesces_identical_channel_queries(monkeypatch):
+    service = ThingSpeakTelemetryService()
+    calls = []
+
+    async def fake_request(channel_id, params):
+        calls.append((channel_id, params))
+        await asyncio.sleep(0.01)
+        return {"feeds": [{"created_at": "2024-01-01T00:00:00Z", "entry_id": 1, "field2": "10"}]}
+
+    monkeypatch.setattr(service, "_request_feeds", fake_request)
+    config = {"channel_id": "sf-123", "read_key": "k", "field_mapping": {"field2": "distance"}}
+    results = await asyncio.gather(*(service.fetch_latest("n1", config) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(r["distance"] == 10 for r in results)
@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+import httpx
+from app.services.telemetry.throttle import (
+    TokenBucket, CircuitBreaker, UpstreamGuard, CircuitOpenError, RateLimitExceeded
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_allows_burst_then_paces():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    assert [bucket.reserve(max_wait=0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(max_wait=0) is None
+    assert bucket.reserve(max_wait=1) == 0.5
+    clock.now = 1.0
+    assert bucket.reserve(max_wait=0) == 0.0
+
+def test_breaker_opens_after_threshold_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 61
+    assert breaker.allow() # half-open trial
+    assert not breaker.allow() # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_failed_trial_reopens_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+@pytest.mark.asyncio
+async def test_guard_short_circuits_failing_channel():
+    guard = UpstreamGuard()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503)
+
+    threshold = guard.breaker("ch").failure_threshold
+    for _ in range(threshold):
+        await guard.call("ch", f"key{_}", failing)
+    with pytest.raises(CircuitOpenError):
+        await guard.call("ch", "other-key", failing)
+    assert calls == threshold
+    assert guard.snapshot()["open_circuits"] == ["ch"]
+
+@pytest.mark.asyncio
+async def test_guard_rejects_when_key_budget_is_spent():
+    guard = UpstreamGuard()
+
+    async def ok():
+        return httpx.Response(200)
+
+    burst = int(guard.bucket("k").capacity)
+    for i in range(burst):
+        await guard.call(f"ch{i}", "k", ok, max_wait=0)
+    with pytest.raises(RateLimitExceeded):
+        await guard.call("ch-next", "k", ok, max_wait=0)
+    assert guard.stats["rate_limited"] == 1
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_frees_the_half_open_slot():
+    clock = FakeClock()
+    guard = UpstreamGuard()
+    guard._breakers["ch"] = breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    started = asyncio.Event()
+
+    async def hangs():
+        started.set()
+        await asyncio.sleep(3600)
+
+    trial = asyncio.create_task(guard.call("ch", "k-cancel", hangs))
+    await started.wait()
+    trial.cancel() # e.g. the client of a streaming export went away
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() # the next call gets the trial
+
+@pytest.mark.asyncio
+async def test_malformed_body_counts_as_a_failure(monkeypatch):
+    from app.core.http import http_clients
+    from app.services.telemetry import thingspeak
+    from app.services.telemetry.thingspeak import ThingSpeakTelemetryService
+
+    guard = UpstreamGuard()
+    monkeypatch.setattr(thingspeak, "thingspeak_guard", guard)
+    bodies = iter([b"<html>Bad Gateway</html>", b'{"feeds": [', b"-1"])
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=next(bodies))))
+    monkeypatch.setattr(http_clients, "get", lambda name="default": client)
+
+    service = ThingSpeakTelemetryService()
+    for _ in range(3):
+        assert await service._request_feeds("bad-json", {"results": 1}) is None
+    assert guard.breaker("bad-json").failures == 3
+    await client.aclose()
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime
+import pytest
+from sqlalchemy import select, func
+from app.models.all_models import NodeReading
+from app.services.telemetry.writer import TelemetryWriter
+
+def _row(i):
+    return {"id": f"r{i}", "node_id": "n1", "timestamp": datetime(2024, 1, 1, 0, 0, i), "entry_id": i, "data": {"field2": i}}
+
+@pytest.mark.asyncio
+async def test_flushes_full_batches_in_one_insert(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=10, flush_interval=0.1, session_factory=session_factory)
+    await writer.enqueue_many(NodeReading, [_row(i) for i in range(25)])
+
+    task = asyncio.create_task(writer.run())
+    await asyncio.wait_for(writer.queue.join(), timeout=10)
+    task.cancel()
+
+    async with session_factory() as session:
+        count = (await session.execute(select(func.count()).select_from(NodeReading))).scalar()
+    assert count == 25
+    assert writer.stats["flushes"] == 3
+    assert writer.snapshot()["queue_depth"] == 0
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_interval(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=1000, flush_interval=0.05, session_factory=session_factory)
+    await writer.enqueue(NodeReading, _row(1))
+
+    task = asyncio.create_task(writer.run())
+    await asyncio.wait_for(writer.queue.join(), timeout=5)
+    task.cancel()
+
+    assert writer.stats["rows_written"] == 1
+    assert writer.stats["last_flush_ms"] is not None
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure(session_factory):
+    writer = TelemetryWriter(maxsize=2, batch_size=10, flush_interval=0.01, session_factory=session_factory)
+    await writer.enqueue_many(NodeReading, [_row(1), _row(2)])
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(writer.enqueue(NodeReading, _row(3)), timeout=0.05)
+
+@pytest.mark.asyncio
+async def test_duplicate_readings_are_skipped(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=10, flush_interval=0.05, session_factory=session_factory)
+    await writer.flush([(NodeReading, _row(i)) for i in range(5)])
+    # Same (node_id, timestamp) again under fresh ids, e.g. an overlapping poll
+    retry = [(NodeReading, dict(_row(i), id=f"retry{i}")) for i in range(3, 8)]
+    await writer.flush(retry)
+
+    async with session_factory() as session:
+        count = (await session.execute(select(func.count()).select_from(NodeReading))).scalar()
+    assert count == 8
+    assert writer.stats["rows_failed"] == 0
+
+@pytest.mark.asyncio
+async def test_channels_reporting_the_same_second_are_merged(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=10, flush_interval=0.05, session_factory=session_factory)
+    ts = datetime(2024, 1, 1)
+    level = {"id": "a", "node_id": "n1", "timestamp": ts, "entry_id": 7, "field2": 40.0, "data": {"status": "ok"}}
+    flow = {"id": "b", "node_id": "n1", "timestamp": ts, "entry_id": 3, "field1": 2.5, "data": {"mode": "auto"}}
+    pump = {"id": "c", "node_id": "n1", "timestamp": ts, "entry_id": 9, "field3": 1.0, "field2": 99.0, "data": None}
+    # Two channels in one batch, a third (and a resend of the first) in a later one
+    await writer.flush([(NodeReading, level), (NodeReading, flow)])
+    await writer.flush([(NodeReading, pump), (NodeReading, dict(level, id="a2"))])
+
+    async with session_factory() as session:
+        (row,) = (await session.execute(select(NodeReading))).scalars().all()
+    assert (row.field1, row.field2, row.field3) == (2.5, 40.0, 1.0)
+    assert row.entry_id == 7
+    assert row.data == {"status": "ok", "mode": "auto"}
+    assert writer.stats["rows_failed"] == 0
+
+@pytest.mark.asyncio
+async def test_drain_flushes_rows_left_in_queue(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=4, flush_interval=0.05, session_factory=session_factory)
+    await writer.enqueue_many(NodeReading, [_row(i) for i in range(10)])
+
+    await writer.drain()
+
+    assert writer.stats["rows_written"] == 10
+    assert writer.stats["flushes"] == 3
+    assert writer.queue.empty()
+
+@pytest.mark.asyncio
+async def test_on_written_runs_once_all_rows_are_committed(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=4, flush_interval=0.05, session_factory=session_factory)
+    calls = []
+
+    async def on_written():
+        async with session_factory() as session:
+            calls.append((await session.execute(select(func.count()).select_from(NodeReading))).scalar())
+
+    await writer.enqueue_many(NodeReading, [_row(i) for i in range(10)], on_written=on_written)
+    await writer.drain()
+
+    assert calls == [10] # after the third flush, not the first
+
+@pytest.mark.asyncio
+async def test_on_written_never_runs_when_a_flush_fails(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=4, flush_interval=0.05, session_factory=session_factory)
+    calls = []
+
+    async def on_written():
+        calls.append(True)
+
+    rows = [_row(i) for i in range(10)]
+    rows[5]["timestamp"] = "not a date" # fails the second flush
+    await writer.enqueue_many(NodeReading, rows, on_written=on_written)
+    await writer.drain()
+
+    assert calls == []
+    assert writer.stats["rows_failed"] == 4
+
+@pytest.mark.asyncio
+async def test_drain_flushes_the_batch_run_was_collecting(session_factory):
+    # A batch that is neither full nor due: run() holds it off the queue
+    writer = TelemetryWriter(maxsize=100, batch_size=100, flush_interval=3600, session_factory=session_factory)
+    written = []
+
+    async def on_written():
+        written.append(True)
+
+    task = asyncio.create_task(writer.run())
+    await writer.enqueue_many(NodeReading, [_row(i) for i in range(5)], on_written=on_written)
+    while not writer.queue.empty():
+        await asyncio.sleep(0.01)
+    task.cancel() # shutdown, as in app.worker
+    await asyncio.gather(task, return_exceptions=True)
+
+    await writer.drain()
+    async with session_factory() as session:
+        count = (await session.execute(select(func.count()).select_from(NodeReading))).scalar()
+    assert count == 5
+    assert written == [True]
+
+@pytest.mark.asyncio
+async def test_drain_stops_a_live_consumer_first(session_factory):
+    writer = TelemetryWriter(maxsize=100, batch_size=3, flush_interval=0.01, session_factory=session_factory)
+    calls = []
+
+    async def on_written():
+        calls.append(writer.stats["rows_written"])
+
+    task = asyncio.create_task(writer.run())
+    await writer.enqueue_many(NodeReading, [_row(i) for i in range(10)], on_written=on_written)
+    await asyncio.sleep(0.005) # the consumer is mid-way through the queue
+    # Not cancelled beforehand, as in main.py's shutdown
+    await writer.drain()
+
+    assert task.done()
+    assert writer.stats["rows_written"] == 10
+    assert calls == [10]
+    await asyncio.wait_for(writer.queue.join(), timeout=1)